@@ -294,6 +294,9 @@ trackdirect.Websocket.prototype._onMessage = function (evt) {
 
   // We skip try-catch since it affects performance
   let packet = JSON.parse(evt.data);
+  if (packet.payload_encoding == "columnar") {
+    packet = this._decodeColumnarPayload(packet);
+  }
 
   // Add to queue to make sure packets are handled in order
   trackdirect.services.callbackExecutor.add(this, this._handleMessage, [
@@ -301,6 +304,29 @@ trackdirect.Websocket.prototype._onMessage = function (evt) {
   ]);
 };
 
+/**
+ * Decode a columnar payload (a list of keys and one list of values per packet)
+ * @param {object} payload
+ * @return {object}
+ */
+trackdirect.Websocket.prototype._decodeColumnarPayload = function (payload) {
+  let data = [];
+  for (let i = 0; i < payload.rows.length; i++) {
+    let row = payload.rows[i];
+    let columns = payload.columns[row[0]];
+    let packet = {};
+    for (let j = 0; j < columns.length; j++) {
+      packet[columns[j]] = row[j + 1];
+    }
+    data.push(packet);
+  }
+
+  return {
+    payload_response_type: payload.payload_response_type,
+    data: data,
+  };
+};
+
 /**
  * Handle message
  * @param {object} packet
@@ -400,6 +426,7 @@ trackdirect.Websocket.prototype._addToSendQueue = function (request) {
 
   let me = this;
   this._queue.push(function () {
+    request.payload_encoding = "columnar";
     let data = JSON.stringify(request);
     if (data != null) {
       me.send(data);
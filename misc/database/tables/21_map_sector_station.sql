@@ -0,0 +1,8 @@
+create table map_sector_station (
+    "map_sector" int not null,
+    "time_bucket" int not null,
+    "station_id" bigint not null,
+    primary key (map_sector, time_bucket, station_id)
+);
+
+create index map_sector_station_time_bucket_idx on map_sector_station(time_bucket);
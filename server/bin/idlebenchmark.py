@@ -0,0 +1,66 @@
+import sys
+import json
+import time
+import subprocess
+from twisted.internet import reactor, task
+from server.trackdirect.websocket.WebsocketTicker import WebsocketTicker
+
+
+class IdleConnection:
+    """Simulates the timer work of an idle websocket connection"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_tick(self, timestamp=None):
+        self.calls += 1
+        json.dumps({'payload_response_type': 41, 'data': {'timestamp': timestamp or int(time.time())}})
+
+    def read_real_time_packet(self):
+        self.calls += 1
+
+
+def run_mode(mode, number_of_connections, seconds):
+    """Run one mode in the current process and print used cpu time and number of timer calls"""
+    connections = [IdleConnection() for i in range(number_of_connections)]
+    if mode == 'timers':
+        # One timestamp timer and one real time reader timer per connection (the previous implementation)
+        for connection in connections:
+            task.LoopingCall(connection.on_tick).start(1.0, False)
+            task.LoopingCall(connection.read_real_time_packet).start(0.2, False)
+    else:
+        # One shared ticker, real time packets are pushed to the connections
+        ticker = WebsocketTicker()
+        for connection in connections:
+            ticker.subscribe(connection)
+
+    start_cpu = time.process_time()
+    reactor.callLater(seconds, reactor.stop)
+    reactor.run()
+    cpu = time.process_time() - start_cpu
+    print(cpu, sum(connection.calls for connection in connections))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ['-h', '--help']:
+        print("\nUsage: idlebenchmark.py [number of connections] [seconds]")
+        sys.exit()
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], int(sys.argv[3]), float(sys.argv[4]))
+        return
+
+    number_of_connections = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    print(f"\n{number_of_connections} idle connections during {seconds}s")
+    for mode in ['timers', 'ticker']:
+        # Each mode is executed in a new process since the reactor can not be restarted
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--mode', mode, str(number_of_connections), str(seconds)])
+        cpu, calls = output.decode().split()
+        print(f"{mode:>8}: {float(cpu) * 100 / seconds:6.1f}% cpu, {int(calls) / seconds:10.0f} calls/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import sys
+import random
+import time
+from server.trackdirect.TrackDirectConfig import TrackDirectConfig
+from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.collector.PacketBatchInserter import PacketBatchInserter
+from server.trackdirect.collector.PacketBatchCopyInserter import PacketBatchCopyInserter
+
+
+def create_packet_tuples(number_of_rows):
+    now = int(time.time())
+    packet_tuples = []
+    for i in range(number_of_rows):
+        latitude = random.uniform(-80, 80)
+        longitude = random.uniform(-179, 179)
+        packet_tuples.append((i + 1, i + 1, 1, 1, 1, latitude, longitude, None, '>', '/', 12345678, [12345678, 12345680],
+                              i + 1, None, 12.5, 90.0, 100.0, None, None, None, None, now, now, 1, now, now,
+                              'Comment with "quotes", commas and unicode åäö', 'WIDE1-1,qAR,NOCALL',
+                              f'NOCALL-{i}>APRS,WIDE1-1,qAR,NOCALL:!5900.00N/01800.00E>Comment'))
+    return packet_tuples
+
+
+def run_benchmark(db, inserter, table, packet_tuples, batch_size):
+    cur = db.cursor()
+    start = time.time()
+    for i in range(0, len(packet_tuples), batch_size):
+        inserter._insert_packet_rows(cur, table, packet_tuples[i:i + batch_size])
+    elapsed = time.time() - start
+    cur.close()
+    return elapsed
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("\nUsage: insertbenchmark.py [config.ini] [number of rows] [rows per batch]")
+        sys.exit()
+
+    config_file = sys.argv[1]
+    number_of_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    config = TrackDirectConfig()
+    config.populate(config_file)
+
+    db_connection = DatabaseConnection()
+    db = db_connection.get_connection(True)
+    db_no_auto_commit = db_connection.get_connection(False)
+
+    packet_tuples = create_packet_tuples(number_of_rows)
+    engines = [('insert', PacketBatchInserter(db, db_no_auto_commit)),
+               ('copy', PacketBatchCopyInserter(db, db_no_auto_commit))]
+
+    # Rows are written to a temporary table that is dropped on rollback (note that the packet id sequence is used)
+    for name, inserter in engines:
+        cur = db_no_auto_commit.cursor()
+        cur.execute("CREATE TEMP TABLE packet_benchmark (LIKE packet INCLUDING DEFAULTS) ON COMMIT DROP")
+        cur.close()
+
+        elapsed = run_benchmark(db_no_auto_commit, inserter, 'packet_benchmark', packet_tuples, batch_size)
+        db_no_auto_commit.rollback()
+
+        print(f"{name:>6}: {number_of_rows} rows in {elapsed:.2f}s ({number_of_rows / elapsed:.0f} rows/s, "
+              f"{batch_size} rows per batch)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import sys
+import os
+import datetime
+import logging
+from server.trackdirect.TrackDirectConfig import TrackDirectConfig
+from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+from server.trackdirect.database.MapSectorStationIndex import MapSectorStationIndex
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("\nUsage: mapsectorindex.py [config.ini]")
+        print("\nAdds all packets in the existing packet tables to the map sector station index (map_sector_station).")
+        sys.exit()
+
+    config_file = sys.argv[1]
+    if not config_file.startswith("/"):
+        config_file = os.path.expanduser(f'~/trackdirect/config/{config_file}')
+    if not os.path.isfile(config_file):
+        print(f"\n File {config_file} does not exist")
+        sys.exit()
+
+    config = TrackDirectConfig()
+    config.populate(config_file)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger('trackdirect')
+
+    db = DatabaseConnection().get_connection(True)
+    db_object_finder = DatabaseObjectFinder(db)
+    map_sector_station_index = MapSectorStationIndex(db)
+    if not map_sector_station_index.is_available():
+        logger.error("Table map_sector_station is missing, create it using misc/database/tables/21_map_sector_station.sql")
+        sys.exit()
+
+    for x in range(config.days_to_save_position_data, -1, -1):
+        day = datetime.datetime.utcnow() - datetime.timedelta(x)
+        packet_table = f"packet{day.strftime('%Y%m%d')}"
+        if db_object_finder.check_table_exists(packet_table):
+            added_rows = map_sector_station_index.add_packet_table(packet_table)
+            logger.info(f"Added {added_rows} rows from {packet_table}")
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
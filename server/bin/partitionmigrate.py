@@ -0,0 +1,160 @@
+import sys
+import os
+import re
+import time
+import calendar
+import datetime
+import logging
+from server.trackdirect.TrackDirectConfig import TrackDirectConfig
+from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+from server.trackdirect.database.PacketTableManager import PacketTableManager
+
+# Indexes of the partitioned parent tables (same columns as the indexes created for the daily inherited tables,
+# so the existing indexes of the daily tables are reused when they are attached)
+PARENT_TABLE_INDEXES = {
+    'packet': [
+        ('id_idx', '(id)'),
+        ('station_id_idx', '(station_id, map_id, marker_id, timestamp)'),
+        ('map_sector_idx', '(map_sector, timestamp, map_id)'),
+        ('sender_id_idx', '(sender_id)')
+    ],
+    'packet_path': [
+        ('id_idx', '(id)'),
+        ('packet_id_idx', '(packet_id, number)'),
+        ('station_id_idx', '(station_id, timestamp)'),
+        ('sending_station_id_idx', '(sending_station_id, timestamp)')
+    ],
+    'packet_weather': [
+        ('id_idx', '(id)'),
+        ('packet_id_idx', '(packet_id)'),
+        ('station_id_idx', '(station_id, timestamp)')
+    ],
+    'packet_telemetry': [
+        ('id_idx', '(id)'),
+        ('packet_id_idx', '(packet_id)'),
+        ('station_id_idx', '(station_id, timestamp, seq)'),
+        ('telemetry_param_id', '(station_telemetry_param_id)'),
+        ('telemetry_unit_id', '(station_telemetry_unit_id)'),
+        ('telemetry_eqns_id', '(station_telemetry_eqns_id)'),
+        ('telemetry_bits_id', '(station_telemetry_bits_id)')
+    ],
+    'packet_ogn': [
+        ('id_idx', '(id)'),
+        ('packet_id_idx', '(packet_id)'),
+        ('station_id_idx', '(station_id, timestamp)')
+    ]
+}
+
+
+def migrate_table(db, parent_table, indexes, logger):
+    """Convert an inherited parent table (and all its daily tables) to a table partitioned by timestamp
+
+    Args:
+        db (psycopg2.Connection): Database connection (without autocommit)
+        parent_table (str): Name of the parent table
+        indexes (list): Indexes to create on the partitioned parent table
+
+    Returns:
+        int: Number of attached daily tables
+    """
+    old_parent_table = f'{parent_table}_inherited'
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"ALTER TABLE {parent_table} RENAME TO {old_parent_table}")
+
+        cursor.execute(f"SELECT 1 FROM ONLY {old_parent_table} LIMIT 1")
+        if cursor.fetchone() is not None:
+            raise Exception(f"Table {parent_table} contains rows that is not stored in a daily table")
+
+        # Foreign keys are not inherited, so the daily tables has never had any, keep it like that to avoid
+        # validating every row when the daily tables are attached.
+        cursor.execute(f"""CREATE TABLE {parent_table} (LIKE {old_parent_table} INCLUDING DEFAULTS)
+                           PARTITION BY RANGE (timestamp)""")
+        for name, columns in indexes:
+            cursor.execute(f"CREATE INDEX {parent_table}_{name} ON {parent_table} USING btree {columns}")
+        cursor.execute(f"ALTER SEQUENCE {parent_table}_id_seq OWNED BY {parent_table}.id")
+
+        cursor.execute("""SELECT child.relname
+                          FROM pg_inherits
+                          JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                          JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                          WHERE parent.relname = %s
+                          ORDER BY child.relname""", (old_parent_table,))
+        daily_tables = [record[0] for record in cursor.fetchall()]
+
+        for table_name in daily_tables:
+            match = re.match(r'^packet(\d{8})', table_name)
+            if match is None:
+                raise Exception(f"Unable to find the date of table {table_name}")
+
+            min_timestamp = calendar.timegm(datetime.datetime.strptime(match.group(1), '%Y%m%d').timetuple())
+            max_timestamp = min_timestamp + (24 * 60 * 60)
+            cursor.execute(f"ALTER TABLE {table_name} NO INHERIT {old_parent_table}")
+            cursor.execute(f"""ALTER TABLE {parent_table} ATTACH PARTITION {table_name}
+                               FOR VALUES FROM ({min_timestamp}) TO ({max_timestamp})""")
+            logger.info(f"Attached {table_name} to {parent_table}")
+
+        cursor.execute(f"DROP TABLE {old_parent_table}")
+        db.commit()
+        cursor.close()
+        return len(daily_tables)
+
+    except Exception:
+        db.rollback()
+        cursor.close()
+        raise
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("\nUsage: partitionmigrate.py [config.ini] [days to create ahead]")
+        print("\nConverts the packet tables (packet, packet_path, packet_weather, packet_telemetry and packet_ogn) "
+              "from inherited daily tables to declarative partitioning (PARTITION BY RANGE (timestamp)).")
+        print("Stop the collectors, the websocket servers and the remover before running this script.")
+        sys.exit()
+
+    config_file = sys.argv[1]
+    if not config_file.startswith("/"):
+        config_file = os.path.expanduser(f'~/trackdirect/config/{config_file}')
+    if not os.path.isfile(config_file):
+        print(f"\n File {config_file} does not exist")
+        sys.exit()
+
+    days_ahead = 2
+    if len(sys.argv) > 2:
+        days_ahead = int(sys.argv[2])
+
+    config = TrackDirectConfig()
+    config.populate(config_file)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger('trackdirect')
+
+    track_direct_db = DatabaseConnection()
+    db = track_direct_db.get_connection(False)
+    db_object_finder = DatabaseObjectFinder(db)
+
+    for parent_table, indexes in PARENT_TABLE_INDEXES.items():
+        if db_object_finder.check_table_partitioned(parent_table):
+            logger.info(f"Table {parent_table} is already partitioned")
+            continue
+
+        try:
+            start = time.time()
+            attached_tables = migrate_table(db, parent_table, indexes, logger)
+            db_object_finder.refresh_packet_table_registry()
+            logger.info(f"Converted {parent_table} ({attached_tables} daily tables) in {time.time() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"Failed to convert {parent_table}: {e}")
+            sys.exit(1)
+
+    # Create the partitions for the coming days, so the collector does not need to create them at day rollover
+    db = track_direct_db.get_connection(True)
+    PacketTableManager(db, days_ahead).run()
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import sys
+import random
+import time
+import tracemalloc
+from collections import OrderedDict
+from server.trackdirect.common.RateLimitStore import RateLimitStore
+
+
+def create_keys(number_of_packets, number_of_stations):
+    packet_types = ['!', '=', '/', '@', ';', '>', 'T', '_']
+    stations = [f'NOCALL-{i}' for i in range(number_of_stations)]
+    # A few stations sends most of the packets
+    weights = [1.0 / (i + 1) for i in range(number_of_stations)]
+    return [station + random.choice(packet_types) for station in random.choices(stations, weights, k=number_of_packets)]
+
+
+class OrderedDictRateLimiter:
+    """The previous implementation (OrderedDict trimmed one item at a time), used for comparison"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.timestamps = OrderedDict()
+
+    def is_allowed(self, key, timestamp, interval):
+        if (timestamp - interval) < self.timestamps.get(key, 0):
+            return False
+        self.timestamps[key] = timestamp
+        while len(self.timestamps) > self.max_size:
+            self.timestamps.popitem(last=False)
+        return True
+
+
+def run_benchmark(create_limiter, keys, interval, packets_per_second):
+    limiter = create_limiter()
+    timestamp = time.time()
+    dropped = 0
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        if not limiter.is_allowed(key, timestamp + i / packets_per_second, interval):
+            dropped += 1
+    elapsed = time.perf_counter() - start
+
+    # Memory is measured in a separate run since tracing slows down everything
+    tracemalloc.start()
+    limiter = create_limiter()
+    for i, key in enumerate(keys):
+        limiter.is_allowed(key, timestamp + i / packets_per_second, interval)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory, dropped
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ['-h', '--help']:
+        print("\nUsage: ratelimitbenchmark.py [number of packets] [number of stations] [frequency limit]")
+        sys.exit()
+
+    number_of_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    number_of_stations = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    frequency_limit = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    packets_per_second = 1000
+
+    keys = create_keys(number_of_packets, number_of_stations)
+    limiters = [('ordered dict', lambda: OrderedDictRateLimiter(frequency_limit * 1000)),
+                ('rate limit store', lambda: RateLimitStore())]
+
+    print(f"\n{number_of_packets} packets from {number_of_stations} stations, frequency limit {frequency_limit}s")
+    for name, create_limiter in limiters:
+        elapsed, memory, dropped = run_benchmark(create_limiter, keys, frequency_limit, packets_per_second)
+        print(f"{name:>16}: {elapsed * 1000000000 / number_of_packets:8.0f} ns/packet, "
+              f"{memory / 1024:8.0f} KiB memory, {dropped} packets dropped")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,14 @@ import logging
 import logging.handlers
 import datetime
 import time
+import calendar
 from server.trackdirect.TrackDirectConfig import TrackDirectConfig
 from server.trackdirect.database.DatabaseConnection import DatabaseConnection
 from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
-from server.trackdirect.repositories.PacketRepository import PacketRepository
+from server.trackdirect.database.MapSectorStationIndex import MapSectorStationIndex
+from server.trackdirect.database.PacketTableCompactor import PacketTableCompactor
+
+STATION_DELETE_BATCH_SIZE = 1000
 
 def setup_logging(db_name):
     log_file = os.path.expanduser(f'~/trackdirect/server/log/remover_{db_name}.log')
@@ -27,11 +31,40 @@ def validate_config_file(config_file):
         print("\nUsage: script.py [config.ini]")
         sys.exit()
 
-def drop_table_if_exists(cursor, dbobjfinder, table_name, logger):
+def drop_table_if_exists(cursor, dbobjfinder, table_name, parent_table, logger):
     if dbobjfinder.check_table_exists(table_name):
+        if dbobjfinder.check_table_partitioned(parent_table):
+            # Detach first, so the lock on the parent table (that readers use) is kept as short as possible
+            cursor.execute(f"ALTER TABLE {parent_table} DETACH PARTITION {table_name} CONCURRENTLY")
+            logger.info(f"Detached partition {table_name}")
         cursor.execute(f"DROP TABLE {table_name}")
         logger.info(f"Dropped table {table_name}")
 
+def delete_stations(cursor, station_ids, sender_ids):
+    for table in ['station_telemetry_bits', 'station_telemetry_eqns', 'station_telemetry_param', 'station_telemetry_unit', 'station_city']:
+        cursor.execute(f"DELETE FROM {table} WHERE station_id = ANY(%s)", (station_ids,))
+
+    cursor.execute("DELETE FROM station WHERE id = ANY(%s)", (station_ids,))
+    cursor.execute("DELETE FROM sender WHERE id = ANY(%s) AND NOT EXISTS (SELECT 1 FROM station WHERE latest_sender_id = sender.id)", (sender_ids,))
+
+def delete_station_batch(db_no_auto_commit, records, logger):
+    delete_cursor = db_no_auto_commit.cursor()
+    try:
+        delete_stations(delete_cursor, [record["id"] for record in records], list({record["latest_sender_id"] for record in records}))
+        db_no_auto_commit.commit()
+        delete_cursor.close()
+        return len(records)
+    except Exception as e:
+        db_no_auto_commit.rollback()
+        if len(records) == 1:
+            logger.error(e, exc_info=1)
+            delete_cursor.close()
+            return 0
+    delete_cursor.close()
+
+    # Something in the batch could not be deleted, try one station at a time to delete the rest
+    return sum(delete_station_batch(db_no_auto_commit, [record], logger) for record in records)
+
 def main():
     if len(sys.argv) < 2:
         print("\nUsage: script.py [config.ini]")
@@ -67,46 +100,43 @@ def main():
         cursor.execute("SET statement_timeout = '240s'")
 
         track_direct_db_object_finder = DatabaseObjectFinder(db)
-        packet_repository = PacketRepository(db)
+        packet_table_compactor = PacketTableCompactor(db_no_auto_commit)
 
-        # Loop over the latest days and delete packets that are not needed anymore
+        # Loop over the latest days and replace the packet tables with tables that only contains the packets we need
+        start = time.time()
         for x in range(2, 16):
-            prev_day = datetime.date.today() - datetime.timedelta(x)
-            prev_day_timestamp = int(prev_day.strftime("%s"))
-            prev_day_format = datetime.datetime.utcfromtimestamp(prev_day_timestamp).strftime('%Y%m%d')
-            packet_table = f"packet{prev_day_format}"
+            prev_day = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - datetime.timedelta(x)
+            prev_day_timestamp = calendar.timegm(prev_day.timetuple())
+            packet_table = f"packet{prev_day.strftime('%Y%m%d')}"
 
             if track_direct_db_object_finder.check_table_exists(packet_table):
-                deleted_rows = None
-                do_full_vacuum = False
-                while deleted_rows is None or deleted_rows >= 5000:
-                    sql = f"""DELETE FROM {packet_table} WHERE id IN (
-                              SELECT id FROM {packet_table} WHERE map_id NOT IN (1,12) LIMIT 5000)"""
-                    cursor.execute(sql)
-                    deleted_rows = cursor.rowcount
-                    logger.info(f"Deleted {deleted_rows} from {packet_table}")
-                    if deleted_rows > 0:
-                        do_full_vacuum = True
-                    time.sleep(0.5)
-                if do_full_vacuum:
-                    cursor.execute(f"VACUUM FULL {packet_table}_path")
-                    cursor.execute(f"REINDEX TABLE {packet_table}_path")
-                    cursor.execute(f"VACUUM FULL {packet_table}")
-                    cursor.execute(f"REINDEX TABLE {packet_table}")
+                try:
+                    result = packet_table_compactor.compact(packet_table, "packet", "map_id IN (1, 12)",
+                                                            prev_day_timestamp, prev_day_timestamp + 86400)
+                    if result is not None:
+                        logger.info(f"Removed {result[1]} rows from {packet_table} ({result[0]} rows kept)")
+
+                        # No rows are removed from the path table, a plain VACUUM keeps it maintained without locking it
+                        if track_direct_db_object_finder.check_table_exists(f"{packet_table}_path"):
+                            cursor.execute(f"VACUUM ANALYZE {packet_table}_path")
+                            logger.info(f"Vacuumed {packet_table}_path")
+                except Exception as e:
+                    logger.error(e, exc_info=1)
+        logger.info(f"Packet tables compacted in {time.time() - start:.1f}s")
 
         # Drop packet_weather
         for x in range(max_days_to_save_weather_data, max_days_to_save_weather_data + 100):
             prev_day = datetime.date.today() - datetime.timedelta(x)
             prev_day_format = prev_day.strftime('%Y%m%d')
             packet_table = f"packet{prev_day_format}_weather"
-            drop_table_if_exists(cursor,track_direct_db_object_finder, packet_table, logger)
+            drop_table_if_exists(cursor,track_direct_db_object_finder, packet_table, "packet_weather", logger)
 
         # Drop packet_telemetry
         for x in range(max_days_to_save_telemetry_data, max_days_to_save_telemetry_data + 100):
             prev_day = datetime.date.today() - datetime.timedelta(x)
             prev_day_format = prev_day.strftime('%Y%m%d')
             packet_table = f"packet{prev_day_format}_telemetry"
-            drop_table_if_exists(cursor,track_direct_db_object_finder, packet_table, logger)
+            drop_table_if_exists(cursor,track_direct_db_object_finder, packet_table, "packet_telemetry", logger)
 
         # Drop packets
         for x in range(max_days_to_save_position_data, max_days_to_save_position_data + 100):
@@ -114,11 +144,18 @@ def main():
             prev_day_format = prev_day.strftime('%Y%m%d')
             packet_table = f"packet{prev_day_format}"
 
-            drop_table_if_exists(cursor, track_direct_db_object_finder, f"{packet_table}_ogn", logger)
-            drop_table_if_exists(cursor, track_direct_db_object_finder, f"{packet_table}_path", logger)
-            drop_table_if_exists(cursor, track_direct_db_object_finder, packet_table, logger)
+            drop_table_if_exists(cursor, track_direct_db_object_finder, f"{packet_table}_ogn", "packet_ogn", logger)
+            drop_table_if_exists(cursor, track_direct_db_object_finder, f"{packet_table}_path", "packet_path", logger)
+            drop_table_if_exists(cursor, track_direct_db_object_finder, packet_table, "packet", logger)
+
+        # Delete old map sector station index rows
+        map_sector_station_index = MapSectorStationIndex(db)
+        deleted_rows = map_sector_station_index.delete_before(
+            int(time.time()) - (60 * 60 * 24 * max_days_to_save_position_data))
+        logger.info(f"Deleted {deleted_rows} from map_sector_station")
 
         # Delete old stations
+        start = time.time()
         timestamp_limit = int(time.time()) - (60 * 60 * 24 * max_days_to_save_station_data)
         deleted_rows = 0
         sql = """SELECT station.id, station.latest_sender_id, station.name
@@ -144,33 +181,20 @@ def main():
 
         select_station_cursor = db.cursor()
         select_station_cursor.execute(sql, (timestamp_limit,))
-        for record in select_station_cursor:
-            logger.info(f"Trying to delete station {record['name']} ({record['id']})")
-            delete_cursor = db_no_auto_commit.cursor()
-            try:
-                for table in ['station_telemetry_bits', 'station_telemetry_eqns', 'station_telemetry_param', 'station_telemetry_unit', 'station_city']:
-                    delete_cursor.execute(f"DELETE FROM {table} WHERE station_id = %s", (record["id"],))
-
-                delete_cursor.execute("DELETE FROM station WHERE id = %s", (record["id"],))
-                delete_cursor.execute("DELETE FROM sender WHERE id = %s AND NOT EXISTS (SELECT 1 FROM station WHERE latest_sender_id = sender.id)", (record["latest_sender_id"],))
-
-                db_no_auto_commit.commit()
-                delete_cursor.close()
-                deleted_rows += 1
-                time.sleep(0.5)
-            except Exception as e:
-                logger.error(e, exc_info=1)
-                db_no_auto_commit.rollback()
-                delete_cursor.close()
-
+        records = select_station_cursor.fetchall()
         select_station_cursor.close()
+
+        for x in range(0, len(records), STATION_DELETE_BATCH_SIZE):
+            deleted_rows += delete_station_batch(db_no_auto_commit, records[x:x + STATION_DELETE_BATCH_SIZE], logger)
+            logger.info(f"Deleted {deleted_rows} of {len(records)} stations ({time.time() - start:.1f}s)")
+
         if deleted_rows > 0:
-            logger.info(f"Deleted {deleted_rows} stations")
+            logger.info(f"Deleted {deleted_rows} stations in {time.time() - start:.1f}s")
 
         cursor.execute("VACUUM ANALYZE station")
-        cursor.execute("REINDEX TABLE station")
+        cursor.execute("REINDEX TABLE CONCURRENTLY station")
         cursor.execute("VACUUM ANALYZE sender")
-        cursor.execute("REINDEX TABLE sender")
+        cursor.execute("REINDEX TABLE CONCURRENTLY sender")
 
         # Close DB connection
         cursor.close()
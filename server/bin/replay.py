@@ -0,0 +1,58 @@
+import sys
+import os.path
+import logging
+from server.trackdirect import TrackDirectConfig
+from server.trackdirect import TrackDirectDataCollector
+from server.trackdirect.collector.RawFeedReplay import RawFeedReplay
+
+if __name__ == '__main__':
+
+    usage = "\n" + sys.argv[0] + ' [config.ini] [capture file] [speed (0 = unlimited)] [collector number]'
+    if len(sys.argv) < 3:
+        print(usage)
+        print("\nReplays a capture file (see capture_file in config.ini) into the database in config.ini, "
+              "use a test database!")
+        sys.exit()
+    elif sys.argv[1].startswith("/"):
+        if not os.path.isfile(sys.argv[1]):
+            print(f"\n File {sys.argv[1]} does not exists")
+            print(usage)
+            sys.exit()
+    elif not os.path.isfile(os.path.expanduser('~/trackdirect/config/' + sys.argv[1])):
+        print(f"\n File ~/trackdirect/config/{sys.argv[1]} does not exists")
+        print(usage)
+        sys.exit()
+
+    capture_file = os.path.expanduser(sys.argv[2])
+    if not os.path.isfile(capture_file):
+        print(f"\n File {capture_file} does not exists")
+        print(usage)
+        sys.exit()
+
+    config = TrackDirectConfig()
+    config.populate(sys.argv[1])
+
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+    collector_number = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    collector_options = config.collector[collector_number]
+
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    track_direct_logger = logging.getLogger('trackdirect')
+    track_direct_logger.addHandler(console_handler)
+    track_direct_logger.setLevel(logging.INFO)
+
+    track_direct_logger.warning("Starting replay of " + capture_file + " (speed " + str(speed) + ")")
+
+    try:
+        track_direct_data_collector = TrackDirectDataCollector(
+            collector_options,
+            bool(config.save_ogn_stations_with_missing_identity))
+        replay = RawFeedReplay(capture_file, speed)
+        track_direct_data_collector.run(sys.argv[1], replay)
+        print("\n" + replay.get_report())
+    except Exception as e:
+        track_direct_logger.error(e, exc_info=1)
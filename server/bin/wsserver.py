@@ -4,6 +4,7 @@ from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflat
 from server.trackdirect.TrackDirectConfig import TrackDirectConfig
 from server.trackdirect.TrackDirectWebsocketServer import TrackDirectWebsocketServer
 from server.trackdirect.TrackDirectWebSocketServerFactory import TrackDirectWebSocketServerFactory
+from server.trackdirect.database.DatabaseConnectionPool import DatabaseConnectionPool
 import argparse
 import psutil
 import sys
@@ -16,6 +17,7 @@ from socket import AF_INET
 
 LOG_FILE_MAX_BYTES = 1000000
 LOG_FILE_BACKUP_COUNT = 10
+THREAD_POOL_SIZE = 25
 
 
 def setup_logger(name, log_file, level=logging.INFO):
@@ -108,7 +110,12 @@ def listen(options, config_file):
 
     factory.setProtocolOptions(perMessageCompressionAccept=accept)
 
-    reactor.suggestThreadPoolSize(25)
+    reactor.suggestThreadPoolSize(THREAD_POOL_SIZE)
+
+    # Every job in the thread pool leases one database connection
+    db_pool = DatabaseConnectionPool()
+    db_pool.set_max_size(THREAD_POOL_SIZE)
+    db_pool.start_metrics()
 
     # Socket already created, just start listening and accepting
     reactor.adoptStreamPort(options.fd, AF_INET, factory)
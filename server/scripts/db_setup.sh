@@ -35,6 +35,7 @@ begin transaction;
 \i $SQLPATH/18_packet_telemetry.sql
 \i $SQLPATH/19_packet_path.sql
 \i $SQLPATH/20_packet_ogn.sql
+\i $SQLPATH/21_map_sector_station.sql
 
 commit;
 
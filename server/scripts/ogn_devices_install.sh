@@ -58,6 +58,10 @@ create index ogn_device_device_id_idx on ogn_device(device_id);
 insert into ogn_device(device_type, device_id, aircraft_model, registration, cn, tracked, identified, ddb_aircraft_type) values ('F', '3FEF6F', '', '', '', 'N', 'N', 1);
 commit;
 
+-- Tell running collectors and websocket servers to reload their OGN device registry (after commit, so they see the new rows)
+create sequence if not exists ogn_device_generation_seq;
+select nextval('ogn_device_generation_seq');
+
 EOF
 
 fi
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The hub requires the websocket server environment
+pytest.importorskip('twisted')
+pytest.importorskip('aprslib')
+pytest.importorskip('psycopg2')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'trackdirect'))
+
+from server.trackdirect.parser.policies.MapSectorPolicy import MapSectorPolicy  # noqa: E402
+from server.trackdirect.repositories.StationRepository import StationRepository  # noqa: E402
+from server.trackdirect.websocket.MapSectorHistoryCache import MapSectorHistoryCache  # noqa: E402
+from server.trackdirect.websocket.aprsis.AprsISHub import AprsISHub  # noqa: E402
+from server.trackdirect.exceptions.TrackDirectMissingStationError import TrackDirectMissingStationError  # noqa: E402
+
+
+class Station:
+    def __init__(self, id):
+        self.id = id
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    monkeypatch.setattr(MapSectorHistoryCache, '_instance', None)
+    monkeypatch.setattr(AprsISHub, '_instance', None)
+    station_ids = {'N0CALL': 7, 'N1CALL': 8}
+
+    def get_cached_object_by_name(self, station_name, source_id):
+        if station_name not in station_ids:
+            raise TrackDirectMissingStationError('No station with specified station name found')
+        return Station(station_ids[station_name])
+
+    monkeypatch.setattr(StationRepository, 'get_cached_object_by_name', get_cached_object_by_name)
+    hub = AprsISHub()
+    hub.history_cache.set_feed_active(True)
+    hub.history_cache.invalidation_timestamp = 0
+    return hub
+
+
+def put_entry(cache, map_sector, station_ids, fetch_timestamp):
+    cache.put(map_sector, 60, None, False, fetch_timestamp - 3600, fetch_timestamp, station_ids,
+              {station_id: [] for station_id in station_ids})
+
+
+def test_station_moving_between_cached_map_sectors_without_subscribers(hub):
+    cache = hub.history_cache
+    old_map_sector = MapSectorPolicy().get_map_sector(59.0, 18.0)
+    new_map_sector = MapSectorPolicy().get_map_sector(60.0, 20.0)
+    other_map_sector = MapSectorPolicy().get_map_sector(10.0, 10.0)
+
+    fetch_timestamp = time.time()
+    put_entry(cache, old_map_sector, [7], fetch_timestamp)
+    put_entry(cache, new_map_sector, [], fetch_timestamp)
+    put_entry(cache, other_map_sector, [8], fetch_timestamp)
+
+    # Nobody subscribes to the new map sector, so the packet is not parsed
+    assert hub._parse('N0CALL>APRS,TCPIP*:!6000.00N/02000.00E-', 1) is None
+
+    assert cache.get(old_map_sector, 60, None, False) is None
+    assert cache.get(new_map_sector, 60, None, False) is None
+    assert cache.get(other_map_sector, 60, None, False) is not None
+
+
+def test_object_moving_between_cached_map_sectors_without_subscribers(hub):
+    cache = hub.history_cache
+    old_map_sector = MapSectorPolicy().get_map_sector(59.0, 18.0)
+    fetch_timestamp = time.time()
+    put_entry(cache, old_map_sector, [8], fetch_timestamp)
+
+    assert hub._parse('N0CALL>APRS,TCPIP*:;N1CALL   *111111z6000.00N/02000.00E-', 1) is None
+
+    assert cache.get(old_map_sector, 60, None, False) is None
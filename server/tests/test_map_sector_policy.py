@@ -0,0 +1,99 @@
+import importlib.util
+import os
+import random
+from math import ceil
+
+import pytest
+
+# Loaded by path, importing the server.trackdirect package requires the full collector environment
+spec = importlib.util.spec_from_file_location(
+    'MapSectorPolicy',
+    os.path.join(os.path.dirname(__file__), '..', 'trackdirect', 'parser', 'policies', 'MapSectorPolicy.py'))
+map_sector_policy_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(map_sector_policy_module)
+MapSectorPolicy = map_sector_policy_module.MapSectorPolicy
+
+NUMBER_OF_CASES = 2000
+
+
+def get_reference_map_sectors_in_area(min_lat, max_lat, min_lng, max_lng):
+    """The nested loop previously used by PacketRelatedMapSectorsPolicy"""
+    policy = MapSectorPolicy()
+    min_lng = policy.get_map_sector_lng_representation(min_lng)
+    min_lat = policy.get_map_sector_lat_representation(min_lat)
+    max_lng = policy.get_map_sector_lng_representation(max_lng + 0.5)
+    max_lat = policy.get_map_sector_lat_representation(max_lat + 0.2)
+    result = []
+    for lat in range(min_lat, max_lat, 20000):
+        for lng in range(min_lng, max_lng, 5):
+            result.append(lat + lng)
+    return result
+
+
+def get_reference_map_sectors_by_interval(min_lat, max_lat, min_lng, max_lng):
+    """The loop previously used by WebsocketConnectionState"""
+    result = []
+    policy = MapSectorPolicy()
+    min_area_code = policy.get_map_sector(min_lat, min_lng)
+    max_area_code = policy.get_map_sector(max_lat, max_lng)
+    if min_area_code is not None and max_area_code is not None:
+        lng_diff = int(ceil(max_lng)) - int(ceil(min_lng))
+        area_code = min_area_code
+        while area_code <= max_area_code:
+            if area_code % 10 == 5:
+                result.append(area_code)
+            else:
+                result.append(area_code)
+                result.append(area_code + 5)
+
+            for i in range(1, lng_diff + 1):
+                if area_code % 10 == 5:
+                    result.append(area_code + (10 * i) - 5)
+                    result.append(area_code + (10 * i))
+                else:
+                    result.append(area_code + (10 * i))
+                    result.append(area_code + (10 * i) + 5)
+
+            area_code += 20000
+    return result
+
+
+def get_random_coordinate(randomizer, min_value, max_value):
+    """Returns a random coordinate, often exactly on (or next to) a map sector border"""
+    value = randomizer.uniform(min_value, max_value)
+    kind = randomizer.randrange(3)
+    if kind == 1:
+        value = round(value * 10) / 10
+    elif kind == 2:
+        value = round(value * 10) / 10 + randomizer.choice([-1e-9, 1e-9])
+    return min(max(value, min_value), max_value)
+
+
+def get_random_areas(seed, max_size):
+    """Returns random areas as (min_lat, max_lat, min_lng, max_lng)"""
+    randomizer = random.Random(seed)
+    areas = []
+    for i in range(NUMBER_OF_CASES):
+        lat1 = get_random_coordinate(randomizer, -89.5, 89.5)
+        lng1 = get_random_coordinate(randomizer, -179.5, 179.5)
+        lat2 = get_random_coordinate(randomizer, max(-89.5, lat1 - max_size), min(89.5, lat1 + max_size))
+        lng2 = get_random_coordinate(randomizer, max(-179.5, lng1 - max_size), min(179.5, lng1 + max_size))
+        areas.append((min(lat1, lat2), max(lat1, lat2), min(lng1, lng2), max(lng1, lng2)))
+    return areas
+
+
+@pytest.mark.parametrize('max_size', [0.3, 3, 10])
+def test_map_sectors_in_area_is_same_as_reference(max_size):
+    policy = MapSectorPolicy()
+    for area in get_random_areas(max_size, max_size):
+        result = policy.get_map_sectors_in_area(*area)
+        assert result == get_reference_map_sectors_in_area(*area), area
+        assert result == sorted(result), area
+        assert all(isinstance(map_sector, int) for map_sector in result), area
+
+
+@pytest.mark.parametrize('max_size', [0.3, 3, 10])
+def test_map_sectors_by_interval_is_same_as_reference(max_size):
+    policy = MapSectorPolicy()
+    for area in get_random_areas(max_size + 100, max_size):
+        assert policy.get_map_sectors_by_interval(*area) == get_reference_map_sectors_by_interval(*area), area
@@ -50,6 +50,18 @@ class TrackDirectConfig(Singleton):
         except (NoSectionError, NoOptionError):
             pass
 
+        try:
+            self.packet_duplicate_file = config_parser.get(
+                'database', 'packet_duplicate_file').strip('"')
+        except (NoSectionError, NoOptionError):
+            self.packet_duplicate_file = None
+
+        try:
+            self.packet_duplicate_entries_per_minute = int(config_parser.get(
+                'database', 'packet_duplicate_entries_per_minute').strip('"'))
+        except (NoSectionError, NoOptionError):
+            self.packet_duplicate_entries_per_minute = 16384
+
         # Websocket server
         self.websocket_hostname = config_parser.get(
             'websocket_server', 'host').strip('"')
@@ -159,6 +171,48 @@ class TrackDirectConfig(Singleton):
                 except (NoSectionError, NoOptionError):
                     self.collector[collector_number]['detect_duplicates'] = False
 
+                try:
+                    self.collector[collector_number]['parse_workers'] = int(config_parser.get(
+                        'collector' + str(collector_number), 'parse_workers').strip('"'))
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['parse_workers'] = 4
+
+                try:
+                    self.collector[collector_number]['parse_queue_size'] = int(config_parser.get(
+                        'collector' + str(collector_number), 'parse_queue_size').strip('"'))
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['parse_queue_size'] = 1000
+
+                try:
+                    self.collector[collector_number]['insert_method'] = config_parser.get(
+                        'collector' + str(collector_number), 'insert_method').strip('"')
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['insert_method'] = 'insert'
+
+                try:
+                    self.collector[collector_number]['station_state_cache_size'] = int(config_parser.get(
+                        'collector' + str(collector_number), 'station_state_cache_size').strip('"'))
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['station_state_cache_size'] = 20000
+
+                try:
+                    self.collector[collector_number]['name_cache_size'] = int(config_parser.get(
+                        'collector' + str(collector_number), 'name_cache_size').strip('"'))
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['name_cache_size'] = 100000
+
+                try:
+                    self.collector[collector_number]['marker_id_block_size'] = int(config_parser.get(
+                        'collector' + str(collector_number), 'marker_id_block_size').strip('"'))
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['marker_id_block_size'] = 100
+
+                try:
+                    self.collector[collector_number]['capture_file'] = config_parser.get(
+                        'collector' + str(collector_number), 'capture_file').strip('"')
+                except (NoSectionError, NoOptionError):
+                    self.collector[collector_number]['capture_file'] = None
+
                 self.collector[collector_number]['error_log'] = config_parser.get(
                     'collector' + str(collector_number), 'error_log').strip('"')
 
@@ -181,5 +235,17 @@ class TrackDirectConfig(Singleton):
                 self.collector[collector_number]['frequency_limit'] = "0"
                 self.collector[collector_number]['save_fast_packets'] = True
                 self.collector[collector_number]['detect_duplicates'] = False
+                self.collector[collector_number]['parse_workers'] = 4
+                self.collector[collector_number]['parse_queue_size'] = 1000
+                self.collector[collector_number]['insert_method'] = 'insert'
+                self.collector[collector_number]['station_state_cache_size'] = 20000
+                self.collector[collector_number]['name_cache_size'] = 100000
+                self.collector[collector_number]['marker_id_block_size'] = 100
+                self.collector[collector_number]['capture_file'] = None
 
                 self.collector[collector_number]['error_log'] = None
+
+        if len([collector for collector in self.collector.values() if collector['source_id'] is not None]) > 1:
+            # Marker ids must increase for every new marker, which is not the case if several processes reserves blocks
+            for collector in self.collector.values():
+                collector['marker_id_block_size'] = 1
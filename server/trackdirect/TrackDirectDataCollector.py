@@ -5,16 +5,26 @@ import re
 import aprslib
 import datetime
 import time
-from twisted.internet import reactor, threads
+import os.path
+from twisted.internet import reactor, threads, task
 
 from server.trackdirect.TrackDirectConfig import TrackDirectConfig
 from server.trackdirect.parser.AprsPacketParser import AprsPacketParser
 from server.trackdirect.parser.AprsISConnection import AprsISConnection
 from server.trackdirect.parser.policies.PacketDuplicatePolicy import PacketDuplicatePolicy
 from server.trackdirect.collector.PacketBatchInserter import PacketBatchInserter
+from server.trackdirect.collector.PacketBatchCopyInserter import PacketBatchCopyInserter
+from server.trackdirect.collector.PacketParsePipeline import PacketParsePipeline
+from server.trackdirect.collector.PacketNameResolver import PacketNameResolver
+from server.trackdirect.collector.StationStateCache import StationStateCache
+from server.trackdirect.collector.RawFeedCapture import RawFeedCapture
 from server.trackdirect.exceptions.TrackDirectParseError import TrackDirectParseError
 from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.database.PacketTableManager import PacketTableManager
 from server.trackdirect.repositories.StationRepository import StationRepository
+from server.trackdirect.repositories.SenderRepository import SenderRepository
+from server.trackdirect.repositories.OgnDeviceRepository import OgnDeviceRepository
+from server.trackdirect.repositories.MarkerRepository import MarkerRepository
 
 #from pympler.tracker import SummaryTracker
 
@@ -53,6 +63,16 @@ class TrackDirectDataCollector:
         self.source_id = collector_options['source_id']
         self.callsign = collector_options['callsign']
         self.passcode = collector_options['passcode']
+        self.parse_workers = collector_options['parse_workers']
+        self.parse_queue_size = collector_options['parse_queue_size']
+        self.insert_method = collector_options['insert_method']
+        self.station_state_cache_size = collector_options['station_state_cache_size']
+        self.station_state_cache = None
+        self.name_cache_size = collector_options['name_cache_size']
+        self.marker_id_block_size = collector_options['marker_id_block_size']
+        self.capture_file = collector_options.get('capture_file')
+        self.capture = None
+        self.replay = None
 
         self.latest_packet_timestamp = None
         self.first_packet_timestamp = None
@@ -63,12 +83,14 @@ class TrackDirectDataCollector:
         self.moving_station_ids_with_visible_packet = []
         self.moving_marker_ids_with_visible_packet = []
         self.delay = 0
+        self.pipeline = None
 
-    def run(self, config_file):
+    def run(self, config_file, replay=None):
         """Start the collector
 
         Args:
             config_file (string): TrackDirect config file path
+            replay (RawFeedReplay): Read packets from a capture file instead of the data source (optional)
         """
         config = TrackDirectConfig()
         config.populate(config_file)
@@ -78,11 +100,58 @@ class TrackDirectDataCollector:
         self.db_no_auto_commit = db_connection.get_connection(False)
         self.station_repository = StationRepository(self.db)
 
+        # Create tables ahead of time (in a separate thread with its own connection), so inserts never has to wait for it
+        table_manager = PacketTableManager(db_connection.get_connection(True, True))
+        table_manager.run()
+        task.LoopingCall(threads.deferToThread, table_manager.run).start(60 * 60, False)
+
+        StationRepository.set_cache_size(self.name_cache_size)
+        SenderRepository.set_cache_size(self.name_cache_size)
+        MarkerRepository.set_reserve_block_size(self.marker_id_block_size)
+        self.station_repository.preload_cache(self.source_id, int(time.time()) - 86400)
+        SenderRepository(self.db).preload_cache(self.source_id, int(time.time()) - 86400)
+        task.LoopingCall(self._log_name_cache_stats).start(PacketParsePipeline.metrics_interval, False)
+        if self.detect_duplicates:
+            task.LoopingCall(PacketDuplicatePolicy.log_stats).start(PacketParsePipeline.metrics_interval, False)
+
+        if self.source_id == 5:
+            # Load all OGN devices now so the parse workers never has to look them up
+            OgnDeviceRepository(self.db).refresh_registry()
+
+        if self.station_state_cache_size > 0:
+            self.station_state_cache = StationStateCache(self.db, self.station_state_cache_size)
+            self.station_state_cache.warm_up(self.source_id, int(time.time()) - 86400)
+            task.LoopingCall(self.station_state_cache.log_stats).start(PacketParsePipeline.metrics_interval, False)
+
+        self.replay = replay
+        if self.capture_file and self.replay is None:
+            self.capture = RawFeedCapture(os.path.expanduser(self.capture_file))
+            reactor.addSystemEventTrigger('after', 'shutdown', self.capture.close)
+
+        self.pipeline = PacketParsePipeline(
+            self._parse, self._add_packet, self._on_parse_error, self.parse_workers, self.parse_queue_size,
+            self._prepare)
+        self.pipeline.start()
+        # Unblock the consume thread, otherwise the reactor thread pool can not be stopped
+        reactor.addSystemEventTrigger('before', 'shutdown', self.pipeline.stop)
+
         threads.deferToThread(self.consume)
         reactor.run()
 
+    def _log_name_cache_stats(self):
+        """Log hit rate of the station and sender name caches"""
+        for name, stats in [('Station', StationRepository.get_cache_stats()['name']),
+                            ('Sender', SenderRepository.get_cache_stats()['name'])]:
+            self.logger.info('%s name cache: %s of %s entries, %s hits, %s misses (%.1f%% hit rate), %s evictions',
+                             name, stats['size'], stats['max_size'], stats['hits'], stats['misses'],
+                             stats['hit_rate'], stats['evictions'])
+
     def consume(self):
         """Start consuming packets"""
+        if self.replay is not None:
+            self._consume_replay()
+            return
+
         connection = AprsISConnection(
             self.callsign, self.passcode, self.source_hostname, self.source_port)
         connection.set_frequency_limit(self.hard_frequency_limit)
@@ -93,18 +162,12 @@ class TrackDirectDataCollector:
                 raise StopIteration('Stopped')
 
             timestamp = int(time.time())
-            deferred = threads.deferToThread(self._parse, line, timestamp)
-            deferred.addCallback(on_parse_complete)
-            deferred.addErrback(on_parse_error)
+            if self.capture is not None:
+                self.capture.write(line, timestamp)
 
-        def on_parse_complete(packet):
-            reactor.callFromThread(self._add_packet, packet)
-
-        def on_parse_error(error):
-            # Parse will more or less only cast exception if db connection is lost
-            if reactor.running:
-                reactor.stop()
-            raise error
+            # Blocks while the parse pipeline is full, packets will then be buffered by the data source server
+            if not self.pipeline.put(line, timestamp):
+                raise StopIteration('Stopped')
 
         try:
             connection.connect()
@@ -117,29 +180,89 @@ class TrackDirectDataCollector:
             if reactor.running:
                 reactor.stop()
 
-    def _parse(self, line, timestamp):
-        """Parse raw packet
+    def _consume_replay(self):
+        """Feed all lines in the replay capture file to the parse pipeline, then save the last batch and stop"""
+        try:
+            for line, timestamp in self.replay.get_lines():
+                if not reactor.running or not self.pipeline.put(line, timestamp):
+                    return
+
+            # Wait for the pipeline to deliver all packets
+            while reactor.running and self.pipeline.next_deliver_seq < self.pipeline.next_read_seq:
+                time.sleep(0.1)
+        except Exception as e:
+            self.logger.exception('Error in replay: %s', e)
+
+        if reactor.running:
+            reactor.callFromThread(self._finish_replay)
+
+    def _finish_replay(self):
+        """Save the last batch and stop (executed in the reactor thread)"""
+        self._insert_batch()
+        self.replay.finish()
+        reactor.stop()
+
+    def _on_parse_error(self, error):
+        """Executed in the reactor thread when parse failed with an exception
+
+        Args:
+            error (Exception): The exception raised by the parse method
+        """
+        # Parse will more or less only cast exception if db connection is lost
+        self.logger.error('Error in parse pipeline: %s', error)
+        if reactor.running:
+            reactor.stop()
+
+    def _prepare(self, lines):
+        """Parse raw packets with aprslib and resolve all names in them at once (executed in a parse pipeline worker thread)
+
+        Args:
+            lines (list): APRS raw packet strings
+
+        Returns:
+            list with one aprslib packet dict per line (None if aprslib failed to parse the line)
+        """
+        packet_dicts = []
+        for line in lines:
+            try:
+                packet_dicts.append(aprslib.parse(line))
+            except Exception:
+                # Handled when the line is parsed
+                packet_dicts.append(None)
+
+        try:
+            PacketNameResolver(self.db, self.source_id).resolve(packet_dicts)
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            self.logger.error('Error resolving names: %s', e, exc_info=True)
+        return packet_dicts
+
+    def _parse(self, line, timestamp, packet_dict=None):
+        """Parse raw packet (executed in a parse pipeline worker thread)
 
         Args:
             line (str): APRS raw packet string
             timestamp (int): Receive time of packet
+            packet_dict (dict): Packet dict already created by aprslib (optional)
 
         Returns:
             Packet
         """
+        started_timestamp = time.time()
         try:
-            self.delay = int(time.time()) - timestamp
-            if self.delay > 60:
-                self.logger.error(
-                    'Collector has a delay of %s seconds, ignoring packets until solved', self.delay)
-                return None
-            elif self.delay > 15:
-                self.logger.warning(
-                    'Collector has a delay of %s seconds', self.delay)
-
-            packet_dict = aprslib.parse(line)
+            delay = int(started_timestamp) - timestamp
+            if delay > 15 and self.delay <= 15:
+                self.logger.warning('Collector has a delay of %s seconds', delay)
+            self.delay = delay
+            if self.replay is not None:
+                self.replay.add_delay(delay)
+
+            if packet_dict is None:
+                packet_dict = aprslib.parse(line)
             parser = AprsPacketParser(self.db, self.save_ogn_stations_with_missing_identity)
             parser.set_source_id(self.source_id)
+            parser.set_station_state_cache(self.station_state_cache)
             packet = parser.get_packet(packet_dict, timestamp)
 
             if packet.map_id in [15, 16]:
@@ -158,6 +281,9 @@ class TrackDirectDataCollector:
             pass
         except Exception as e:
             self.logger.exception('Error in _parse method: %s', e)
+        finally:
+            if self.replay is not None:
+                self.replay.add_parse_latency(time.time() - started_timestamp)
         return None
 
     def _parse_unsupported_packet(self, line, timestamp):
@@ -335,9 +461,16 @@ class TrackDirectDataCollector:
             self.packets.reverse()
 
             # Do batch insert
-            packet_batch_inserter = PacketBatchInserter(
-                self.db, self.db_no_auto_commit)
+            if self.insert_method == 'copy':
+                packet_batch_inserter = PacketBatchCopyInserter(
+                    self.db, self.db_no_auto_commit, self.station_state_cache)
+            else:
+                packet_batch_inserter = PacketBatchInserter(
+                    self.db, self.db_no_auto_commit, self.station_state_cache)
+            started_timestamp = time.time()
             packet_batch_inserter.insert(self.packets[:])
+            if self.replay is not None:
+                self.replay.add_batch(time.time() - started_timestamp, len(self.packets))
 
             self._reset()
 
@@ -1,5 +1,5 @@
 import logging
-from twisted.internet import threads, reactor, task
+from twisted.internet import threads, reactor, defer
 from twisted.internet.error import AlreadyCancelled, AlreadyCalled
 from autobahn.twisted.websocket import WebSocketServerProtocol
 import json
@@ -8,16 +8,22 @@ import psycopg2
 import psycopg2.extras
 import os
 from server.trackdirect.TrackDirectConfig import TrackDirectConfig
-from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.database.DatabaseConnectionPool import DatabaseConnectionPool
 from server.trackdirect.websocket.WebsocketResponseCreator import WebsocketResponseCreator
 from server.trackdirect.websocket.WebsocketConnectionState import WebsocketConnectionState
-from server.trackdirect.websocket.aprsis.AprsISReader import AprsISReader
+from server.trackdirect.websocket.WebsocketPayloadEncoder import WebsocketPayloadEncoder
+from server.trackdirect.websocket.WebsocketTicker import WebsocketTicker
+from server.trackdirect.websocket.RequestCancellationToken import RequestCancellationToken
+from server.trackdirect.websocket.aprsis.AprsISHub import AprsISHub
 from server.trackdirect.websocket.aprsis.AprsISPayloadCreator import AprsISPayloadCreator
 
 
 class TrackDirectWebsocketServer(WebSocketServerProtocol):
     """The TrackDirectWebsocketServer class handles the incoming requests."""
 
+    # Position requests (map moves) received within this many seconds are coalesced, only the latest is handled
+    position_request_debounce_time = 0.15
+
     def __init__(self):
         """Initialize the TrackDirectWebsocketServer."""
         super().__init__()
@@ -27,17 +33,23 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
         self.max_queued_realtime_packets = None
         self.max_client_idle_time = None
 
-        db_connection = DatabaseConnection()
-        self.db = db_connection.get_connection(True)
+        # Connections are leased from the process pool by each job executed in a thread
+        self.db_pool = DatabaseConnectionPool()
+        self.db = self.db_pool.get_connection()
 
         self.connection_state = WebsocketConnectionState()
         self.response_creator = WebsocketResponseCreator(self.connection_state, self.db)
-        self.aprs_is_reader = AprsISReader(self.connection_state, self.db)
+        self.aprs_is_hub = AprsISHub()
         self.aprs_is_payload_creator = AprsISPayloadCreator(self.connection_state, self.db)
+        self.payload_encoder = WebsocketPayloadEncoder()
 
         self.number_of_real_time_packet_threads = 0
-        self.timestamp_sender_call = None
-        self.real_time_listener_call = None
+        self.ticker = WebsocketTicker()
+        # Requests that must be handled in order are chained to this deferred
+        self.request_queue = defer.succeed(None)
+        self.request_cancellation_token = None
+        self.pending_position_request = None
+        self.position_request_call = None
         self.on_inactive_call = None
         self.is_unknown_client = False
 
@@ -83,6 +95,9 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
                 self.logger.warning("Incoming request has no type")
                 self.logger.warning(payload)
                 return
+
+            if "payload_encoding" in request and request["payload_encoding"] != self.payload_encoder.encoding:
+                self.payload_encoder.set_encoding(request["payload_encoding"])
             self._on_request(request)
         except ValueError as exp:
             self.logger.warning(f"Incoming request could not be parsed ({exp})")
@@ -98,41 +113,110 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
         try:
             self.logger.info(f"WebSocket connection closed: {reason}")
             self.connection_state.disconnected = True
+            self._cancel_current_request()
+            if self.position_request_call is not None and self.position_request_call.active():
+                self.position_request_call.cancel()
             self._stop_timestamp_sender()
-            self._stop_real_time_listener(True)
-            if self.db:
-                self.db.close()
+            self._stop_real_time_listener()
         except Exception as e:
             self.logger.error(e, exc_info=True)
 
-    def _on_request(self, request, request_id=None):
+    def _on_request(self, request):
         """Executed on incoming request."""
         if request["payload_request_type"] != 11:
             self._re_schedule_inactive_event()
 
         if request["payload_request_type"] in [5, 7, 9]:
-            deferred = threads.deferToThread(self._process_request, request, None)
+            deferred = threads.deferToThread(self.db_pool.run, self._process_request, request, None)
             deferred.addErrback(self._on_error)
+        elif request["payload_request_type"] in [1, 11]:
+            # The previous position is no longer interesting, stop working on it
+            self._cancel_current_request()
+            if self.pending_position_request is not None and self.pending_position_request["payload_request_type"] == 11:
+                # Coalesced with a full update request, so this request must also be a full update
+                request = dict(request, payload_request_type=11)
+            self.pending_position_request = request
+            if self.position_request_call is None:
+                self.position_request_call = reactor.callLater(
+                    TrackDirectWebsocketServer.position_request_debounce_time, self._queue_position_request)
         else:
-            if request_id is None:
-                request_id = self.connection_state.latest_requestId + 1
-                self.connection_state.latest_request_type = request["payload_request_type"]
-                self.connection_state.latest_requestId = request_id
-                self.connection_state.latest_request_timestamp = int(time.time())
-                self._stop_real_time_listener(False)
-
-            if self.connection_state.latest_handled_request_id < request_id - 1:
-                reactor.callLater(0.1, self._on_request, request, request_id)
-            else:
-                self._update_state(request)
-                deferred = threads.deferToThread(self._process_request, request, request_id)
-                deferred.addErrback(self._on_error)
-                deferred.addCallback(self._on_request_done)
-
-    def _process_request(self, request, request_id):
+            self._queue_position_request()
+            self._queue_request(request)
+
+    def _queue_position_request(self):
+        """Queue the latest received position request (if any)."""
+        if self.position_request_call is not None and self.position_request_call.active():
+            self.position_request_call.cancel()
+        self.position_request_call = None
+
+        request = self.pending_position_request
+        self.pending_position_request = None
+        if request is not None and not self.connection_state.disconnected:
+            self._queue_request(request)
+
+    def _queue_request(self, request):
+        """Queue a request that must be handled after all previous requests.
+
+        Args:
+            request (dict): The request
+        """
+        self._cancel_current_request()
+        request_id = self.connection_state.latest_requestId + 1
+        self.connection_state.latest_request_type = request["payload_request_type"]
+        self.connection_state.latest_requestId = request_id
+        self.connection_state.latest_request_timestamp = int(time.time())
+        if request["payload_request_type"] != 1:
+            # A new position keeps the real time listener running, so packets in map sectors that is still visible are not missed
+            self._stop_real_time_listener()
+
+        cancellation_token = RequestCancellationToken(request_id)
+        self.request_cancellation_token = cancellation_token
+
+        # Started when all previous requests are handled (a failed request must not stop the following requests)
+        self.request_queue.addCallback(lambda result: self._start_request(request, request_id, cancellation_token))
+        self.request_queue.addErrback(self._on_error)
+
+    def _cancel_current_request(self):
+        """Cancel the latest queued request (it stops before its next database query)."""
+        if self.request_cancellation_token is not None:
+            self.request_cancellation_token.cancel()
+            self.request_cancellation_token = None
+
+    def _start_request(self, request, request_id, cancellation_token):
+        """Process the specified request in a thread (executed when all previous requests are handled).
+
+        Args:
+            request (dict): The request
+            request_id (int): Request id
+            cancellation_token (RequestCancellationToken): Cancelled when the request is superseded
+
+        Returns:
+            Deferred that fires when the request is handled
+        """
+        if self.connection_state.disconnected:
+            return None
+
+        only_latest_packet_requested = self.connection_state.only_latest_packet_requested
+        self._update_state(request)
+        if (self.connection_state.is_reset() or self.connection_state.no_real_time
+                or only_latest_packet_requested != self.connection_state.only_latest_packet_requested):
+            # Everything will be loaded again, stop listening until the new request is done
+            self._stop_real_time_listener()
+
+        if cancellation_token.is_cancelled() and request["payload_request_type"] in [1, 11]:
+            # Replaced by a newer request before it was started
+            self._on_request_done(request_id)
+            return None
+
+        deferred = threads.deferToThread(self.db_pool.run, self._process_request, request, request_id, cancellation_token)
+        deferred.addErrback(self._on_error)
+        deferred.addCallback(self._on_request_done)
+        return deferred
+
+    def _process_request(self, request, request_id, cancellation_token=None):
         """Send a response to websocket client based on request."""
         try:
-            for response in self.response_creator.get_responses(request, request_id):
+            for response in self.response_creator.get_responses(request, request_id, cancellation_token):
                 if self.connection_state.disconnected:
                     break
                 reactor.callFromThread(self._send_dict_response, response)
@@ -168,53 +252,41 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
         self.logger.error(error, exc_info=True)
 
     def _start_real_time_listener(self, related_request_id):
-        """Start real time APRS-IS listener."""
-        def read_real_time_packet():
-            if (self.connection_state.latest_requestId == related_request_id
-                    and not self.connection_state.disconnected):
-                self.aprs_is_reader.read(on_real_time_packet_found)
-
-        def on_real_time_packet_complete():
-            self.number_of_real_time_packet_threads -= 1
-            if self.number_of_real_time_packet_threads <= 0:
-                read_real_time_packet()
-
-        def on_real_time_packet_found(raw, source_id):
-            if raw is None and source_id is None:
-                self._on_inactive()
-            else:
-                if self.number_of_real_time_packet_threads > self.max_queued_realtime_packets:
-                    self.aprs_is_reader.clear(5)
-                else:
-                    self.number_of_real_time_packet_threads += 1
-                    deferred = threads.deferToThread(self._process_real_time_packet, raw, source_id)
-                    deferred.addCallback(lambda _: on_real_time_packet_complete())
-                    deferred.addErrback(self._on_error)
-
+        """Start real time APRS-IS listener (subscribe to the shared APRS-IS hub)."""
         self._send_response_by_type(34)
-        self.aprs_is_reader.start()
+        self.aprs_is_hub.subscribe(self, self.connection_state)
         self._send_response_by_type(31)
 
-        self.real_time_listener_call = task.LoopingCall(read_real_time_packet)
-        self.real_time_listener_call.start(0.2, False)
-
-    def _stop_real_time_listener(self, disconnect=False):
+    def _stop_real_time_listener(self):
         """Stop real time APRS-IS listener."""
-        if self.real_time_listener_call is not None:
-            try:
-                self.real_time_listener_call.stop()
-            except (AlreadyCalled, AssertionError):
-                pass
+        self.aprs_is_hub.unsubscribe(self)
 
-            if disconnect:
-                self.aprs_is_reader.stop()
-            else:
-                self.aprs_is_reader.pause()
+    def on_real_time_packet(self, packet):
+        """Executed by the APRS-IS hub when a packet matching our subscription is received.
+
+        Args:
+            packet (Packet): The real time packet (shared with other connections, must not be modified)
+        """
+        if self.connection_state.disconnected:
+            return
+
+        if self.number_of_real_time_packet_threads > self.max_queued_realtime_packets:
+            # Client is not keeping up, drop packet
+            return
+
+        self.number_of_real_time_packet_threads += 1
+        deferred = threads.deferToThread(self.db_pool.run, self._process_real_time_packet, packet)
+        deferred.addErrback(self._on_error)
+        deferred.addBoth(self._on_real_time_packet_done)
+
+    def _on_real_time_packet_done(self, result):
+        """Executed when a real time packet has been processed."""
+        self.number_of_real_time_packet_threads -= 1
 
-    def _process_real_time_packet(self, raw, source_id):
+    def _process_real_time_packet(self, packet):
         """Executed when we have a new real time packet to send."""
         try:
-            for response in self.aprs_is_payload_creator.get_payloads(raw, source_id):
+            for response in self.aprs_is_payload_creator.get_payloads(packet):
                 reactor.callFromThread(self._send_dict_response, response)
         except psycopg2.InterfaceError as e:
             self.logger.error(e, exc_info=True)
@@ -223,17 +295,21 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
             self.logger.error(e, exc_info=True)
 
     def _start_timestamp_sender(self):
-        """Schedule call to _sendTimestampResponse to keep connection up."""
-        self.timestamp_sender_call = task.LoopingCall(self._send_timestamp_response)
-        self.timestamp_sender_call.start(1.0)
+        """Send server timestamp now and on every tick of the shared ticker to keep connection up."""
+        self._send_timestamp_response()
+        self.ticker.subscribe(self)
 
     def _stop_timestamp_sender(self):
-        """Stop looping call to _sendTimestampResponse."""
-        if self.timestamp_sender_call is not None:
-            try:
-                self.timestamp_sender_call.stop()
-            except AssertionError:
-                pass
+        """Stop sending server timestamp."""
+        self.ticker.unsubscribe(self)
+
+    def on_tick(self, timestamp):
+        """Executed by the shared ticker once every second.
+
+        Args:
+            timestamp (int): Current timestamp
+        """
+        self._send_timestamp_response(timestamp)
 
     def _re_schedule_inactive_event(self):
         """Schedule call to _onInactive when client has been idle too long."""
@@ -249,7 +325,7 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
         try:
             self._send_response_by_type(36)
             self._stop_timestamp_sender()
-            self._stop_real_time_listener(True)
+            self._stop_real_time_listener()
             self.connection_state.total_reset()
         except psycopg2.InterfaceError as e:
             self.logger.error(e, exc_info=True)
@@ -258,12 +334,12 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
             self.logger.warning('Exception in _on_inactive')
             self.logger.warning(e, exc_info=False)
 
-    def _send_timestamp_response(self):
+    def _send_timestamp_response(self, timestamp=None):
         """Send server timestamp to synchronize server and client."""
         try:
             if self.connection_state.latest_handled_request_id < self.connection_state.latest_requestId:
                 return
-            data = {"timestamp": int(time.time())}
+            data = {"timestamp": timestamp if timestamp is not None else int(time.time())}
             self._send_response_by_type(41, data)
         except psycopg2.InterfaceError as e:
             self.logger.error(e, exc_info=True)
@@ -282,9 +358,9 @@ class TrackDirectWebsocketServer(WebSocketServerProtocol):
     def _send_dict_response(self, payload):
         """Send message dict payload to client."""
         try:
-            json_payload = json.dumps(payload, ensure_ascii=True).encode('utf8')
-            if json_payload is not None:
-                self.sendMessage(json_payload)
+            encoded_payload = self.payload_encoder.encode(payload)
+            if encoded_payload is not None:
+                self.sendMessage(encoded_payload)
         except psycopg2.InterfaceError as e:
             self.logger.error(e, exc_info=True)
             raise
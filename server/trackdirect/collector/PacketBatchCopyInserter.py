@@ -0,0 +1,106 @@
+import io
+from server.trackdirect.collector.PacketBatchInserter import PacketBatchInserter
+
+
+class PacketBatchCopyInserter(PacketBatchInserter):
+    """PacketBatchCopyInserter is used to add a list of packets to the database using COPY instead of INSERT
+
+    Note:
+        Rows are streamed to the database in CSV format using "COPY ... FROM STDIN", this avoids building
+        (and parsing) one huge INSERT statement for each table. Since COPY can not return the new id's,
+        the packet id's are allocated up front using one bulk nextval call on the packet id sequence.
+    """
+
+    packet_id_sequence = 'packet_id_seq'
+
+    def _insert_packet_rows(self, cur, packet_table, packet_tuples):
+        """
+        Insert rows into the specified packet table
+
+        Args:
+            cur (cursor): Database cursor to use
+            packet_table (str): Name of packet table
+            packet_tuples (list): One tuple for each packet, values in the same order as packet_columns
+
+        Returns:
+            list of the new packet id's (in the same order as the specified tuples)
+        """
+        packet_ids = self._allocate_ids(cur, self.packet_id_sequence, len(packet_tuples))
+        self._copy_rows(cur, packet_table, ('id',) + self.packet_columns,
+                        [(packet_id,) + packet_tuple for packet_id, packet_tuple in zip(packet_ids, packet_tuples)])
+        return packet_ids
+
+    def _insert_rows(self, cur, table, columns, tuples):
+        """
+        Insert rows into the specified table
+
+        Args:
+            cur (cursor): Database cursor to use
+            table (str): Name of table
+            columns (tuple): Column names
+            tuples (list): One tuple for each row, values in the same order as columns
+        """
+        self._copy_rows(cur, table, columns, tuples)
+
+    def _allocate_ids(self, cur, sequence, number_of_ids):
+        """
+        Allocate the specified number of id's from a sequence
+
+        Args:
+            cur (cursor): Database cursor to use
+            sequence (str): Name of sequence
+            number_of_ids (int): Number of id's to allocate
+
+        Returns:
+            list of id's in ascending order
+        """
+        cur.execute(
+            "SELECT nextval(%s) AS id FROM generate_series(1, %s) ORDER BY 1", (sequence, number_of_ids))
+        return [record["id"] for record in cur]
+
+    def _copy_rows(self, cur, table, columns, tuples):
+        """
+        Stream rows into the specified table using COPY
+
+        Args:
+            cur (cursor): Database cursor to use
+            table (str): Name of table
+            columns (tuple): Column names
+            tuples (list): One tuple for each row, values in the same order as columns
+        """
+        data = io.StringIO()
+        for row in tuples:
+            data.write(','.join(self._format_csv_value(value) for value in row))
+            data.write('\n')
+        data.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", data)
+
+    def _format_csv_value(self, value):
+        """
+        Format a value as a CSV field that COPY will interpret the same way as the INSERT path does
+
+        Note:
+            NULL is an unquoted empty field, while every string is quoted (so an empty string stays an empty string).
+
+        Args:
+            value: Value to format
+
+        Returns:
+            str
+        """
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, float) and value.is_integer():
+            # Integer columns does not accept "5.0" in COPY (INSERT will cast the numeric literal)
+            return str(int(value))
+        if isinstance(value, (int, float)):
+            return repr(value)
+        if isinstance(value, (list, tuple)):
+            value = '{' + ','.join('NULL' if item is None else str(item) for item in value) + '}'
+        elif isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        else:
+            value = str(value)
+        return '"' + value.replace('"', '""') + '"'
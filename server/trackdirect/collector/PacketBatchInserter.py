@@ -8,28 +8,45 @@ from server.trackdirect.database.PacketPathTableCreator import PacketPathTableCr
 from server.trackdirect.database.PacketWeatherTableCreator import PacketWeatherTableCreator
 from server.trackdirect.database.PacketTelemetryTableCreator import PacketTelemetryTableCreator
 from server.trackdirect.database.PacketOgnTableCreator import PacketOgnTableCreator
+from server.trackdirect.database.MapSectorStationIndex import MapSectorStationIndex
 
 
 class PacketBatchInserter:
     """PacketBatchInserter is used to add a list of packets to the database"""
 
-    def __init__(self, db, db_no_auto_commit):
+    packet_columns = ('station_id', 'sender_id', 'map_id', 'source_id', 'packet_type_id', 'latitude', 'longitude',
+                      'posambiguity', 'symbol', 'symbol_table', 'map_sector', 'related_map_sectors', 'marker_id',
+                      'marker_counter', 'speed', 'course', 'altitude', 'rng', 'phg', 'latest_phg_timestamp',
+                      'latest_rng_timestamp', 'timestamp', 'packet_tail_timestamp', 'is_moving', 'reported_timestamp',
+                      'position_timestamp', 'comment', 'raw_path', 'raw')
+
+    packet_path_columns = ('packet_id', 'station_id', 'latitude', 'longitude', 'timestamp', 'distance', 'number',
+                           'sending_station_id', 'sending_latitude', 'sending_longitude')
+
+    packet_weather_columns = ('packet_id', 'station_id', 'timestamp', 'humidity', 'pressure', 'rain_1h', 'rain_24h',
+                              'rain_since_midnight', 'temperature', 'wind_direction', 'wind_gust', 'wind_speed',
+                              'luminosity', 'snow', 'wx_raw_timestamp')
+
+    packet_ogn_columns = ('packet_id', 'station_id', 'timestamp', 'ogn_sender_address', 'ogn_address_type_id',
+                          'ogn_aircraft_type_id', 'ogn_climb_rate', 'ogn_turn_rate', 'ogn_signal_to_noise_ratio',
+                          'ogn_bit_errors_corrected', 'ogn_frequency_offset')
+
+    packet_telemetry_columns = ('packet_id', 'station_id', 'timestamp', 'val1', 'val2', 'val3', 'val4', 'val5',
+                                'bits', 'seq')
+
+    def __init__(self, db, db_no_auto_commit, station_state_cache=None):
         """
         Args:
             db (psycopg2.Connection): Database connection (with autocommit)
             db_no_auto_commit (psycopg2.Connection): Database connection (without autocommit)
+            station_state_cache (StationStateCache): Cache to update when packets has been committed
         """
         self.db = db
         self.db_no_auto_commit = db_no_auto_commit
+        self.station_state_cache = station_state_cache
         self.logger = logging.getLogger(__name__)
 
-        self.packet_id_list = []
-        self.weather_packet_id_list = []
-        self.ogn_packet_id_list = []
-        self.telemetry_packet_id_list = []
         self.path_packet_id_list = []
-        self.position_packet_id_list = []
-        self.confirmed_position_packet_id_list = []
 
     def insert(self, packets):
         """
@@ -46,8 +63,12 @@ class PacketBatchInserter:
             PacketMapIdModifier(cur, PacketTableCreator(self.db)).execute(packets)
 
             self._insert_into_packet_tables(packets, cur)
+            self._update_station_latest_packets(packets, cur)
 
             self.db_no_auto_commit.commit()
+
+            if self.station_state_cache is not None:
+                self.station_state_cache.on_batch_committed(packets)
         except psycopg2.InterfaceError as e:
             self.db_no_auto_commit.rollback()
             raise e
@@ -76,19 +97,35 @@ class PacketBatchInserter:
 
     def _perform_post_insert_actions(self, packets):
         """
-        Perform post insert updates like updating station latest packet and related
+        Perform post insert updates like updating the map sector station index
 
         Args:
             packets (list): Packets to insert
         """
-        timestamp = packets[0].timestamp
-        latest_packet_modifier = StationLatestPacketModifier(self.db)
-        latest_packet_modifier.update_station_latest_packet(self.packet_id_list, timestamp)
-        latest_packet_modifier.update_station_latest_telemetry_packet(self.telemetry_packet_id_list, timestamp)
-        latest_packet_modifier.update_station_latest_weather_packet(self.weather_packet_id_list, timestamp)
-        latest_packet_modifier.update_station_latest_ogn_packet(self.ogn_packet_id_list, timestamp)
-        latest_packet_modifier.update_station_latest_location_packet(self.position_packet_id_list, timestamp)
-        latest_packet_modifier.update_station_latest_confirmed_packet(self.confirmed_position_packet_id_list, timestamp)
+        try:
+            MapSectorStationIndex(self.db).add_packets([packet for packet in packets if packet.id is not None])
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            self.logger.error(e, exc_info=True)
+
+    def _update_station_latest_packets(self, packets, cur):
+        """
+        Update station latest packet columns in the same transaction as the packet insert
+
+        Args:
+            packets (list): Inserted packets
+            cur (cursor): Database cursor to use
+        """
+        cur.execute("SAVEPOINT station_latest_packet")
+        try:
+            StationLatestPacketModifier(self.db_no_auto_commit).update_station_latest_packets(packets)
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            # Keep the packets even if the stations could not be updated
+            cur.execute("ROLLBACK TO SAVEPOINT station_latest_packet")
+            self.logger.error(e, exc_info=True)
 
     def _insert_into_packet_tables(self, packets, cur):
         """
@@ -149,11 +186,7 @@ class PacketBatchInserter:
                                      packet.raw))
 
         try:
-            arg_string = b','.join(cur.mogrify(
-                "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                x) for x in date_packet_tuples)
-            sql = f"INSERT INTO {packet_table} (station_id, sender_id, map_id, source_id, packet_type_id, latitude, longitude, posambiguity, symbol, symbol_table, map_sector, related_map_sectors, marker_id, marker_counter, speed, course, altitude, rng, phg, latest_phg_timestamp, latest_rng_timestamp, timestamp, packet_tail_timestamp, is_moving, reported_timestamp, position_timestamp, comment, raw_path, raw) VALUES {arg_string.decode()} RETURNING id"
-            cur.execute(sql)
+            packet_ids = self._insert_packet_rows(cur, packet_table, date_packet_tuples)
         except psycopg2.InterfaceError as e:
             raise e
         except Exception as e:
@@ -161,19 +194,43 @@ class PacketBatchInserter:
             return
 
         i = 0
-        for record in cur:
+        for packet_id in packet_ids:
             if packets[i]:
-                packets[i].id = record["id"]
-
-                if packets[i].map_id in [1]:
-                    self.confirmed_position_packet_id_list.append(record["id"])
-                elif packets[i].map_id in [1, 5, 7, 9]:
-                    self.position_packet_id_list.append(record["id"])
-                else:
-                    # We only need to add the packet to the packetIdList if not in the positionPacketIdList or confirmedPositionPacketIdList array's
-                    self.packet_id_list.append(record["id"])
+                packets[i].id = packet_id
             i += 1
 
+    def _insert_packet_rows(self, cur, packet_table, packet_tuples):
+        """
+        Insert rows into the specified packet table
+
+        Args:
+            cur (cursor): Database cursor to use
+            packet_table (str): Name of packet table
+            packet_tuples (list): One tuple for each packet, values in the same order as packet_columns
+
+        Returns:
+            list of the new packet id's (in the same order as the specified tuples)
+        """
+        placeholders = '(' + ', '.join(['%s'] * len(self.packet_columns)) + ')'
+        arg_string = b','.join(cur.mogrify(placeholders, x) for x in packet_tuples)
+        cur.execute(
+            f"INSERT INTO {packet_table} ({', '.join(self.packet_columns)}) VALUES {arg_string.decode()} RETURNING id")
+        return [record["id"] for record in cur]
+
+    def _insert_rows(self, cur, table, columns, tuples):
+        """
+        Insert rows into the specified table
+
+        Args:
+            cur (cursor): Database cursor to use
+            table (str): Name of table
+            columns (tuple): Column names
+            tuples (list): One tuple for each row, values in the same order as columns
+        """
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        arg_string = b','.join(cur.mogrify(placeholders, x) for x in tuples)
+        cur.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {arg_string.decode()}")
+
     def _insert_into_packet_path_table(self, packets, cur):
         """
         Insert packets into the correct packet path table
@@ -205,9 +262,7 @@ class PacketBatchInserter:
 
         if path_tuples:
             try:
-                arg_string = b','.join(cur.mogrify(
-                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", x) for x in path_tuples)
-                cur.execute(f"INSERT INTO {packet_path_table} (packet_id, station_id, latitude, longitude, timestamp, distance, number, sending_station_id, sending_latitude, sending_longitude) VALUES {arg_string.decode()}")
+                self._insert_rows(cur, packet_path_table, self.packet_path_columns, path_tuples)
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
@@ -228,7 +283,6 @@ class PacketBatchInserter:
         weather_tuples = []
         for packet in packets:
             if packet.weather:
-                self.weather_packet_id_list.append(packet.id)
                 weather_tuples.append((packet.id,
                                       packet.station_id,
                                       packet.timestamp,
@@ -247,9 +301,7 @@ class PacketBatchInserter:
 
         if weather_tuples:
             try:
-                arg_string = b','.join(cur.mogrify(
-                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", x) for x in weather_tuples)
-                cur.execute(f"INSERT INTO {packet_weather_table} (packet_id, station_id, timestamp, humidity, pressure, rain_1h, rain_24h, rain_since_midnight, temperature, wind_direction, wind_gust, wind_speed, luminosity, snow, wx_raw_timestamp) VALUES {arg_string.decode()}")
+                self._insert_rows(cur, packet_weather_table, self.packet_weather_columns, weather_tuples)
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
@@ -271,7 +323,6 @@ class PacketBatchInserter:
         ogn_tuples = []
         for packet in packets:
             if packet.ogn:
-                self.ogn_packet_id_list.append(packet.id)
                 ogn_tuples.append((packet.id,
                                   packet.station_id,
                                   packet.timestamp,
@@ -286,9 +337,7 @@ class PacketBatchInserter:
 
         if ogn_tuples:
             try:
-                arg_string = b','.join(cur.mogrify(
-                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", x) for x in ogn_tuples)
-                cur.execute(f"INSERT INTO {packet_ogn_table} (packet_id, station_id, timestamp, ogn_sender_address, ogn_address_type_id, ogn_aircraft_type_id, ogn_climb_rate, ogn_turn_rate, ogn_signal_to_noise_ratio, ogn_bit_errors_corrected, ogn_frequency_offset) VALUES {arg_string.decode()}")
+                self._insert_rows(cur, packet_ogn_table, self.packet_ogn_columns, ogn_tuples)
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
@@ -309,7 +358,6 @@ class PacketBatchInserter:
         telemetry_tuples = []
         for packet in packets:
             if packet.telemetry:
-                self.telemetry_packet_id_list.append(packet.id)
                 if not packet.telemetry.is_duplicate():
                     telemetry_tuples.append((packet.id,
                                             packet.station_id,
@@ -324,16 +372,13 @@ class PacketBatchInserter:
 
         if telemetry_tuples:
             try:
-                arg_string = b','.join(cur.mogrify(
-                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", x) for x in telemetry_tuples)
-                cur.execute(
-                    f"INSERT INTO {packet_telemetry_table} (packet_id, station_id, timestamp, val1, val2, val3, val4, val5, bits, seq) VALUES {arg_string.decode()} RETURNING id")
+                self._insert_rows(cur, packet_telemetry_table, self.packet_telemetry_columns, telemetry_tuples)
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
                 self.logger.error(e, exc_info=True)
 
-            packet_telemetry_ids = [record['id'] for record in cur.fetchall()]
+            telemetry_packet_ids = [telemetry_tuple[0] for telemetry_tuple in telemetry_tuples]
 
             try:
                 cur.execute(f"""UPDATE {packet_telemetry_table} packet_telemetry SET
@@ -341,7 +386,7 @@ class PacketBatchInserter:
                                         station_telemetry_unit_id = (SELECT id FROM station_telemetry_unit WHERE station_id = packet_telemetry.station_id AND valid_to_ts IS NULL),
                                         station_telemetry_eqns_id = (SELECT id FROM station_telemetry_eqns WHERE station_id = packet_telemetry.station_id AND valid_to_ts IS NULL),
                                         station_telemetry_bits_id = (SELECT id FROM station_telemetry_bits WHERE station_id = packet_telemetry.station_id AND valid_to_ts IS NULL)
-                                    WHERE id IN %s""", (tuple(packet_telemetry_ids),))
+                                    WHERE packet_id IN %s""", (tuple(telemetry_packet_ids),))
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
@@ -0,0 +1,104 @@
+import logging
+import threading
+
+from server.trackdirect.parser.policies.PacketPathPolicy import PacketPathPolicy
+from server.trackdirect.parser.policies.StationNameFormatPolicy import StationNameFormatPolicy
+from server.trackdirect.repositories.SenderRepository import SenderRepository
+from server.trackdirect.repositories.StationRepository import StationRepository
+
+
+class PacketNameResolver:
+    """The PacketNameResolver resolves all sender, station and path station names in a batch of packets at once
+
+    Note:
+        The names are looked up using one query per table and the missing senders and stations are created using one
+        query per table. The result is added to the station and sender caches, so when the packets are parsed
+        (one by one by AprsPacketParser) the names are found in cache.
+
+        Names that can not be resolved here (like stations that does not belong to the source yet) are handled
+        by AprsPacketParser as before.
+    """
+
+    # Only one batch at a time may create stations and senders (names are not unique in the database)
+    create_lock = threading.Lock()
+
+    def __init__(self, db, source_id):
+        """The __init__ method.
+
+        Args:
+            db (psycopg2.Connection): Database connection (with autocommit)
+            source_id (int): Source id of the packets
+        """
+        self.db = db
+        self.source_id = 1 if source_id == 3 else source_id
+        self.logger = logging.getLogger('trackdirect')
+        self.station_repository = StationRepository(db)
+        self.sender_repository = SenderRepository(db)
+
+        # OGN packets may be renamed or dropped when parsed, so OGN stations are only created when the packet is parsed
+        self.create_missing = source_id != 5
+
+    def resolve(self, packet_dicts):
+        """Resolve the names in the specified packets
+
+        Args:
+            packet_dicts (list): Packet dicts created by aprslib (None for packets that could not be parsed)
+        """
+        sender_names = {}
+        station_type_id_by_name = {}
+        path_station_names = {}
+        for packet_dict in packet_dicts:
+            if packet_dict is None or not packet_dict.get('from'):
+                continue
+
+            sender_name = StationNameFormatPolicy.get_correct_format(packet_dict['from'])
+            if not sender_name:
+                continue
+            sender_names[sender_name] = True
+
+            # Same station name and type logic as in AprsPacketParser
+            station_name = sender_name
+            station_type_id = 1
+            if packet_dict.get('object_name'):
+                station_name = StationNameFormatPolicy.get_correct_format(packet_dict['object_name']) or sender_name
+                if station_name != sender_name:
+                    station_type_id = 2
+            if station_type_id_by_name.get(station_name) != 1:
+                station_type_id_by_name[station_name] = station_type_id
+
+            if isinstance(packet_dict.get('path'), list):
+                for name in PacketPathPolicy.get_path_station_names(packet_dict['path']):
+                    path_station_names[name] = True
+
+        missing_sender_names = self.sender_repository.cache_object_list_by_names(
+            self.sender_repository.get_uncached_names(list(sender_names)))
+
+        station_names = list(station_type_id_by_name) + [name for name in path_station_names if name not in station_type_id_by_name]
+        missing_station_names = self.station_repository.cache_object_list_by_names(
+            self.station_repository.get_uncached_names(station_names, self.source_id), self.source_id)
+
+        if self.create_missing and (missing_sender_names or missing_station_names):
+            # A new sender always get a station with the same name (like in SenderRepository.get_object_by_name)
+            missing_station_type_id_by_name = {name: station_type_id_by_name[name]
+                                               for name in missing_station_names if name in station_type_id_by_name}
+            for name in missing_sender_names:
+                if name in missing_station_names or name not in station_type_id_by_name:
+                    missing_station_type_id_by_name[name] = 1
+            self._create(missing_sender_names, missing_station_type_id_by_name)
+
+    def _create(self, sender_names, station_type_id_by_name):
+        """Create the specified senders and stations (that has not been created by someone else meanwhile)
+
+        Args:
+            sender_names (list): Sender names
+            station_type_id_by_name (dict): Station type id for each station name
+        """
+        with PacketNameResolver.create_lock:
+            sender_names = self.sender_repository.cache_object_list_by_names(
+                self.sender_repository.get_uncached_names(sender_names))
+            missing_station_names = self.station_repository.cache_object_list_by_names(
+                self.station_repository.get_uncached_names(list(station_type_id_by_name), self.source_id), self.source_id)
+
+            self.sender_repository.create_object_list(sender_names)
+            self.station_repository.create_object_list(
+                {name: station_type_id_by_name[name] for name in missing_station_names}, self.source_id)
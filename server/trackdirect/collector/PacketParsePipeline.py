@@ -0,0 +1,266 @@
+import logging
+import queue
+import threading
+import time
+from twisted.internet import reactor, task
+
+
+class PacketParsePipeline:
+    """The PacketParsePipeline parses raw packets in parallel and delivers the result in arrival order
+
+    Note:
+        The pipeline has three stages:
+        1. A bounded read queue that the APRS-IS reader thread puts raw lines into
+        2. A number of parse worker threads that takes lines from the read queue (each worker takes all queued lines,
+           up to max_batch_size, and passes them to the prepare function before they are parsed one by one)
+        3. A reorder buffer that delivers parsed packets to the reactor thread in the same order as they was read
+
+        The total number of lines in the pipeline (queued, being parsed or waiting in the reorder buffer) is limited,
+        when the limit is reached the reader thread is blocked until the slowest stage has caught up (backpressure).
+        Blocked threads checks every stop_check_interval seconds if the pipeline (or the reactor) has been stopped,
+        since nothing will be delivered after that.
+    """
+
+    # Number of seconds between each metrics log entry
+    metrics_interval = 60
+
+    # Max number of lines that a parse worker takes from the read queue at once
+    max_batch_size = 50
+
+    # Number of seconds between each check if the pipeline has been stopped (while a thread is blocked)
+    stop_check_interval = 0.5
+
+    def __init__(self, parse_function, on_packet, on_error, number_of_workers=4, queue_size=1000, prepare_function=None):
+        """The __init__ method.
+
+        Args:
+            parse_function (callable): Function that takes (line, timestamp) and returns a Packet or None
+                                       (if prepare_function is used the prepared value is added as a third argument)
+            on_packet (callable): Function called in the reactor thread for each parsed packet (in arrival order)
+            on_error (callable): Function called in the reactor thread if parse_function raises an exception
+            number_of_workers (int): Number of parse worker threads
+            queue_size (int): Max number of lines in the pipeline
+            prepare_function (callable): Function that takes a list of lines and returns one prepared value per line
+        """
+        self.logger = logging.getLogger('trackdirect')
+
+        self.parse_function = parse_function
+        self.prepare_function = prepare_function
+        self.on_packet = on_packet
+        self.on_error = on_error
+        self.number_of_workers = max(1, int(number_of_workers))
+        self.queue_size = max(self.number_of_workers, int(queue_size))
+
+        self.read_queue = queue.Queue(self.queue_size)
+        self.slots = threading.Semaphore(self.queue_size)
+        self.reorder_buffer = {}
+        self.reorder_buffer_lock = threading.Lock()
+        self.next_read_seq = 0
+        self.next_deliver_seq = 0
+
+        self.workers = []
+        self.is_stopped = False
+        self.metrics_call = None
+        self._reset_metrics()
+
+    def start(self):
+        """Start the parse worker threads and the metrics logger"""
+        for i in range(self.number_of_workers):
+            worker = threading.Thread(target=self._work, name='parse-worker-' + str(i), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        self.metrics_call = task.LoopingCall(self._log_metrics)
+        reactor.callFromThread(self.metrics_call.start, PacketParsePipeline.metrics_interval, False)
+
+    def stop(self):
+        """Stop all parse worker threads and unblock the reader thread (executed in the reactor thread)
+
+        Note:
+            Lines still in the pipeline are dropped, the worker threads exits within stop_check_interval seconds.
+        """
+        self.is_stopped = True
+        self.workers = []
+
+        if self.metrics_call is not None and self.metrics_call.running:
+            self.metrics_call.stop()
+
+    def put(self, line, timestamp):
+        """Add a raw line to the pipeline (blocks while the pipeline is full)
+
+        Note:
+            Should only be called from one thread (the thread reading from the data source)
+
+        Args:
+            line (str): APRS raw packet string
+            timestamp (int): Receive time of packet
+
+        Returns:
+            True if the line was added, False if the pipeline (or the reactor) has been stopped
+        """
+        if self.is_stopped:
+            return False
+
+        if not self.slots.acquire(False):
+            blocked_timestamp = time.time()
+            while not self.slots.acquire(timeout=PacketParsePipeline.stop_check_interval):
+                if self.is_stopped or not reactor.running:
+                    # Slots are released by the reactor thread, the pipeline will never be drained
+                    return False
+            self.metrics['blocked_time'] += time.time() - blocked_timestamp
+            self.metrics['blocked_count'] += 1
+
+        seq = self.next_read_seq
+        self.next_read_seq += 1
+        self.read_queue.put((seq, line, timestamp, time.time()))
+        return True
+
+    def _work(self):
+        """Parse worker main loop (executed in a parse worker thread)"""
+        while True:
+            items = self._get_batch()
+            if items is None:
+                return
+
+            prepared_values = [None] * len(items)
+            prepare_error = None
+            if self.prepare_function is not None and items:
+                try:
+                    prepared_values = self.prepare_function([item[1] for item in items])
+                except Exception as e:
+                    prepare_error = e
+
+            for index, item in enumerate(items):
+                seq, line, timestamp, queued_timestamp = item
+                started_timestamp = time.time()
+                packet = None
+                error = prepare_error if index == 0 else None
+                if error is None:
+                    try:
+                        if self.prepare_function is not None:
+                            packet = self.parse_function(line, timestamp, prepared_values[index])
+                        else:
+                            packet = self.parse_function(line, timestamp)
+                    except Exception as e:
+                        error = e
+                parsed_timestamp = time.time()
+
+                with self.reorder_buffer_lock:
+                    self.reorder_buffer[seq] = (packet, error, queued_timestamp, started_timestamp, parsed_timestamp)
+                reactor.callFromThread(self._deliver)
+
+    def _get_batch(self):
+        """Returns the next lines to parse, blocks until at least one line is available
+
+        Returns:
+            list of queued items (None if the worker should stop)
+        """
+        while True:
+            if self.is_stopped:
+                return None
+            try:
+                items = [self.read_queue.get(timeout=PacketParsePipeline.stop_check_interval)]
+                break
+            except queue.Empty:
+                pass
+
+        while len(items) < PacketParsePipeline.max_batch_size:
+            try:
+                items.append(self.read_queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _deliver(self):
+        """Deliver all parsed packets that are next in turn (executed in the reactor thread)"""
+        while True:
+            with self.reorder_buffer_lock:
+                result = self.reorder_buffer.pop(self.next_deliver_seq, None)
+                reorder_buffer_depth = len(self.reorder_buffer)
+            if result is None:
+                return
+
+            self.next_deliver_seq += 1
+            self.slots.release()
+
+            packet, error, queued_timestamp, started_timestamp, parsed_timestamp = result
+            delivered_timestamp = time.time()
+            self._add_metrics(started_timestamp - queued_timestamp,
+                              parsed_timestamp - started_timestamp,
+                              delivered_timestamp - parsed_timestamp,
+                              reorder_buffer_depth)
+
+            if error is not None:
+                self.on_error(error)
+            else:
+                self.on_packet(packet)
+
+    def _add_metrics(self, queue_latency, parse_latency, reorder_latency, reorder_buffer_depth):
+        """Add latency and depth values for one delivered packet
+
+        Args:
+            queue_latency (float): Seconds the line waited in the read queue
+            parse_latency (float): Seconds spent in the parse function
+            reorder_latency (float): Seconds the parsed packet waited in the reorder buffer
+            reorder_buffer_depth (int): Number of packets left in the reorder buffer
+        """
+        metrics = self.metrics
+        metrics['packets'] += 1
+        metrics['queue_latency'] += queue_latency
+        metrics['parse_latency'] += parse_latency
+        metrics['reorder_latency'] += reorder_latency
+        metrics['max_queue_latency'] = max(metrics['max_queue_latency'], queue_latency)
+        metrics['max_parse_latency'] = max(metrics['max_parse_latency'], parse_latency)
+        metrics['max_reorder_latency'] = max(metrics['max_reorder_latency'], reorder_latency)
+        metrics['max_read_queue_depth'] = max(metrics['max_read_queue_depth'], self.read_queue.qsize())
+        metrics['max_reorder_buffer_depth'] = max(metrics['max_reorder_buffer_depth'], reorder_buffer_depth)
+
+    def _reset_metrics(self):
+        """Reset the metrics for a new interval"""
+        self.metrics = {
+            'packets': 0,
+            'queue_latency': 0.0,
+            'parse_latency': 0.0,
+            'reorder_latency': 0.0,
+            'max_queue_latency': 0.0,
+            'max_parse_latency': 0.0,
+            'max_reorder_latency': 0.0,
+            'max_read_queue_depth': 0,
+            'max_reorder_buffer_depth': 0,
+            'blocked_count': 0,
+            'blocked_time': 0.0
+        }
+
+    def get_metrics(self):
+        """Returns the metrics for the current interval
+
+        Returns:
+            dict
+        """
+        metrics = dict(self.metrics)
+        metrics['read_queue_depth'] = self.read_queue.qsize()
+        with self.reorder_buffer_lock:
+            metrics['reorder_buffer_depth'] = len(self.reorder_buffer)
+        return metrics
+
+    def _log_metrics(self):
+        """Log the metrics for the latest interval and start a new interval"""
+        metrics = self.get_metrics()
+        self._reset_metrics()
+
+        packets = max(1, metrics['packets'])
+        message = ('Parse pipeline: %s packets, read queue %s (max %s), reorder buffer %s (max %s), '
+                   'avg/max latency queue %.3f/%.3fs parse %.3f/%.3fs reorder %.3f/%.3fs, '
+                   'reader blocked %s times (%.1fs)')
+        args = (metrics['packets'],
+                metrics['read_queue_depth'], metrics['max_read_queue_depth'],
+                metrics['reorder_buffer_depth'], metrics['max_reorder_buffer_depth'],
+                metrics['queue_latency'] / packets, metrics['max_queue_latency'],
+                metrics['parse_latency'] / packets, metrics['max_parse_latency'],
+                metrics['reorder_latency'] / packets, metrics['max_reorder_latency'],
+                metrics['blocked_count'], metrics['blocked_time'])
+
+        if metrics['blocked_count'] > 0:
+            self.logger.warning(message, *args)
+        else:
+            self.logger.info(message, *args)
@@ -0,0 +1,53 @@
+import gzip
+import threading
+
+
+class RawFeedCapture:
+    """The RawFeedCapture class writes received raw lines (with receive timestamp) to a gzip compressed file
+
+    Note:
+        Each line in the file contains the receive timestamp, a tab and the raw line. The file can be replayed using
+        server/bin/replay.py (see RawFeedReplay).
+    """
+
+    def __init__(self, file_name):
+        """The __init__ method.
+
+        Args:
+            file_name (str): File to append captured lines to
+        """
+        self.file = gzip.open(file_name, 'ab')
+        self.lock = threading.Lock()
+
+    def write(self, line, timestamp):
+        """Write one raw line to the capture file
+
+        Args:
+            line (bytes): APRS raw packet
+            timestamp (int): Receive time of packet
+        """
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(b'%d\t%s\n' % (timestamp, line))
+
+    def close(self):
+        """Flush and close the capture file"""
+        with self.lock:
+            self.file.close()
+
+    @staticmethod
+    def read(file_name):
+        """Returns a generator with all captured lines in the specified file
+
+        Args:
+            file_name (str): Capture file
+
+        Returns:
+            generator of tuples with receive timestamp (int) and raw line (bytes)
+        """
+        with gzip.open(file_name, 'rb') as file:
+            for row in file:
+                timestamp, line = row.rstrip(b'\n').split(b'\t', 1)
+                yield int(timestamp), line
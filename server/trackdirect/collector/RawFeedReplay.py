@@ -0,0 +1,108 @@
+import time
+import threading
+
+from server.trackdirect.collector.RawFeedCapture import RawFeedCapture
+
+
+class RawFeedReplay:
+    """The RawFeedReplay class feeds captured raw lines to the collector and collects performance statistics
+
+    Note:
+        Lines are replayed with the same spacing as when they was captured (speed 1), N times faster (speed N) or
+        as fast as the collector can handle them (speed 0). Packets are given the current time as receive time,
+        so they are inserted into the packet tables of today.
+    """
+
+    def __init__(self, file_name, speed=1):
+        """The __init__ method.
+
+        Args:
+            file_name (str): Capture file created by RawFeedCapture
+            speed (float): Replay speed, 0 means unlimited
+        """
+        self.file_name = file_name
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.start_timestamp = None
+        self.end_timestamp = None
+        self.lines = 0
+        self.parse_latencies = []
+        self.batch_times = []
+        self.batch_packets = 0
+        self.max_delay = 0
+
+    def get_lines(self):
+        """Returns a generator with the lines to replay, sleeps between lines to get the requested speed
+
+        Returns:
+            generator of tuples with raw line (bytes) and receive timestamp (int)
+        """
+        self.start_timestamp = time.time()
+        first_capture_timestamp = None
+        for capture_timestamp, line in RawFeedCapture.read(self.file_name):
+            if first_capture_timestamp is None:
+                first_capture_timestamp = capture_timestamp
+
+            if self.speed > 0:
+                wait = self.start_timestamp + (capture_timestamp - first_capture_timestamp) / self.speed - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+
+            self.lines += 1
+            yield line, int(time.time())
+
+    def add_parse_latency(self, latency):
+        """Add the time it took to parse one line
+
+        Args:
+            latency (float): Seconds
+        """
+        with self.lock:
+            self.parse_latencies.append(latency)
+
+    def add_batch(self, db_time, number_of_packets):
+        """Add the time it took to insert one batch
+
+        Args:
+            db_time (float): Seconds
+            number_of_packets (int): Number of packets in batch
+        """
+        self.batch_times.append(db_time)
+        self.batch_packets += number_of_packets
+
+    def add_delay(self, delay):
+        """Add the collector delay (seconds between receive time and parse)
+
+        Args:
+            delay (int): Seconds
+        """
+        self.max_delay = max(self.max_delay, delay)
+
+    def finish(self):
+        """Mark the replay as finished"""
+        self.end_timestamp = time.time()
+
+    def get_report(self):
+        """Returns the replay statistics as text
+
+        Returns:
+            str
+        """
+        elapsed = max((self.end_timestamp or time.time()) - self.start_timestamp, 0.001)
+        latencies = sorted(self.parse_latencies)
+
+        def percentile(values, value_percentile):
+            if not values:
+                return 0
+            return values[min(len(values) - 1, int(len(values) * value_percentile / 100))]
+
+        batches = max(1, len(self.batch_times))
+        return '\n'.join([
+            f'Replayed {self.lines} lines from {self.file_name} in {elapsed:.1f}s ({self.lines / elapsed:.1f} lines/s)',
+            f'Inserted {self.batch_packets} packets in {len(self.batch_times)} batches ({self.batch_packets / elapsed:.1f} packets/s)',
+            f'Parse latency p50 {percentile(latencies, 50) * 1000:.2f}ms, p90 {percentile(latencies, 90) * 1000:.2f}ms, '
+            f'p99 {percentile(latencies, 99) * 1000:.2f}ms, max {percentile(latencies, 100) * 1000:.2f}ms',
+            f'DB time per batch avg {sum(self.batch_times) / batches * 1000:.1f}ms, '
+            f'max {max(self.batch_times, default=0) * 1000:.1f}ms (total {sum(self.batch_times):.1f}s)',
+            f'Max delay {self.max_delay}s'
+        ])
@@ -1,9 +1,34 @@
-from server.trackdirect.database.PacketTableCreator import PacketTableCreator
 import psycopg2
 
 class StationLatestPacketModifier:
     """The StationLatestPacketModifier class contains functionality to modify the station latest packet."""
 
+    # Station columns (and types) for each kind of latest packet
+    column_families = {
+        'packet': (('latest_packet_id', 'bigint'),
+                   ('latest_packet_timestamp', 'bigint')),
+        'location': (('latest_location_packet_id', 'bigint'),
+                     ('latest_location_packet_timestamp', 'bigint')),
+        'confirmed': (('latest_sender_id', 'bigint'),
+                      ('latest_confirmed_packet_id', 'bigint'),
+                      ('latest_confirmed_marker_id', 'bigint'),
+                      ('latest_confirmed_packet_timestamp', 'bigint'),
+                      ('latest_confirmed_symbol', 'text'),
+                      ('latest_confirmed_symbol_table', 'text'),
+                      ('latest_confirmed_latitude', 'double precision'),
+                      ('latest_confirmed_longitude', 'double precision')),
+        'telemetry': (('latest_telemetry_packet_id', 'bigint'),
+                      ('latest_telemetry_packet_timestamp', 'bigint')),
+        'weather': (('latest_weather_packet_id', 'bigint'),
+                    ('latest_weather_packet_timestamp', 'bigint'),
+                    ('latest_weather_packet_comment', 'text')),
+        'ogn': (('latest_ogn_packet_id', 'bigint'),
+                ('latest_ogn_packet_timestamp', 'bigint'),
+                ('latest_ogn_sender_address', 'text'),
+                ('latest_ogn_aircraft_type_id', 'smallint'),
+                ('latest_ogn_address_type_id', 'smallint'))
+    }
+
     def __init__(self, db: psycopg2.extensions.connection):
         """The __init__ method.
 
@@ -11,170 +36,84 @@ class StationLatestPacketModifier:
             db (psycopg2.extensions.connection): Database connection
         """
         self.db = db
-        self.packet_table_creator = PacketTableCreator(db)
-
-    def update_station_latest_confirmed_packet(self, packet_id_list, timestamp):
-        """Updates several stations latest confirmed packet based on the specified list of packet id's.
-
-        Args:
-            packet_id_list (list): Array of packet id's that should be used to set the latest packets on related stations
-            timestamp (int): Unix timestamp which is in the same date as the receive date of all packets (UTC)
-
-        Returns:
-            int: Number of updated stations
-        """
-        if packet_id_list:
-            packet_table = self.packet_table_creator.get_table(timestamp)
-            cur = self.db.cursor()
-            sql = cur.mogrify(f"""
-                UPDATE station SET latest_sender_id = packet.sender_id,
-                    latest_confirmed_packet_id = packet.id,
-                    latest_confirmed_marker_id = packet.marker_id,
-                    latest_confirmed_packet_timestamp = packet.timestamp,
-                    latest_confirmed_symbol = packet.symbol,
-                    latest_confirmed_symbol_table = packet.symbol_table,
-                    latest_confirmed_latitude = packet.latitude,
-                    latest_confirmed_longitude = packet.longitude,
-                    latest_location_packet_id = packet.id,
-                    latest_location_packet_timestamp = packet.timestamp,
-                    latest_packet_id = packet.id,
-                    latest_packet_timestamp = packet.timestamp
-                FROM {packet_table} packet
-                WHERE packet.station_id = station.id
-                AND packet.id IN %s""", (tuple(packet_id_list),))
-            cur.execute(sql)
-            row_count = cur.rowcount
-            cur.close()
-            return row_count
-        return 0
-
-    def update_station_latest_location_packet(self, packet_id_list, timestamp):
-        """Updates several stations latest location packet based on the specified list of packet id's.
-
-        Args:
-            packet_id_list (list): Array of packet id's that should be used to set the latest packets on related stations
-            timestamp (int): Unix timestamp which is in the same date as the receive date of all packets (UTC)
-
-        Returns:
-            int: Number of updated stations
-        """
-        if packet_id_list:
-            packet_table = self.packet_table_creator.get_table(timestamp)
-            cur = self.db.cursor()
-            sql = cur.mogrify(f"""
-                UPDATE station SET latest_location_packet_id = packet.id,
-                    latest_location_packet_timestamp = packet.timestamp,
-                    latest_packet_id = packet.id,
-                    latest_packet_timestamp = packet.timestamp 
-                FROM {packet_table} packet
-                WHERE packet.station_id = station.id
-                AND packet.id IN %s""", (tuple(packet_id_list),))
-            cur.execute(sql)
-            row_count = cur.rowcount
-            cur.close()
-            return row_count
-        return 0
 
-    def update_station_latest_packet(self, packet_id_list, timestamp):
-        """Updates several stations latest packet based on the specified list of packet id's.
+    def update_station_latest_packets(self, packets):
+        """Updates the latest packet columns of all stations in the specified packets using one statement.
 
-        Args:
-            packet_id_list (list): Array of packet id's that should be used to set the latest packets on related stations
-            timestamp (int): Unix timestamp which is in the same date as the receive date of all packets (UTC)
-
-        Returns:
-            int: Number of updated stations
-        """
-        if packet_id_list:
-            packet_table = self.packet_table_creator.get_table(timestamp)
-            cur = self.db.cursor()
-            sql = cur.mogrify(f"""
-                UPDATE station SET latest_packet_id = packet.id,
-                    latest_packet_timestamp = packet.timestamp
-                FROM {packet_table} packet
-                WHERE packet.station_id = station.id
-                AND packet.id IN %s""", (tuple(packet_id_list),))
-            cur.execute(sql)
-            row_count = cur.rowcount
-            cur.close()
-            return row_count
-        return 0
-
-    def update_station_latest_telemetry_packet(self, packet_id_list, timestamp):
-        """Updates several stations latest telemetry packet based on the specified list of packet id's.
+        Note:
+            The values are taken from the packets (no packet table is read). For each station and kind of latest
+            packet the packet with the highest timestamp (and id) is used, columns for kinds that the batch has no
+            packet for are left unchanged.
 
         Args:
-            packet_id_list (list): Array of packet id's that should be used to set the latest packets on related stations
-            timestamp (int): Unix timestamp which is in the same date as the receive date of all packets (UTC)
+            packets (list): Inserted packets (in any order)
 
         Returns:
             int: Number of updated stations
         """
-        if packet_id_list:
-            packet_table = self.packet_table_creator.get_table(timestamp)
-            cur = self.db.cursor()
-            sql = cur.mogrify(f"""
-                UPDATE station SET latest_telemetry_packet_id = packet.id,
-                    latest_telemetry_packet_timestamp = packet.timestamp
-                FROM {packet_table} packet
-                WHERE packet.station_id = station.id
-                AND packet.id IN %s""", (tuple(packet_id_list),))
-            cur.execute(sql)
-            row_count = cur.rowcount
-            cur.close()
-            return row_count
-        return 0
-
-    def update_station_latest_ogn_packet(self, packet_id_list, timestamp):
-        """Updates several stations latest OGN packet based on the specified list of packet id's.
+        latest_values_by_station_id = {}
+        latest_keys_by_station_id = {}
+        for packet in packets:
+            if packet.id is not None:
+                latest_values = latest_values_by_station_id.setdefault(packet.station_id, {})
+                latest_keys = latest_keys_by_station_id.setdefault(packet.station_id, {})
+                key = (packet.timestamp, packet.id)
+                for family, values in self._get_latest_values(packet).items():
+                    if family not in latest_keys or latest_keys[family] < key:
+                        latest_keys[family] = key
+                        latest_values[family] = values
+
+        if not latest_values_by_station_id:
+            return 0
+
+        columns = ['station_id']
+        placeholders = ['%s::bigint']
+        assignments = []
+        for family, family_columns in StationLatestPacketModifier.column_families.items():
+            columns.append(f'has_{family}')
+            placeholders.append('%s::boolean')
+            for column, column_type in family_columns:
+                columns.append(column)
+                placeholders.append(f'%s::{column_type}')
+                assignments.append(f'{column} = CASE WHEN latest.has_{family} THEN latest.{column} ELSE station.{column} END')
+
+        cur = self.db.cursor()
+        rows = []
+        for station_id, latest_values in latest_values_by_station_id.items():
+            row = [station_id]
+            for family, family_columns in StationLatestPacketModifier.column_families.items():
+                row.append(family in latest_values)
+                row.extend(latest_values.get(family, (None,) * len(family_columns)))
+            rows.append(cur.mogrify('(' + ', '.join(placeholders) + ')', row).decode())
+
+        cur.execute(f"""
+            UPDATE station SET {', '.join(assignments)}
+            FROM (VALUES {', '.join(rows)}) AS latest ({', '.join(columns)})
+            WHERE station.id = latest.station_id""")
+        row_count = cur.rowcount
+        cur.close()
+        return row_count
+
+    def _get_latest_values(self, packet):
+        """Returns the station column values that the specified packet should set, for each kind of latest packet
 
         Args:
-            packet_id_list (list): Array of packet id's that should be used to set the latest packets on related stations
-            timestamp (int): Unix timestamp which is in the same date as the receive date of all packets (UTC)
+            packet (Packet): Inserted packet
 
         Returns:
-            int: Number of updated stations
-        """
-        if packet_id_list:
-            packet_ogn_table = self.packet_table_creator.get_table(timestamp) + '_ogn'
-            cur = self.db.cursor()
-            sql = cur.mogrify(f"""
-                UPDATE station SET latest_ogn_packet_id = packet_ogn.packet_id,
-                    latest_ogn_packet_timestamp = packet_ogn.timestamp,
-                    latest_ogn_sender_address = packet_ogn.ogn_sender_address,
-                    latest_ogn_aircraft_type_id = packet_ogn.ogn_aircraft_type_id,
-                    latest_ogn_address_type_id = packet_ogn.ogn_address_type_id
-                FROM {packet_ogn_table} packet_ogn
-                WHERE packet_ogn.station_id = station.id
-                AND packet_ogn.packet_id IN %s""", (tuple(packet_id_list),))
-            cur.execute(sql)
-            row_count = cur.rowcount
-            cur.close()
-            return row_count
-        return 0
-
-    def update_station_latest_weather_packet(self, packet_id_list, timestamp):
-        """Updates several stations latest weather packet based on the specified list of packet id's.
-
-        Args:
-            packet_id_list (list): Array of packet id's that should be used to set the latest packets on related stations
-            timestamp (int): Unix timestamp which is in the same date as the receive date of all packets (UTC)
-
-        Returns:
-            int: Number of updated stations
+            dict: Column values (in the same order as in column_families) by kind of latest packet
         """
-        if packet_id_list:
-            packet_table = self.packet_table_creator.get_table(timestamp)
-            cur = self.db.cursor()
-            sql = cur.mogrify(f"""
-                UPDATE station SET latest_weather_packet_id = packet.id,
-                    latest_weather_packet_timestamp = packet.timestamp,
-                    latest_weather_packet_comment = packet.comment
-                FROM {packet_table} packet
-                WHERE packet.station_id = station.id
-                AND packet.id IN %s""", (tuple(packet_id_list),))
-            cur.execute(sql)
-            row_count = cur.rowcount
-            cur.close()
-            return row_count
-        return 0
\ No newline at end of file
+        result = {'packet': (packet.id, packet.timestamp)}
+        if packet.map_id in [1, 5, 7, 9]:
+            result['location'] = (packet.id, packet.timestamp)
+        if packet.map_id == 1:
+            result['confirmed'] = (packet.sender_id, packet.id, packet.marker_id, packet.timestamp, packet.symbol,
+                                   packet.symbol_table, packet.latitude, packet.longitude)
+        if packet.telemetry:
+            result['telemetry'] = (packet.id, packet.timestamp)
+        if packet.weather:
+            result['weather'] = (packet.id, packet.timestamp, packet.comment)
+        if packet.ogn:
+            result['ogn'] = (packet.id, packet.timestamp, packet.ogn.ogn_sender_address,
+                             packet.ogn.ogn_aircraft_type_id, packet.ogn.ogn_address_type_id)
+        return result
@@ -0,0 +1,240 @@
+import logging
+import threading
+from collections import OrderedDict
+
+import psycopg2
+
+from server.trackdirect.collector.PacketBatchInserter import PacketBatchInserter
+from server.trackdirect.database.PacketTableCreator import PacketTableCreator
+from server.trackdirect.exceptions.TrackDirectMissingTableError import TrackDirectMissingTableError
+from server.trackdirect.objects.Packet import Packet
+from server.trackdirect.repositories.PacketRepository import PacketRepository
+
+
+class StationStateCache:
+    """The StationStateCache keeps the latest packets of each active station in memory
+
+    Note:
+        The collector is the only process that writes packets for its source, so after a batch has been committed
+        the collector knows the latest packet, the latest moving packet and the latest confirmed moving packet of
+        every station it has seen. PreviousPacketPolicy uses this cache instead of querying the station table and
+        the packet tables. A missing slot means "unknown" and is looked up in the database (and then cached).
+
+        The cache must only be used by the collector that writes the packets, a reader (like the websocket server)
+        can not know when a packet has been written and must use the database.
+    """
+
+    # Slot value for a packet that is known to not exist
+    missing = None
+
+    def __init__(self, db, max_size=20000):
+        """The __init__ method.
+
+        Args:
+            db (psycopg2.Connection): Database connection
+            max_size (int): Max number of stations to keep in cache (least recently used stations are removed)
+        """
+        self.db = db
+        self.max_size = max_size
+        self.logger = logging.getLogger('trackdirect')
+
+        self.stations = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, station_id, slot, min_timestamp):
+        """Returns the cached packet for the specified station and slot
+
+        Args:
+            station_id (int): Station id
+            slot (str): One of 'latest', 'latest_moving' and 'latest_confirmed_moving'
+            min_timestamp (int): Packets older than this is treated as missing
+
+        Returns:
+            A tuple (is_known, packet), packet is None if it is known that no packet exists
+        """
+        with self.lock:
+            state = self.stations.get(station_id)
+            if state is None or slot not in state:
+                self.misses += 1
+                return False, None
+
+            self.stations.move_to_end(station_id)
+            self.hits += 1
+            packet = state[slot]
+            if packet is None or packet.timestamp < min_timestamp:
+                return True, None
+            return True, packet
+
+    def set(self, station_id, slot, packet):
+        """Cache the result of a database lookup
+
+        Note:
+            The lookup may have been executed before a batch was committed, so a slot that already contains a
+            newer packet is left unchanged.
+
+        Args:
+            station_id (int): Station id
+            slot (str): One of 'latest', 'latest_moving' and 'latest_confirmed_moving'
+            packet (Packet): The found packet (a non existing packet means that no packet was found)
+        """
+        summary = self._summarize(packet) if packet.is_existing_object() else StationStateCache.missing
+        with self.lock:
+            state = self._get_state(station_id)
+            if slot not in state:
+                state[slot] = summary
+                return
+
+            cached_packet = state[slot]
+            if summary is not None and (cached_packet is None or
+                                        (cached_packet.timestamp, cached_packet.id) < (summary.timestamp, summary.id)):
+                state[slot] = summary
+
+    def on_batch_committed(self, packets):
+        """Update cache based on a committed batch of packets
+
+        Args:
+            packets (list): Packets that has been inserted and committed
+        """
+        with self.lock:
+            for packet in packets:
+                self._on_previous_packet_map_id_modified(packet)
+
+            for packet in packets:
+                if not packet.is_existing_object() or packet.map_id not in [1, 5, 7, 9]:
+                    continue
+
+                summary = self._summarize(packet)
+                state = self._get_state(packet.station_id)
+                state['latest'] = summary
+                if packet.is_moving == 1 and packet.map_id in [1, 7]:
+                    state['latest_moving'] = summary
+                if packet.is_moving == 1 and packet.map_id == 1:
+                    state['latest_confirmed_moving'] = summary
+
+    def warm_up(self, source_id, min_timestamp):
+        """Load the latest packet of the most recently heard stations
+
+        Args:
+            source_id (int): Only load stations from this source
+            min_timestamp (int): Only load stations heard after this time
+        """
+        try:
+            cur = self.db.cursor()
+            cur.execute("""SELECT id, latest_location_packet_id, latest_location_packet_timestamp FROM station
+                           WHERE source_id = %s AND latest_location_packet_timestamp > %s
+                           ORDER BY latest_location_packet_timestamp DESC LIMIT %s""",
+                        (source_id, min_timestamp, self.max_size))
+            packet_ids_by_table = {}
+            packet_table_creator = PacketTableCreator(self.db)
+            packet_table_creator.disable_create_if_missing()
+            for record in cur.fetchall():
+                try:
+                    packet_table = packet_table_creator.get_table(record['latest_location_packet_timestamp'])
+                except TrackDirectMissingTableError:
+                    continue
+                packet_ids_by_table.setdefault(packet_table, []).append(record['latest_location_packet_id'])
+
+            number_of_stations = 0
+            packet_repository = PacketRepository(self.db)
+            for packet_table, packet_ids in packet_ids_by_table.items():
+                cur.execute(f"SELECT * FROM {packet_table} WHERE id IN %s", (tuple(packet_ids),))
+                for record in cur.fetchall():
+                    packet = self._summarize(packet_repository.get_object_from_record(record))
+                    with self.lock:
+                        self._get_state(packet.station_id)['latest'] = packet
+                    number_of_stations += 1
+            cur.close()
+            self.logger.info('Station state cache warmed up with %s stations', number_of_stations)
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            self.logger.error(e, exc_info=True)
+
+    def get_stats(self):
+        """Returns cache statistics
+
+        Returns:
+            dict
+        """
+        with self.lock:
+            return {'size': len(self.stations),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def log_stats(self):
+        """Log cache statistics"""
+        stats = self.get_stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = (stats['hits'] * 100 / lookups) if lookups > 0 else 0
+        self.logger.info('Station state cache: %s stations, %s hits, %s misses (%.1f%% hit rate), %s evictions',
+                         stats['size'], stats['hits'], stats['misses'], hit_rate, stats['evictions'])
+
+    def _on_previous_packet_map_id_modified(self, packet):
+        """Apply the map id modifications that the specified packet causes on previous packets (see PacketMapIdModifier)
+
+        Args:
+            packet (Packet): Committed packet
+        """
+        state = self.stations.get(packet.station_id)
+        if state is None:
+            return
+
+        for packet_id in [packet.replace_packet_id, packet.abnormal_packet_id]:
+            if packet_id is not None:
+                # Previous packet is no longer shown on map, forget the slots that may refer to it
+                for slot in ['latest', 'latest_moving', 'latest_confirmed_moving']:
+                    cached_packet = state.get(slot)
+                    if cached_packet is not None and cached_packet.id == packet_id:
+                        del state[slot]
+
+        if packet.confirm_packet_id is not None:
+            for slot in ['latest', 'latest_moving']:
+                cached_packet = state.get(slot)
+                if cached_packet is not None and cached_packet.id == packet.confirm_packet_id:
+                    # Cached packets may be in use by parser threads, so they are replaced instead of modified
+                    confirmed_packet = self._summarize(cached_packet)
+                    confirmed_packet.map_id = 1
+                    state[slot] = confirmed_packet
+                    if confirmed_packet.is_moving == 1:
+                        latest_confirmed_packet = state.get('latest_confirmed_moving')
+                        if latest_confirmed_packet is None or latest_confirmed_packet.id < confirmed_packet.id:
+                            state['latest_confirmed_moving'] = confirmed_packet
+
+    def _get_state(self, station_id):
+        """Returns the cache state dict for the specified station (created if missing, caller must hold the lock)
+
+        Args:
+            station_id (int): Station id
+
+        Returns:
+            dict
+        """
+        state = self.stations.get(station_id)
+        if state is None:
+            state = {}
+            self.stations[station_id] = state
+            if len(self.stations) > self.max_size:
+                self.stations.popitem(False)
+                self.evictions += 1
+        else:
+            self.stations.move_to_end(station_id)
+        return state
+
+    def _summarize(self, packet):
+        """Returns a copy of the packet that only contains the values stored in the packet table
+
+        Args:
+            packet (Packet): Packet to summarize
+
+        Returns:
+            Packet
+        """
+        summary = Packet(self.db)
+        summary.id = packet.id
+        for column in PacketBatchInserter.packet_columns:
+            setattr(summary, column, getattr(packet, column))
+        return summary
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LruCache:
+    """A bounded least recently used cache with hit rate statistics (safe to use from multiple threads)
+
+    Note:
+        When the cache is full the least recently used entry is removed. If max_age is set, entries older than
+        max_age seconds are treated as missing (used when the cached rows may be changed by other processes).
+    """
+
+    def __init__(self, max_size, max_age=None):
+        """The __init__ method.
+
+        Args:
+            max_size (int): Max number of entries
+            max_age (int): Max age in seconds of an entry (None means no limit)
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns the cached value for the specified key
+
+        Args:
+            key (object): Cache key
+
+        Returns:
+            The cached value, None if key is not cached
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (self.max_age is not None and entry[1] < time.time() - self.max_age):
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, key):
+        """Returns True if the specified key is cached (does not affect statistics or order)
+
+        Args:
+            key (object): Cache key
+
+        Returns:
+            bool
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and (self.max_age is None or entry[1] >= time.time() - self.max_age)
+
+    def set(self, key, value):
+        """Add (or replace) value for the specified key
+
+        Args:
+            key (object): Cache key
+            value (object): Value to cache (can not be None)
+        """
+        with self.lock:
+            self.entries[key] = (value, int(time.time()))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(False)
+                self.evictions += 1
+
+    def replace(self, key, value):
+        """Replace value for the specified key if the key is cached
+
+        Args:
+            key (object): Cache key
+            value (object): New value
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (value, entry[1])
+
+    def delete(self, key):
+        """Remove the specified key from cache
+
+        Args:
+            key (object): Cache key
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def resize(self, max_size):
+        """Change the max number of entries
+
+        Args:
+            max_size (int): Max number of entries
+        """
+        with self.lock:
+            self.max_size = max_size
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries"""
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        """Returns cache statistics
+
+        Returns:
+            dict
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self.entries),
+                    'max_size': self.max_size,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_rate': (self.hits * 100 / lookups) if lookups > 0 else 0}
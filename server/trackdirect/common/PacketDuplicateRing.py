@@ -0,0 +1,249 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import threading
+
+
+class PacketDuplicateRing:
+    """The PacketDuplicateRing remembers recently received packet bodies, it can be shared between several collectors
+
+    Note:
+        The ring consists of a number of time buckets, each bucket covers bucket_seconds seconds and contains a fixed
+        size open addressing hash table of (body hash, path hash, timestamp) entries. When a bucket is reused for a new
+        time period all its entries are discarded, which means that entries expire by time instead of by count.
+        If more packets than entries_per_bucket (or too many colliding packets) are added during one bucket period,
+        older entries are evicted early and duplicates of them will not be detected (counted by number_of_evictions).
+
+        All values are unsigned 64-bit integers stored in a memory-mapped file, if a file name is specified several
+        collector processes may share the ring (a file lock is used to serialize access). Without a file name an
+        anonymous memory map is used (only shared within the current process).
+    """
+
+    magic = 0x5444445550524e47  # "TDDUPRNG"
+    version = 1
+    header_size = 8
+    bucket_header_size = 2
+    entry_size = 3
+    max_probes = 32
+
+    def __init__(self, file_name=None, seconds_to_remember=1800, bucket_seconds=60, entries_per_bucket=16384):
+        """The __init__ method.
+
+        Args:
+            file_name (str): Memory mapped file to use (None to use anonymous memory)
+            seconds_to_remember (int): Entries older than this will not be found
+            bucket_seconds (int): Number of seconds covered by each bucket
+            entries_per_bucket (int): Number of entries in each bucket (should be a power of 2)
+        """
+        self.logger = logging.getLogger('trackdirect')
+        self.file_name = file_name
+        self.seconds_to_remember = seconds_to_remember
+        self.bucket_seconds = bucket_seconds
+        self.number_of_buckets = seconds_to_remember // bucket_seconds + 2
+        self.entries_per_bucket = entries_per_bucket
+        self.number_of_evictions = 0
+        self.lock = threading.Lock()
+        self.fd = None
+
+        size = 8 * (PacketDuplicateRing.header_size
+                    + self.number_of_buckets * (PacketDuplicateRing.bucket_header_size
+                                                + entries_per_bucket * PacketDuplicateRing.entry_size))
+        if file_name is None:
+            self.mmap = mmap.mmap(-1, size)
+        else:
+            self.fd = os.open(os.path.expanduser(file_name), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self.fd).st_size != size:
+                    os.ftruncate(self.fd, 0)
+                    os.ftruncate(self.fd, size)
+                self.mmap = mmap.mmap(self.fd, size)
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+        self.values = memoryview(self.mmap).cast('Q')
+        self._init_header()
+        self.logger.info('Packet duplicate ring uses %.1f MB (%s)',
+                         size / 1048576, file_name if file_name is not None else 'private memory')
+
+    def find(self, body, timestamp):
+        """Returns the path hash and timestamp of the latest entry with the specified body
+
+        Args:
+            body (str): Packet body
+            timestamp (int): Current timestamp (entries older than seconds_to_remember is ignored)
+
+        Returns:
+            A tuple (path hash, timestamp) or None if not found
+        """
+        body_hash = self.get_hash(body)
+        with self._locked():
+            current_epoch = timestamp // self.bucket_seconds
+            for epoch in range(current_epoch, current_epoch - self.number_of_buckets + 1, -1):
+                bucket = epoch % self.number_of_buckets
+                if self.values[self._get_bucket_header_offset(bucket)] != epoch:
+                    continue
+
+                offset = self._find_entry(bucket, body_hash)
+                if offset is not None and self.values[offset] == body_hash:
+                    entry_timestamp = self.values[offset + 2]
+                    if entry_timestamp > timestamp - self.seconds_to_remember:
+                        return self.values[offset + 1], entry_timestamp
+        return None
+
+    def add(self, body, path, timestamp):
+        """Add an entry
+
+        Args:
+            body (str): Packet body
+            path (str): Packet path
+            timestamp (int): Packet timestamp
+        """
+        body_hash = self.get_hash(body)
+        path_hash = self.get_hash(path)
+        with self._locked():
+            epoch = timestamp // self.bucket_seconds
+            bucket = epoch % self.number_of_buckets
+            bucket_header_offset = self._get_bucket_header_offset(bucket)
+            if self.values[bucket_header_offset] != epoch:
+                # Bucket contains entries from an older time period, discard them
+                self._clear_bucket(bucket)
+                self.values[bucket_header_offset] = epoch
+
+            offset = self._find_entry(bucket, body_hash)
+            if offset is None:
+                # Too many collisions, overwrite the first probed entry
+                offset = self._get_entry_offset(bucket, body_hash % self.entries_per_bucket)
+                self.number_of_evictions += 1
+            if self.values[offset] == 0:
+                self.values[bucket_header_offset + 1] += 1
+            self.values[offset] = body_hash
+            self.values[offset + 1] = path_hash
+            self.values[offset + 2] = timestamp
+
+    def get_hash(self, value):
+        """Returns a 64-bit hash that is stable between processes (0 is reserved for empty entries)
+
+        Args:
+            value (str): Value to hash
+
+        Returns:
+            int
+        """
+        if value is None:
+            return 1
+        digest = hashlib.blake2b(value.encode('utf-8', 'replace'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') or 2
+
+    def get_memory_usage(self):
+        """Returns the memory usage of the ring
+
+        Returns:
+            dict
+        """
+        with self._locked():
+            used_entries = sum(self.values[self._get_bucket_header_offset(bucket) + 1]
+                               for bucket in range(self.number_of_buckets))
+        total_entries = self.number_of_buckets * self.entries_per_bucket
+        return {'bytes': len(self.mmap),
+                'entries': total_entries,
+                'used_entries': used_entries,
+                'fill_ratio': used_entries / total_entries}
+
+    def get_stats(self):
+        """Returns ring statistics (evictions are only counted for entries added by the current process)
+
+        Returns:
+            dict
+        """
+        stats = self.get_memory_usage()
+        stats['evictions'] = self.number_of_evictions
+        return stats
+
+    def _init_header(self):
+        """Initialize the ring header, if the file contains a ring with another layout it is reset"""
+        with self._locked():
+            header = [PacketDuplicateRing.magic, PacketDuplicateRing.version, self.number_of_buckets,
+                      self.entries_per_bucket, self.bucket_seconds]
+            if list(self.values[0:len(header)]) != header:
+                self.values[0:len(self.values)] = memoryview(bytes(len(self.mmap))).cast('Q')
+                for i, value in enumerate(header):
+                    self.values[i] = value
+
+    def _find_entry(self, bucket, body_hash):
+        """Returns the offset of the entry with the specified body hash, or of the first empty entry in the probe sequence
+
+        Args:
+            bucket (int): Bucket number
+            body_hash (int): Body hash
+
+        Returns:
+            int (None if probe sequence is full of other hashes)
+        """
+        index = body_hash % self.entries_per_bucket
+        for i in range(PacketDuplicateRing.max_probes):
+            offset = self._get_entry_offset(bucket, (index + i) % self.entries_per_bucket)
+            value = self.values[offset]
+            if value == body_hash or value == 0:
+                return offset
+        return None
+
+    def _clear_bucket(self, bucket):
+        """Remove all entries in specified bucket
+
+        Args:
+            bucket (int): Bucket number
+        """
+        start = self._get_entry_offset(bucket, 0)
+        end = start + self.entries_per_bucket * PacketDuplicateRing.entry_size
+        self.values[start:end] = memoryview(bytes(8 * (end - start))).cast('Q')
+        self.values[self._get_bucket_header_offset(bucket) + 1] = 0
+
+    def _get_bucket_header_offset(self, bucket):
+        """Returns the offset of the bucket header (epoch, number of entries)
+
+        Args:
+            bucket (int): Bucket number
+
+        Returns:
+            int
+        """
+        return PacketDuplicateRing.header_size + bucket * PacketDuplicateRing.bucket_header_size
+
+    def _get_entry_offset(self, bucket, index):
+        """Returns the offset of an entry
+
+        Args:
+            bucket (int): Bucket number
+            index (int): Entry index within the bucket
+
+        Returns:
+            int
+        """
+        return (PacketDuplicateRing.header_size
+                + self.number_of_buckets * PacketDuplicateRing.bucket_header_size
+                + (bucket * self.entries_per_bucket + index) * PacketDuplicateRing.entry_size)
+
+    def _locked(self):
+        """Returns a context manager that holds both the thread lock and the file lock"""
+        return _RingLock(self.lock, self.fd)
+
+
+class _RingLock:
+    """Context manager used to serialize access to a PacketDuplicateRing between threads and processes"""
+
+    def __init__(self, lock, fd):
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
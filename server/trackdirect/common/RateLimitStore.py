@@ -0,0 +1,116 @@
+from array import array
+
+
+class RateLimitStore:
+    """A compact fixed size store of token buckets (for example one per station and packet type)
+
+    Note:
+        The buckets are stored in three arrays (key hash, last seen timestamp and number of tokens) that are used as
+        an open addressing hash table with linear probing. Memory usage is fixed (20 bytes per slot) and no objects
+        are created per key. When all probed slots are used, the slot that was used least recently is reused.
+
+        Not thread safe, each instance should only be used by one thread.
+    """
+
+    def __init__(self, capacity=131072, max_probes=8):
+        """The __init__ method.
+
+        Args:
+            capacity (int): Number of slots (rounded up to a power of two)
+            max_probes (int): Max number of slots to look at for each key
+        """
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.mask = size - 1
+        self.max_probes = max_probes
+        self.keys = array('q', bytes(8 * size))
+        self.timestamps = array('d', bytes(8 * size))
+        self.tokens = array('f', bytes(4 * size))
+        self.size = 0
+        self.evictions = 0
+
+    def is_allowed(self, key, timestamp, interval, burst=1):
+        """Returns True if the specified key has a token left, the token is then used
+
+        Note:
+            One token is added every interval seconds, a key may have at most burst tokens.
+            With burst set to 1 the key is allowed once every interval seconds.
+
+        Args:
+            key (str): Key, like station name + packet type
+            timestamp (float): Current Unix timestamp
+            interval (float): Seconds between each new token
+            burst (int): Max number of tokens
+
+        Returns:
+            bool
+        """
+        key_hash = hash(key) or 1
+        keys = self.keys
+        timestamps = self.timestamps
+        mask = self.mask
+        index = key_hash & mask
+        slot = index
+        if keys[slot] != key_hash:
+            # Not in the first slot, look at the following slots
+            slot = None
+            oldest_slot = None
+            for probe in range(self.max_probes):
+                current_slot = (index + probe) & mask
+                current_key = keys[current_slot]
+                if current_key == key_hash:
+                    slot = current_slot
+                    break
+                if current_key == 0:
+                    oldest_slot = current_slot
+                    self.size += 1
+                    break
+                if oldest_slot is None or timestamps[current_slot] < timestamps[oldest_slot]:
+                    oldest_slot = current_slot
+            else:
+                self.evictions += 1
+
+            if slot is None:
+                # New key (or a key that has been removed to make room for other keys)
+                keys[oldest_slot] = key_hash
+                timestamps[oldest_slot] = timestamp
+                self.tokens[oldest_slot] = burst - 1
+                return True
+
+        tokens = burst
+        if interval > 0:
+            tokens = self.tokens[slot] + (timestamp - timestamps[slot]) / interval
+            if tokens > burst:
+                tokens = burst
+        timestamps[slot] = timestamp
+        if tokens >= 1:
+            self.tokens[slot] = tokens - 1
+            return True
+
+        self.tokens[slot] = tokens
+        return False
+
+    def clear(self):
+        """Remove all keys"""
+        self.keys = array('q', bytes(8 * (self.mask + 1)))
+        self.size = 0
+
+    def get_memory_usage(self):
+        """Returns number of bytes used by the arrays
+
+        Returns:
+            int
+        """
+        return sum(values.buffer_info()[1] * values.itemsize for values in [self.keys, self.timestamps, self.tokens])
+
+    def get_stats(self):
+        """Returns store statistics
+
+        Returns:
+            dict
+        """
+        return {'size': self.size,
+                'capacity': self.mask + 1,
+                'evictions': self.evictions,
+                'memory': self.get_memory_usage()}
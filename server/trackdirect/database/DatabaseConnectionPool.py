@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from twisted.internet import task
+
+from server.trackdirect.common.Singleton import Singleton
+from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.database.PooledConnection import PooledConnection
+
+
+class DatabaseConnectionPool(Singleton):
+    """The DatabaseConnectionPool shares a bounded number of database connections (with autocommit) in the current process.
+
+    Note:
+        The pool should be sized to the reactor thread pool, every job executed in a thread leases one connection
+        for as long as the job is running (see run). Connections are created when needed, a connection that has
+        been idle for a while is checked before it is leased again and a connection that is lost is replaced.
+    """
+
+    # Default max number of connections (use set_max_size to size the pool to the reactor thread pool)
+    max_size = 10
+
+    # Connections idle longer than this (seconds) are checked before they are leased
+    health_check_interval = 30
+
+    # Seconds between each metrics log message
+    metrics_interval = 60
+
+    def __init__(self):
+        """The __init__ method (the pool is a singleton so it will only be initialized once)."""
+        if hasattr(self, 'idle_connections'):
+            return
+
+        self.logger = logging.getLogger('trackdirect')
+        self.database_connection = None
+        self.condition = threading.Condition()
+        self.idle_connections = []
+        self.number_of_connections = 0
+        self.number_of_leased_connections = 0
+        self.local = threading.local()
+        self.metrics_call = None
+        self._reset_metrics()
+
+    def set_max_size(self, max_size):
+        """Set max number of connections
+
+        Args:
+            max_size (int): Max number of connections, should be the number of threads in the reactor thread pool
+        """
+        with self.condition:
+            self.max_size = max(1, int(max_size))
+            self.condition.notify_all()
+
+    def get_connection(self):
+        """Returns a connection object that can be used in place of a psycopg2 connection in the pool jobs
+
+        Note:
+            The returned object uses the connection leased by the current thread, so it may be created once and
+            passed to repositories and queries that live longer than a job.
+
+        Returns:
+            PooledConnection
+        """
+        return PooledConnection(self)
+
+    def get_leased_connection(self):
+        """Returns the connection leased by the current thread
+
+        Returns:
+            psycopg2.extensions.connection
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            raise RuntimeError('Database connection used outside of a connection pool job')
+        return connection
+
+    def run(self, function, *args, **kwargs):
+        """Lease a connection and call the specified function (use with threads.deferToThread)
+
+        Args:
+            function (callable): The job, PooledConnection objects will use the leased connection while it runs
+            *args: Job arguments
+            **kwargs: Job keyword arguments
+
+        Returns:
+            the return value of the job
+        """
+        if getattr(self.local, 'connection', None) is not None:
+            # Nested job, use the connection that we already have
+            return function(*args, **kwargs)
+
+        with self.lease() as connection:
+            self.local.connection = connection
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.local.connection = None
+
+    @contextmanager
+    def lease(self):
+        """Lease a connection, waits while all connections are leased
+
+        Note:
+            If the lease ends with psycopg2.InterfaceError (or the connection has been closed) the connection is
+            discarded and a new connection will be created the next time one is needed.
+
+        Yields:
+            psycopg2.extensions.connection
+        """
+        connection = self._acquire()
+        try:
+            yield connection
+        except psycopg2.InterfaceError:
+            self._release(connection, True)
+            raise
+        except BaseException:
+            self._release(connection, False)
+            raise
+        else:
+            self._release(connection, False)
+
+    def _acquire(self):
+        """Returns an idle connection (or a new connection if the pool is not full), blocks until one is available
+
+        Returns:
+            psycopg2.extensions.connection
+        """
+        requested_timestamp = time.time()
+        with self.condition:
+            metrics = self.metrics
+            if not self.idle_connections and self.number_of_connections >= self.max_size:
+                metrics['saturated_count'] += 1
+            while not self.idle_connections and self.number_of_connections >= self.max_size:
+                self.condition.wait()
+
+            if self.idle_connections:
+                connection, idle_timestamp = self.idle_connections.pop()
+            else:
+                connection, idle_timestamp = None, None
+                self.number_of_connections += 1
+            self.number_of_leased_connections += 1
+
+            wait_time = time.time() - requested_timestamp
+            metrics['leases'] += 1
+            metrics['wait_time'] += wait_time
+            metrics['max_wait_time'] = max(metrics['max_wait_time'], wait_time)
+            metrics['max_leased'] = max(metrics['max_leased'], self.number_of_leased_connections)
+
+        try:
+            if connection is not None and not self._is_healthy(connection, idle_timestamp):
+                self._close(connection)
+                connection = None
+                with self.condition:
+                    self.metrics['health_check_failures'] += 1
+            if connection is None:
+                connection = self._create_connection()
+        except BaseException:
+            with self.condition:
+                self.number_of_connections -= 1
+                self.number_of_leased_connections -= 1
+                self.condition.notify()
+            raise
+        return connection
+
+    def _release(self, connection, is_lost):
+        """Return a leased connection to the pool
+
+        Args:
+            connection (psycopg2.extensions.connection): The leased connection
+            is_lost (bool): True if the job failed because the connection was lost
+        """
+        if is_lost or connection.closed:
+            self.logger.warning('Database connection lost, it will be replaced')
+            self._close(connection)
+            with self.condition:
+                self.metrics['reconnects'] += 1
+                self.number_of_connections -= 1
+                self.number_of_leased_connections -= 1
+                self.condition.notify()
+            return
+
+        with self.condition:
+            self.idle_connections.append((connection, time.time()))
+            self.number_of_leased_connections -= 1
+            self.condition.notify()
+
+    def _is_healthy(self, connection, idle_timestamp):
+        """Returns true if the specified idle connection can be used
+
+        Args:
+            connection (psycopg2.extensions.connection): Idle connection
+            idle_timestamp (float): Time when the connection was returned to the pool
+
+        Returns:
+            bool
+        """
+        if connection.closed:
+            return False
+
+        if idle_timestamp > time.time() - DatabaseConnectionPool.health_check_interval:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except psycopg2.Error as e:
+            self.logger.warning('Database connection health check failed: %s', e)
+            return False
+
+    def _create_connection(self):
+        """Creates a new connection (with autocommit)
+
+        Returns:
+            psycopg2.extensions.connection
+        """
+        if self.database_connection is None:
+            self.database_connection = DatabaseConnection()
+        connection = self.database_connection.get_connection(True, True)
+        with self.condition:
+            self.metrics['created'] += 1
+        return connection
+
+    def _close(self, connection):
+        """Close the specified connection, ignoring errors
+
+        Args:
+            connection (psycopg2.extensions.connection): The connection to close
+        """
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def start_metrics(self):
+        """Start logging pool metrics (executed in the reactor thread)"""
+        if self.metrics_call is None:
+            self.metrics_call = task.LoopingCall(self._log_metrics)
+            self.metrics_call.start(DatabaseConnectionPool.metrics_interval, False)
+
+    def _reset_metrics(self):
+        """Reset the metrics for a new interval"""
+        self.metrics = {
+            'leases': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'max_leased': 0,
+            'saturated_count': 0,
+            'created': 0,
+            'health_check_failures': 0,
+            'reconnects': 0
+        }
+
+    def get_metrics(self):
+        """Returns the metrics for the current interval
+
+        Returns:
+            dict
+        """
+        with self.condition:
+            metrics = dict(self.metrics)
+            metrics['size'] = self.number_of_connections
+            metrics['leased'] = self.number_of_leased_connections
+            metrics['max_size'] = self.max_size
+        return metrics
+
+    def _log_metrics(self):
+        """Log the metrics for the latest interval and start a new interval"""
+        with self.condition:
+            metrics = self.get_metrics()
+            self._reset_metrics()
+
+        leases = max(1, metrics['leases'])
+        message = ('Database pool: %s connections (max %s), %s leased (max %s), %s leases, '
+                   'avg/max wait %.3f/%.3fs, saturated %s times, %s created, %s health check failures, %s reconnects')
+        args = (metrics['size'], metrics['max_size'], metrics['leased'], metrics['max_leased'],
+                metrics['leases'], metrics['wait_time'] / leases, metrics['max_wait_time'],
+                metrics['saturated_count'], metrics['created'], metrics['health_check_failures'],
+                metrics['reconnects'])
+
+        if metrics['saturated_count'] > 0:
+            self.logger.warning(message, *args)
+        else:
+            self.logger.info(message, *args)
@@ -1,4 +1,5 @@
 import datetime
+import time
 
 
 class DatabaseObjectFinder:
@@ -6,6 +7,14 @@ class DatabaseObjectFinder:
 
     existingTables = {}
 
+    # Static class variables, registry of all existing packet tables and their relkind (shared by all instances in
+    # this process). The registry is reloaded when it is older than packetTableRegistryMaxAge seconds, so tables
+    # created or dropped by another process, and packet tables converted by server/bin/partitionmigrate.py, may
+    # not be noticed until then (a query that fails because a packet table has been dropped reloads it directly).
+    packetTableRegistry = None
+    packetTableRegistryTimestamp = 0
+    packetTableRegistryMaxAge = 60
+
     def __init__(self, db):
         """
         Initialize the DatabaseObjectFinder.
@@ -23,6 +32,35 @@ class DatabaseObjectFinder:
             table_name (str): Table to be marked as existing.
         """
         DatabaseObjectFinder.existingTables[table_name] = True
+        if DatabaseObjectFinder.packetTableRegistry is not None and table_name.startswith('packet'):
+            DatabaseObjectFinder.packetTableRegistry.setdefault(table_name, 'r')
+
+    def refresh_packet_table_registry(self):
+        """
+        Reload the registry of existing packet tables and if they are partitioned (one query for all tables).
+        """
+        with self.db.cursor() as cur:
+            cur.execute("""
+                SELECT relname, relkind
+                FROM pg_class
+                WHERE relkind IN ('r', 'p')
+                AND relname LIKE 'packet%'
+                AND pg_table_is_visible(oid)
+            """)
+            DatabaseObjectFinder.packetTableRegistry = {record[0]: record[1] for record in cur}
+        DatabaseObjectFinder.packetTableRegistryTimestamp = time.time()
+
+    def _get_packet_table_registry(self):
+        """
+        Returns the registry of existing packet tables (reloaded when it is older than packetTableRegistryMaxAge).
+
+        Returns:
+            dict: relkind of each existing packet table
+        """
+        if DatabaseObjectFinder.packetTableRegistry is None \
+                or DatabaseObjectFinder.packetTableRegistryTimestamp < time.time() - DatabaseObjectFinder.packetTableRegistryMaxAge:
+            self.refresh_packet_table_registry()
+        return DatabaseObjectFinder.packetTableRegistry
 
     def check_table_exists(self, table_name):
         """
@@ -34,6 +72,10 @@ class DatabaseObjectFinder:
         Returns:
             bool: True if the specified table exists in the database, otherwise False.
         """
+        if table_name.startswith('packet'):
+            # Packet tables are looked up in the registry (reloaded when it is older than packetTableRegistryMaxAge)
+            return table_name in self._get_packet_table_registry()
+
         today_date_str = datetime.datetime.utcnow().strftime('%Y%m%d')
         yesterday_date_str = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).strftime('%Y%m%d')
 
@@ -54,6 +96,33 @@ class DatabaseObjectFinder:
             else:
                 return False
 
+    def check_table_partitioned(self, table_name):
+        """
+        Check if the specified table is a partitioned table (PARTITION BY RANGE) instead of an inherited parent table.
+
+        Note:
+            Packet tables are looked up in the packet table registry, so processes notices that the packet tables
+            has been migrated using server/bin/partitionmigrate.py within packetTableRegistryMaxAge seconds.
+
+        Args:
+            table_name (str): Table to check.
+
+        Returns:
+            bool: True if the specified table is a partitioned table, otherwise False.
+        """
+        if table_name.startswith('packet'):
+            return self._get_packet_table_registry().get(table_name) == 'p'
+
+        with self.db.cursor() as cur:
+            cur.execute("""
+                SELECT relkind
+                FROM pg_class
+                WHERE relname = %s
+                AND relkind IN ('r', 'p')
+            """, (table_name,))
+            record = cur.fetchone()
+            return record is not None and record[0] == 'p'
+
     def check_index_exists(self, index):
         """
         Check if the specified index exists in the database.
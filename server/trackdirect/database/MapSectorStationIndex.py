@@ -0,0 +1,112 @@
+from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+
+
+class MapSectorStationIndex:
+    """The MapSectorStationIndex class maintains the map_sector_station table.
+
+    Note:
+        The map_sector_station table maps (map sector, time bucket) to the stations that has sent a packet
+        that is shown on map in that map sector during that time bucket. It is maintained by the collector
+        and used by the websocket server to find all stations in the visible map sectors using one query
+        instead of querying every daily packet table once for each map sector.
+    """
+
+    # Number of seconds covered by each time bucket
+    time_bucket_seconds = 600
+
+    # Static class variables
+    table_exists = None
+
+    def __init__(self, db):
+        """The __init__ method.
+
+        Args:
+            db (psycopg2.Connection): Database connection
+        """
+        self.db = db
+
+    def is_available(self):
+        """Returns true if the map_sector_station table exists (it is missing in databases created by older versions).
+
+        Returns:
+            bool
+        """
+        if MapSectorStationIndex.table_exists is None:
+            MapSectorStationIndex.table_exists = DatabaseObjectFinder(self.db).check_table_exists('map_sector_station')
+        return MapSectorStationIndex.table_exists
+
+    def get_time_bucket(self, timestamp):
+        """Returns the time bucket of the specified timestamp.
+
+        Args:
+            timestamp (int): Unix timestamp
+
+        Returns:
+            int
+        """
+        return int(timestamp) // MapSectorStationIndex.time_bucket_seconds
+
+    def add_packets(self, packets):
+        """Add the stations of the specified packets to the index.
+
+        Args:
+            packets (list): Packets that has been inserted
+
+        Returns:
+            int: Number of added rows
+        """
+        if not self.is_available():
+            return 0
+
+        rows = set()
+        for packet in packets:
+            if packet.map_id in [1, 5, 7, 9] and packet.map_sector is not None and packet.station_id is not None:
+                rows.add((packet.map_sector, self.get_time_bucket(packet.timestamp), packet.station_id))
+
+        if not rows:
+            return 0
+
+        cur = self.db.cursor()
+        arg_string = b','.join(cur.mogrify("(%s, %s, %s)", row) for row in sorted(rows))
+        cur.execute(f"""INSERT INTO map_sector_station (map_sector, time_bucket, station_id)
+                        VALUES {arg_string.decode()} ON CONFLICT DO NOTHING""")
+        row_count = cur.rowcount
+        cur.close()
+        return row_count
+
+    def add_packet_table(self, packet_table):
+        """Add the stations of all packets in the specified packet table to the index.
+
+        Args:
+            packet_table (str): Packet table name
+
+        Returns:
+            int: Number of added rows
+        """
+        cur = self.db.cursor()
+        cur.execute(f"""INSERT INTO map_sector_station (map_sector, time_bucket, station_id)
+                        SELECT DISTINCT map_sector, timestamp / {MapSectorStationIndex.time_bucket_seconds}, station_id
+                        FROM {packet_table}
+                        WHERE map_id IN (1, 5, 7, 9, 12) AND map_sector IS NOT NULL
+                        ON CONFLICT DO NOTHING""")
+        row_count = cur.rowcount
+        cur.close()
+        return row_count
+
+    def delete_before(self, timestamp):
+        """Delete all rows older than the specified timestamp.
+
+        Args:
+            timestamp (int): Unix timestamp
+
+        Returns:
+            int: Number of deleted rows
+        """
+        if not self.is_available():
+            return 0
+
+        cur = self.db.cursor()
+        cur.execute("DELETE FROM map_sector_station WHERE time_bucket < %s", (self.get_time_bucket(timestamp),))
+        row_count = cur.rowcount
+        cur.close()
+        return row_count
@@ -65,6 +65,12 @@ class PacketPathTableCreator:
         """
         try:
             cur = self.db.cursor()
+            if self.dbObjectFinder.check_table_partitioned('packet_path'):
+                # Indexes are created automatically from the indexes of the partitioned parent table
+                cur.execute(f"CREATE TABLE {table_name} PARTITION OF packet_path FOR VALUES FROM ({min_timestamp}) TO ({max_timestamp})")
+                cur.close()
+                return
+
             self._execute_sql(cur, f"CREATE TABLE {table_name} () INHERITS (packet_path)")
             self._execute_sql(cur, f"ALTER TABLE {table_name} ADD CONSTRAINT timestamp_range_check CHECK (timestamp >= {min_timestamp} AND timestamp < {max_timestamp})")
             self._execute_sql(cur, f"CREATE INDEX {table_name}_pkey ON {table_name} USING btree (id)")
@@ -76,7 +82,7 @@ class PacketPathTableCreator:
         except (psycopg2.IntegrityError, psycopg2.ProgrammingError) as e:
             if 'already exists' not in str(e):
                 self.logger.error(e, exc_info=1)
-            time.sleep(10)
+                time.sleep(10)
 
         except Exception as e:
             self.logger.error(e, exc_info=1)
@@ -0,0 +1,96 @@
+import logging
+import time
+from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+
+
+class PacketTableCompactor:
+    """The PacketTableCompactor class removes rows from a daily packet table by replacing the table
+
+    Note:
+        Instead of deleting rows (which leaves a bloated table that needs VACUUM FULL and REINDEX), the rows to keep
+        are copied to a new table, the indexes are built and the new table is swapped in. Everything is done in one
+        transaction, readers see either the old or the new table. Writers to the daily table are blocked while the
+        rows are copied. The parent table (and readers of it) is only locked during the swap at the end, the new
+        table gets a timestamp check constraint first so attaching it as a partition does not need to scan it.
+    """
+
+    def __init__(self, db):
+        """The __init__ method.
+
+        Args:
+            db (psycopg2.Connection): Database connection (without autocommit)
+        """
+        self.db = db
+        self.db_object_finder = DatabaseObjectFinder(db)
+        self.logger = logging.getLogger('trackdirect')
+
+    def compact(self, table_name, parent_table, keep_condition, min_timestamp, max_timestamp):
+        """Remove all rows that does not match the keep condition from the specified table
+
+        Args:
+            table_name (str): Daily table to compact
+            parent_table (str): Parent table of the daily table
+            keep_condition (str): SQL condition for the rows to keep
+            min_timestamp (int): Min Unix timestamp for this table
+            max_timestamp (int): Max Unix timestamp for this table
+
+        Returns:
+            tuple: Number of kept and removed rows, None if there was nothing to remove
+        """
+        new_table_name = f'{table_name}_compact'
+        start = time.time()
+        cursor = self.db.cursor()
+        try:
+            cursor.execute(f"LOCK TABLE {table_name} IN SHARE MODE")
+            cursor.execute(f"SELECT 1 FROM {table_name} WHERE NOT ({keep_condition}) LIMIT 1")
+            if cursor.fetchone() is None:
+                self.db.rollback()
+                cursor.close()
+                return None
+
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            total_rows = cursor.fetchone()[0]
+
+            cursor.execute(f"CREATE TABLE {new_table_name} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cursor.execute(f"INSERT INTO {new_table_name} SELECT * FROM {table_name} WHERE {keep_condition}")
+            kept_rows = cursor.rowcount
+
+            # Build the indexes using temporary names, they get the original names when the old table is dropped
+            cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", (table_name,))
+            index_names = {}
+            for number, record in enumerate(cursor.fetchall()):
+                new_index_name = f'{new_table_name}_idx{number}'
+                unique = 'UNIQUE ' if record['indexdef'].startswith('CREATE UNIQUE') else ''
+                index_method = record['indexdef'][record['indexdef'].index(' USING '):]
+                cursor.execute(f"CREATE {unique}INDEX {new_index_name} ON {new_table_name}{index_method}")
+                index_names[new_index_name] = record['indexname']
+
+            partitioned = self.db_object_finder.check_table_partitioned(parent_table)
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'c'", (new_table_name,))
+            if partitioned and cursor.fetchone() is None:
+                cursor.execute(f"""ALTER TABLE {new_table_name} ADD CONSTRAINT timestamp_range_check
+                                   CHECK (timestamp >= {min_timestamp} AND timestamp < {max_timestamp})""")
+            self.logger.info(f"Copied {kept_rows} of {total_rows} rows from {table_name} in {time.time() - start:.1f}s")
+
+            # The parent table is locked from here until commit
+            if partitioned:
+                cursor.execute(f"ALTER TABLE {parent_table} DETACH PARTITION {table_name}")
+            cursor.execute(f"DROP TABLE {table_name}")
+            cursor.execute(f"ALTER TABLE {new_table_name} RENAME TO {table_name}")
+            for new_index_name, index_name in index_names.items():
+                cursor.execute(f"ALTER INDEX {new_index_name} RENAME TO {index_name}")
+            if partitioned:
+                cursor.execute(f"""ALTER TABLE {parent_table} ATTACH PARTITION {table_name}
+                                   FOR VALUES FROM ({min_timestamp}) TO ({max_timestamp})""")
+            else:
+                cursor.execute(f"ALTER TABLE {table_name} INHERIT {parent_table}")
+
+            self.db.commit()
+            cursor.close()
+            self.logger.info(f"Replaced {table_name} in {time.time() - start:.1f}s")
+            return kept_rows, total_rows - kept_rows
+
+        except Exception:
+            self.db.rollback()
+            cursor.close()
+            raise
@@ -0,0 +1,53 @@
+import logging
+import time
+import psycopg2
+from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+from server.trackdirect.database.PacketTableCreator import PacketTableCreator
+from server.trackdirect.database.PacketPathTableCreator import PacketPathTableCreator
+from server.trackdirect.database.PacketWeatherTableCreator import PacketWeatherTableCreator
+from server.trackdirect.database.PacketTelemetryTableCreator import PacketTelemetryTableCreator
+from server.trackdirect.database.PacketOgnTableCreator import PacketOgnTableCreator
+
+
+class PacketTableManager:
+    """The PacketTableManager class creates the daily packet tables ahead of time
+
+    Note:
+        All five table families (packet, path, weather, telemetry and OGN) are created for today and the coming days,
+        so the insert path normally never has to create a table. The packet table registry in DatabaseObjectFinder
+        is reloaded first, so only missing tables are created.
+    """
+
+    def __init__(self, db, days_ahead=2):
+        """The __init__ method.
+
+        Args:
+            db (psycopg2.Connection): Database connection (with autocommit, should not be used by other threads)
+            days_ahead (int): Number of days after today to create tables for
+        """
+        self.db = db
+        self.days_ahead = days_ahead
+        self.logger = logging.getLogger('trackdirect')
+
+    def run(self):
+        """Reload the packet table registry and create missing tables"""
+        try:
+            start = time.time()
+            DatabaseObjectFinder(self.db).refresh_packet_table_registry()
+
+            packet_weather_table_creator = PacketWeatherTableCreator(self.db)
+            table_creators = [PacketTableCreator(self.db), PacketPathTableCreator(self.db),
+                              PacketTelemetryTableCreator(self.db), PacketOgnTableCreator(self.db)]
+            tables = []
+            for x in range(0, self.days_ahead + 1):
+                timestamp = int(time.time()) + (60 * 60 * 24 * x)
+                for table_creator in table_creators:
+                    tables.append(table_creator.get_table(timestamp))
+                tables.append(packet_weather_table_creator.get_packet_weather_table(timestamp))
+
+            self.logger.info('Packet tables checked (%s tables for the next %s days) in %.3fs',
+                             len(tables), self.days_ahead, time.time() - start)
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            self.logger.error(e, exc_info=True)
@@ -0,0 +1,112 @@
+import calendar
+import datetime
+
+
+class PacketTableUnionQuery:
+    """The PacketTableUnionQuery class builds one statement that queries several daily packet tables
+
+    Note:
+        The same sub query is executed for every packet table and the results are combined using UNION ALL, so a
+        query that covers many days only needs one round trip. ORDER BY and LIMIT of the sub query is kept inside
+        each branch (pushed down to each packet table).
+
+        Every row gets the column packet_table_rank (index of the packet table in the list), the combined result is
+        always ordered by the packet table first. Ordering by newest table first and using a LIMIT gives the same
+        result as looping over the tables in reversed order and stopping at the first hit.
+
+        If the daily packet tables are partitions of a partitioned parent table (see server/bin/partitionmigrate.py)
+        the sub query is executed once against the parent table instead, restricted to the timestamp range of the
+        packet tables so that PostgreSQL can prune the other partitions. The packet table rank is then the day number
+        of the timestamp column (which gives the same order). The sub query must therefore select the timestamp
+        column and give the packet table an alias (like "FROM {packet_table} packet").
+    """
+
+    def __init__(self, packet_tables, partitioned_table=None):
+        """The __init__ method.
+
+        Args:
+            packet_tables (list): Packet table names, oldest table first (like PacketTableCreator.get_tables)
+            partitioned_table (str): Name of the partitioned parent table of the packet tables (None if not partitioned)
+        """
+        self.packet_tables = packet_tables
+        self.partitioned_table = partitioned_table
+        self.latest_sql_arguments = None
+
+    def is_empty(self):
+        """Returns True if there is no packet table to query
+
+        Returns:
+            bool
+        """
+        return not self.packet_tables
+
+    def remove_missing_tables(self, table_exists):
+        """Remove packet tables that does not exist anymore
+
+        Args:
+            table_exists (callable): Returns True if the specified packet table exists
+        """
+        self.packet_tables = [packet_table for packet_table in self.packet_tables if table_exists(packet_table)]
+
+    def get_latest_sql(self):
+        """Returns the sql and parameters of the latest get_sql call, created again for the current packet tables
+
+        Returns:
+            tuple: sql and parameters
+        """
+        table_sql, table_params, order_by, limit, newest_first, distinct_on = self.latest_sql_arguments
+        return self.get_sql(table_sql, table_params, order_by, limit, newest_first, distinct_on)
+
+    def get_sql(self, table_sql, table_params, order_by=None, limit=None, newest_first=False, distinct_on=None):
+        """Returns the sql and parameters for the combined query
+
+        Args:
+            table_sql (str): Sub query with a {packet_table} placeholder for the packet table name
+            table_params (tuple): Parameters for the sub query
+            order_by (str): Order of rows within each packet table in the combined result
+            limit (int): Max number of rows in the combined result
+            newest_first (bool): Set to True to return rows from the newest packet table first
+            distinct_on (str): Only keep the first row (in packet table order) for each value of this column
+
+        Returns:
+            tuple: sql and parameters
+        """
+        self.latest_sql_arguments = (table_sql, table_params, order_by, limit, newest_first, distinct_on)
+        branches = []
+        params = []
+        if self.partitioned_table is not None:
+            min_timestamp, max_timestamp = self._get_timestamp_range()
+            packet_table = f"(SELECT * FROM {self.partitioned_table} WHERE timestamp >= {min_timestamp} AND timestamp < {max_timestamp})"
+            branches.append(f"SELECT packet_table_query.timestamp / 86400 AS packet_table_rank, packet_table_query.* FROM ({table_sql.format(packet_table=packet_table)}) packet_table_query")
+            params.extend(table_params)
+        else:
+            for rank, packet_table in enumerate(self.packet_tables):
+                branches.append(f"SELECT {rank} AS packet_table_rank, packet_table_query.* FROM ({table_sql.format(packet_table=packet_table)}) packet_table_query")
+                params.extend(table_params)
+
+        table_order = 'packet_table_rank DESC' if newest_first else 'packet_table_rank'
+        sql = "SELECT * FROM (" + " UNION ALL ".join(branches) + ") packet"
+        if distinct_on is not None:
+            sql = f"SELECT DISTINCT ON ({distinct_on}) * FROM ({sql}) packet ORDER BY {distinct_on}, {table_order}"
+            if order_by is not None:
+                sql += f", {order_by}"
+            sql = f"SELECT * FROM ({sql}) packet"
+
+        sql += f" ORDER BY {table_order}"
+        if order_by is not None:
+            sql += f", {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        return sql, tuple(params)
+
+    def _get_timestamp_range(self):
+        """Returns the timestamp range covered by the packet tables
+
+        Returns:
+            tuple: min timestamp (inclusive) and max timestamp (exclusive)
+        """
+        dates = [datetime.datetime.strptime(packet_table[-8:], '%Y%m%d') for packet_table in self.packet_tables]
+        min_timestamp = calendar.timegm(min(dates).timetuple())
+        max_timestamp = calendar.timegm(max(dates).timetuple()) + 86400
+        return min_timestamp, max_timestamp
@@ -64,6 +64,12 @@ class PacketTelemetryTableCreator:
         """
         try:
             cur = self.db.cursor()
+            if self.db_object_finder.check_table_partitioned('packet_telemetry'):
+                # Indexes are created automatically from the indexes of the partitioned parent table
+                cur.execute(f"CREATE TABLE {table_name} PARTITION OF packet_telemetry FOR VALUES FROM ({min_timestamp}) TO ({max_timestamp})")
+                cur.close()
+                return
+
             sql_statements = [
                 f"CREATE TABLE {table_name} () INHERITS (packet_telemetry)",
                 f"ALTER TABLE {table_name} ADD CONSTRAINT timestamp_range_check CHECK (timestamp >= {min_timestamp} AND timestamp < {max_timestamp})",
@@ -84,7 +90,7 @@ class PacketTelemetryTableCreator:
         except (psycopg2.IntegrityError, psycopg2.ProgrammingError) as e:
             if 'already exists' not in str(e):
                 self.logger.error(e, exc_info=1)
-            time.sleep(10)
+                time.sleep(10)
 
         except Exception as e:
             self.logger.error(e, exc_info=1)
@@ -63,6 +63,12 @@ class PacketWeatherTableCreator:
         """
         try:
             cur = self.db.cursor()
+            if self.dbObjectFinder.check_table_partitioned('packet_weather'):
+                # Indexes are created automatically from the indexes of the partitioned parent table
+                cur.execute(f"CREATE TABLE {table_name} PARTITION OF packet_weather FOR VALUES FROM ({min_timestamp}) TO ({max_timestamp})")
+                cur.close()
+                return
+
             cur.execute(f"CREATE TABLE {table_name} () INHERITS (packet_weather)")
             cur.execute(f"ALTER TABLE {table_name} ADD CONSTRAINT timestamp_range_check CHECK (timestamp >= {min_timestamp} AND timestamp < {max_timestamp})")
             cur.execute(f"CREATE INDEX {table_name}_pkey ON {table_name} USING btree (id)")
@@ -72,7 +78,7 @@ class PacketWeatherTableCreator:
         except (psycopg2.IntegrityError, psycopg2.ProgrammingError) as e:
             if 'already exists' not in str(e):
                 self.logger.error(e, exc_info=1)
-            time.sleep(10)
+                time.sleep(10)
         except Exception as e:
             self.logger.error(e, exc_info=1)
             time.sleep(10)
@@ -0,0 +1,25 @@
+class PooledConnection:
+    """The PooledConnection class can be used in place of a psycopg2 connection, it uses the connection that the current thread has leased from the DatabaseConnectionPool."""
+
+    def __init__(self, pool):
+        """The __init__ method.
+
+        Args:
+            pool (DatabaseConnectionPool): The connection pool
+        """
+        self.pool = pool
+
+    def __getattr__(self, name):
+        """Returns the specified attribute of the leased connection (like cursor, commit and rollback)
+
+        Args:
+            name (str): Attribute name
+
+        Returns:
+            the attribute of the leased connection
+        """
+        return getattr(self.pool.get_leased_connection(), name)
+
+    def close(self):
+        """The leased connection is owned by the pool, so closing is a no-op"""
+        pass
@@ -0,0 +1,16 @@
+from server.trackdirect.exceptions.TrackDirectGenericError import TrackDirectGenericError
+
+
+class TrackDirectRequestCancelledError(TrackDirectGenericError):
+    """Raised when a websocket request has been superseded by a newer request and should stop
+    """
+
+    def __init__(self, message, request_id=None):
+        """The __init__ method.
+
+        Args:
+            message (str):    Exception message
+            request_id (int): Id of the cancelled request. Defaults to None.
+        """
+        super().__init__(message)
+        self.request_id = request_id
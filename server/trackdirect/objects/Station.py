@@ -6,6 +6,9 @@ class Station(Model):
     """Station represents the object/station that the packet is about
     """
 
+    # Functions called with the station as argument when a station has been updated (used to invalidate caches)
+    update_listeners = []
+
     def __init__(self, db):
         """The __init__ method.
 
@@ -89,6 +92,8 @@ class Station(Model):
                     WHERE id = %s AND source_id IS NULL""",
                     (self.source_id, self.name, self.station_type_id, self.id)
                 )
+            for listener in Station.update_listeners:
+                listener(self)
             return True
         return False
 
@@ -1,9 +1,10 @@
 import logging
 import aprslib
-import collections
 import time
 import re
 
+from server.trackdirect.common.RateLimitStore import RateLimitStore
+
 
 class AprsISConnection(aprslib.IS):
     """Handles communication with the APRS-IS server."""
@@ -21,7 +22,7 @@ class AprsISConnection(aprslib.IS):
         super().__init__(callsign, passwd, host, port)
         self.logger = logging.getLogger("aprslib.IS")
         self.frequency_limit = None
-        self.station_hash_timestamps = collections.OrderedDict()
+        self.rate_limit_store = RateLimitStore()
         self.source_id = 1
 
     def set_frequency_limit(self, frequency_limit):
@@ -113,23 +114,7 @@ class AprsISConnection(aprslib.IS):
                     except ValueError:
                         pass
 
-            latest_timestamp_on_map = self.station_hash_timestamps.get(name + packet_type, 0)
-            current_time = int(time.time()) - 1
-
-            if (current_time - frequency_limit_to_apply) < latest_timestamp_on_map:
+            if not self.rate_limit_store.is_allowed(name + packet_type, time.time(), frequency_limit_to_apply):
                 return True
 
-            self.station_hash_timestamps[name + packet_type] = current_time
-            self._cache_maintenance()
-
-        return False
-
-    def _cache_maintenance(self):
-        """Ensure cache does not contain too many packets."""
-        if self.frequency_limit is not None:
-            max_packets = int(self.frequency_limit) * 1000
-            while len(self.station_hash_timestamps) > max_packets:
-                try:
-                    self.station_hash_timestamps.popitem(last=False)
-                except KeyError:
-                    break
\ No newline at end of file
+        return False
\ No newline at end of file
@@ -53,6 +53,7 @@ class AprsPacketParser:
 
         self.database_write_access = True
         self.source_id = 1
+        self.station_state_cache = None
 
         self.ogn_device_repository = OgnDeviceRepository(db)
         self.ogn_hidden_station_repository = OgnHiddenStationRepository(db)
@@ -84,6 +85,14 @@ class AprsPacketParser:
         """
         self.source_id = source_id
 
+    def set_station_state_cache(self, station_state_cache):
+        """Set the station state cache to use when looking for previous packets.
+
+        Args:
+            station_state_cache (StationStateCache): Cache of the latest packets for each station
+        """
+        self.station_state_cache = station_state_cache
+
     def get_packet(self, data, timestamp=None, minimal=False):
         """Returns the resulting packet.
 
@@ -124,7 +133,7 @@ class AprsPacketParser:
                 self._parse_packet_path()
 
                 if not minimal:
-                    previous_packet_policy = PreviousPacketPolicy(self.packet, self.db)
+                    previous_packet_policy = PreviousPacketPolicy(self.packet, self.db, self.station_state_cache)
                     previous_packet = previous_packet_policy.get_previous_packet()
                     self._parse_assumed_move_type_id(previous_packet)
                     self._parse_packet_tail(previous_packet)
@@ -544,6 +553,4 @@ class AprsPacketParser:
             return 1
         else:
             # No suitable marker id found, let's create a new!
-            marker = self.markerRepository.create()
-            marker.save()
-            return marker.id
\ No newline at end of file
+            return self.markerRepository.get_new_marker_id()
\ No newline at end of file
@@ -77,4 +77,58 @@ class MapSectorPolicy:
             lng = lng * 10 + 5
 
         # lng interval: 0 - 00003600
-        return lng
\ No newline at end of file
+        return lng
+
+    def get_map_sectors_in_area(self, min_lat, max_lat, min_lng, max_lng):
+        """
+        Returns all map sectors that covers the specified area.
+
+        Args:
+            min_lat (float): Southern latitude.
+            max_lat (float): Northern latitude.
+            min_lng (float): Western longitude.
+            max_lng (float): Eastern longitude.
+
+        Returns:
+            list: Sorted map sector integers.
+        """
+        min_lat = self.get_map_sector_lat_representation(min_lat)
+        max_lat = self.get_map_sector_lat_representation(max_lat + 0.2)
+        min_lng = self.get_map_sector_lng_representation(min_lng)
+        max_lng = self.get_map_sector_lng_representation(max_lng + 0.5)
+
+        # lat interval: 0 - 18000000
+        # lng interval: 0 - 00003600
+        return [lat + lng for lat in range(min_lat, max_lat, 20000) for lng in range(min_lng, max_lng, 5)]
+
+    def get_map_sectors_by_interval(self, min_lat, max_lat, min_lng, max_lng):
+        """
+        Returns the map sectors for the specified interval (used for the visible area of a map).
+
+        Args:
+            min_lat (float): Southern latitude.
+            max_lat (float): Northern latitude.
+            min_lng (float): Western longitude.
+            max_lng (float): Eastern longitude.
+
+        Returns:
+            list: Map sector integers (ordered by latitude, then longitude).
+        """
+        min_area_code = self.get_map_sector(min_lat, min_lng)
+        max_area_code = self.get_map_sector(max_lat, max_lng)
+        if min_area_code is None or max_area_code is None or max_area_code < min_area_code:
+            return []
+
+        lng_diff = int(ceil(max_lng)) - int(ceil(min_lng))
+        if min_area_code % 10 == 5:
+            lng_offsets = [0]
+            for i in range(1, lng_diff + 1):
+                lng_offsets.extend([(10 * i) - 5, 10 * i])
+        else:
+            lng_offsets = [0, 5]
+            for i in range(1, lng_diff + 1):
+                lng_offsets.extend([10 * i, (10 * i) + 5])
+
+        number_of_rows = (max_area_code - min_area_code) // 20000 + 1
+        return [min_area_code + 20000 * row + lng_offset
+                for row in range(number_of_rows) for lng_offset in lng_offsets]
@@ -1,11 +1,17 @@
 import logging
-import collections
+import threading
+
+from server.trackdirect.TrackDirectConfig import TrackDirectConfig
+from server.trackdirect.common.PacketDuplicateRing import PacketDuplicateRing
+
 
 class PacketDuplicatePolicy:
     """Handles duplicate checks."""
 
     # Static class variables
-    latest_packets_hash_ordered_dict = collections.OrderedDict()
+    latest_packets_ring = None
+    latest_packets_ring_lock = threading.Lock()
+    latest_logged_evictions = 0
 
     def __init__(self, station_repository):
         """Initialize PacketDuplicatePolicy.
@@ -17,6 +23,32 @@ class PacketDuplicatePolicy:
         self.station_repository = station_repository
         self.logger = logging.getLogger('trackdirect')
 
+        if PacketDuplicatePolicy.latest_packets_ring is None:
+            with PacketDuplicatePolicy.latest_packets_ring_lock:
+                if PacketDuplicatePolicy.latest_packets_ring is None:
+                    config = TrackDirectConfig()
+                    PacketDuplicatePolicy.latest_packets_ring = PacketDuplicateRing(
+                        config.packet_duplicate_file, 60 * self.minutes_back_to_look_for_duplicates,
+                        entries_per_bucket=config.packet_duplicate_entries_per_minute)
+
+    @staticmethod
+    def log_stats():
+        """Log statistics of the ring used to remember recent packets (a warning is logged if entries has been evicted)"""
+        ring = PacketDuplicatePolicy.latest_packets_ring
+        if ring is None:
+            return
+
+        stats = ring.get_stats()
+        new_evictions = stats['evictions'] - PacketDuplicatePolicy.latest_logged_evictions
+        PacketDuplicatePolicy.latest_logged_evictions = stats['evictions']
+        message = 'Packet duplicate ring: %s of %s entries used (%.1f%%), %s evictions (%s since latest log)'
+        args = (stats['used_entries'], stats['entries'], stats['fill_ratio'] * 100, stats['evictions'], new_evictions)
+        if new_evictions > 0:
+            logging.getLogger('trackdirect').warning(
+                message + ', increase packet_duplicate_entries_per_minute to detect all duplicates', *args)
+        else:
+            logging.getLogger('trackdirect').info(message, *args)
+
     def is_duplicate(self, packet):
         """Check if the packet is a duplicate.
 
@@ -47,14 +79,16 @@ class PacketDuplicatePolicy:
         Returns:
             bool: True if packet body is in cache, False otherwise.
         """
-        packet_hash = self._get_packet_hash(packet)
-        if packet_hash is None:
+        packet_body = self._get_packet_body(packet)
+        if packet_body is None:
             return False
 
-        if packet_hash in PacketDuplicatePolicy.latest_packets_hash_ordered_dict:
-            prev_packet_values = PacketDuplicatePolicy.latest_packets_hash_ordered_dict[packet_hash]
-            if (packet.raw_path != prev_packet_values['path']
-                    and prev_packet_values['timestamp'] > packet.timestamp - (60 * self.minutes_back_to_look_for_duplicates)):
+        ring = PacketDuplicatePolicy.latest_packets_ring
+        prev_packet_values = ring.find(packet_body, packet.timestamp)
+        if prev_packet_values is not None:
+            prev_path_hash, prev_timestamp = prev_packet_values
+            if (ring.get_hash(packet.raw_path) != prev_path_hash
+                    and prev_timestamp > packet.timestamp - (60 * self.minutes_back_to_look_for_duplicates)):
                 return True
         return False
 
@@ -85,14 +119,14 @@ class PacketDuplicatePolicy:
             return True
         return False
 
-    def _get_packet_hash(self, packet):
-        """Get a hash value of the Packet object.
+    def _get_packet_body(self, packet):
+        """Get the body of the Packet object (used to identify duplicates).
 
         Args:
-            packet (Packet): Packet to get hash for.
+            packet (Packet): Packet to get body for.
 
         Returns:
-            str: Hash value of the packet.
+            str: Packet body.
         """
         if not packet.raw:
             return None
@@ -100,7 +134,7 @@ class PacketDuplicatePolicy:
         packet_string = packet.raw.split(':', 1)[1]
         if not packet_string:
             return None
-        return hash(packet_string.strip())
+        return packet_string.strip()
 
     def _add_to_cache(self, packet):
         """Add packet to cache.
@@ -108,18 +142,7 @@ class PacketDuplicatePolicy:
         Args:
             packet (Packet): Packet to add to cache.
         """
-        packet_hash = self._get_packet_hash(packet)
-        PacketDuplicatePolicy.latest_packets_hash_ordered_dict[packet_hash] = {
-            'path': packet.raw_path,
-            'timestamp': packet.timestamp
-        }
-        self._cache_maintenance()
-
-    def _cache_maintenance(self):
-        """Ensure cache does not contain too many packets."""
-        max_number_of_packets = self.minutes_back_to_look_for_duplicates * 60 * 100  # Assume an average of 100 packets per second
-        if len(PacketDuplicatePolicy.latest_packets_hash_ordered_dict) > max_number_of_packets:
-            try:
-                PacketDuplicatePolicy.latest_packets_hash_ordered_dict.popitem(last=False)
-            except (KeyError, StopIteration):
-                pass
\ No newline at end of file
+        packet_body = self._get_packet_body(packet)
+        if packet_body is None:
+            return
+        PacketDuplicatePolicy.latest_packets_ring.add(packet_body, packet.raw_path, int(packet.timestamp))
\ No newline at end of file
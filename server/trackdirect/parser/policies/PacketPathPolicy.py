@@ -37,31 +37,46 @@ class PacketPathPolicy:
 
     def _parse_path(self):
         """Parse Station path."""
+        for name in PacketPathPolicy.get_path_station_names(self.path):
+            self._add_station_to_path(name)
+
+    @staticmethod
+    def get_path_station_names(path):
+        """Returns the names in the specified raw path that may be added to the station path (without any lookups).
+
+        Args:
+            path (list): Raw packet path list
+
+        Returns:
+            list of station names
+        """
+        result = []
         is_q_code_found = False
         is_non_used_path_command_found = False
-        packet_path_tcp_policy = PacketPathTcpPolicy(self.path)
+        packet_path_tcp_policy = PacketPathTcpPolicy(path)
         if packet_path_tcp_policy.is_sent_by_tcp():
-            return
+            return result
 
-        for name in self.path:
+        for name in path:
             if isinstance(name, int):
                 name = str(name)
 
-            if self._is_q_code(name):
+            if PacketPathPolicy._is_q_code(name):
                 is_q_code_found = True
                 continue
 
-            if self._is_path_command(name):
-                if not self._is_used_path_command(name):
+            if PacketPathPolicy._is_path_command(name):
+                if not PacketPathPolicy._is_used_path_command(name):
                     is_non_used_path_command_found = True
                 continue
 
             path_station_name = name.replace('*', '')
-            if not self._is_station_name_valid(path_station_name):
+            if not PacketPathPolicy._is_station_name_valid(path_station_name):
                 continue
 
             if is_q_code_found or '*' in name or not is_non_used_path_command_found:
-                self._add_station_to_path(path_station_name)
+                result.append(path_station_name)
+        return result
 
     def _add_station_to_path(self, name):
         """Add station to path if valid."""
@@ -78,11 +93,13 @@ class PacketPathPolicy:
         except TrackDirectMissingStationError:
             pass
 
-    def _is_q_code(self, value):
+    @staticmethod
+    def _is_q_code(value):
         """Returns true if specified string is a Q code."""
         return value.upper().startswith('QA') and len(value) == 3
 
-    def _is_station_name_valid(self, name):
+    @staticmethod
+    def _is_station_name_valid(name):
         """Returns true if specified station name is valid."""
         invalid_names = {
             'NONE', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'APRS', '1-1', '2-1', '2-2', '3-1', '3-2', '3-3',
@@ -90,11 +107,13 @@ class PacketPathPolicy:
         }
         return not any(name.startswith(invalid) for invalid in invalid_names)
 
-    def _is_path_command(self, value):
+    @staticmethod
+    def _is_path_command(value):
         """Returns true if specified value is a path command."""
         return any(value.startswith(cmd) for cmd in ['WIDE', 'RELAY', 'TRACE', 'RPN'])
 
-    def _is_used_path_command(self, value):
+    @staticmethod
+    def _is_used_path_command(value):
         """Returns true if specified value is a path command and it is completely used."""
         if '*' in value:
             return True
@@ -91,18 +91,10 @@ class PacketRelatedMapSectorsPolicy:
             min_lng, max_lng = sorted([packet1.longitude, packet2.longitude])
 
             map_sector_policy = MapSectorPolicy()
-            min_lng = map_sector_policy.get_map_sector_lng_representation(min_lng)
-            min_lat = map_sector_policy.get_map_sector_lat_representation(min_lat)
-            max_lng = map_sector_policy.get_map_sector_lng_representation(max_lng + 0.5)
-            max_lat = map_sector_policy.get_map_sector_lat_representation(max_lat + 0.2)
             prev_packet_area_code = map_sector_policy.get_map_sector(packet2.latitude, packet2.longitude)
             new_packet_area_code = map_sector_policy.get_map_sector(packet1.latitude, packet1.longitude)
 
-            # lat interval: 0 - 18000000
-            # lng interval: 0 - 00003600
-            for lat in range(min_lat, max_lat, 20000):
-                for lng in range(min_lng, max_lng, 5):
-                    map_sector_area_code = lat + lng
-                    if map_sector_area_code not in {prev_packet_area_code, new_packet_area_code}:
-                        related_map_sectors.append(map_sector_area_code)
-        return related_map_sectors
\ No newline at end of file
+            for map_sector_area_code in map_sector_policy.get_map_sectors_in_area(min_lat, max_lat, min_lng, max_lng):
+                if map_sector_area_code not in {prev_packet_area_code, new_packet_area_code}:
+                    related_map_sectors.append(map_sector_area_code)
+        return related_map_sectors
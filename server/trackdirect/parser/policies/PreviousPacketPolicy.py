@@ -8,16 +8,18 @@ from server.trackdirect.repositories.StationRepository import StationRepository
 class PreviousPacketPolicy:
     """The PreviousPacketPolicy class tries to find the most related previous packet for the same station."""
 
-    def __init__(self, packet, db):
+    def __init__(self, packet, db, station_state_cache=None):
         """
         Initialize the PreviousPacketPolicy.
 
         Args:
             packet (Packet): Packet for which we want to find the most related previous packet.
             db (psycopg2.Connection): Database connection.
+            station_state_cache (StationStateCache): Cache of the latest packets (only available in the collector).
         """
         self.db = db
         self.packet = packet
+        self.station_state_cache = station_state_cache
         self.packet_repository = PacketRepository(db)
         self.station_repository = StationRepository(db)
 
@@ -32,7 +34,8 @@ class PreviousPacketPolicy:
             return self.packet_repository.create()
 
         min_timestamp = int(time.time()) - 86400  # 24 hours
-        latest_previous_packet = self.packet_repository.get_latest_object_by_station_id(self.packet.station_id, min_timestamp)
+        latest_previous_packet = self._get_cached_packet(
+            'latest', self.packet_repository.get_latest_object_by_station_id, min_timestamp)
 
         if not latest_previous_packet.is_existing_object():
             return latest_previous_packet
@@ -136,8 +139,8 @@ class PreviousPacketPolicy:
             previous_packet.is_existing_object()
             and (previous_packet.is_moving != 1 or previous_packet.map_id not in [1, 7])
         ):
-            prev_moving_packet = self.packet_repository.get_latest_moving_object_by_station_id(
-                self.packet.station_id, min_timestamp)
+            prev_moving_packet = self._get_cached_packet(
+                'latest_moving', self.packet_repository.get_latest_moving_object_by_station_id, min_timestamp)
             if prev_moving_packet.is_existing_object():
                 previous_packet = prev_moving_packet
 
@@ -148,12 +151,36 @@ class PreviousPacketPolicy:
             and previous_packet.map_id == 7
             and not packet_order_policy.is_packet_in_wrong_order(self.packet, previous_packet)
         ):
-            prev_confirmed_packet = self.packet_repository.get_latest_confirmed_moving_object_by_station_id(
-                self.packet.station_id, min_timestamp)
+            prev_confirmed_packet = self._get_cached_packet(
+                'latest_confirmed_moving', self.packet_repository.get_latest_confirmed_moving_object_by_station_id,
+                min_timestamp)
             previous_packet = self._get_closest_packet_object(previous_packet, prev_confirmed_packet)
 
         return previous_packet
 
+    def _get_cached_packet(self, slot, repository_method, min_timestamp):
+        """
+        Return the packet in the specified station state cache slot, falls back to the database on a cache miss.
+
+        Args:
+            slot (str): Station state cache slot.
+            repository_method (callable): PacketRepository method that takes station id and min timestamp.
+            min_timestamp (int): The oldest accepted timestamp (Unix timestamp).
+
+        Returns:
+            Packet: The found packet (a non existing packet if not found).
+        """
+        if self.station_state_cache is None:
+            return repository_method(self.packet.station_id, min_timestamp)
+
+        is_known, packet = self.station_state_cache.get(self.packet.station_id, slot, min_timestamp)
+        if is_known:
+            return packet if packet is not None else self.packet_repository.create()
+
+        packet = repository_method(self.packet.station_id, min_timestamp)
+        self.station_state_cache.set(self.packet.station_id, slot, packet)
+        return packet
+
     def _get_closest_packet_object(self, previous_packet1, previous_packet2):
         """
         Return the packet closest to the current position.
@@ -1,9 +1,17 @@
+import threading
+from collections import deque
+
 from server.trackdirect.common.Repository import Repository
 from server.trackdirect.objects.Marker import Marker
 
 class MarkerRepository(Repository):
     """A Repository class for the Marker class."""
 
+    # Static class variables, marker ids reserved from marker_seq that has not been used yet (shared by all threads)
+    reserved_ids = deque()
+    reserved_ids_lock = threading.Lock()
+    reserve_block_size = 1
+
     def __init__(self, db):
         """Initialize the MarkerRepository instance.
 
@@ -41,4 +49,40 @@ class MarkerRepository(Repository):
         Returns:
             Marker: A new Marker object
         """
-        return Marker(self.db)
\ No newline at end of file
+        return Marker(self.db)
+
+    @staticmethod
+    def set_reserve_block_size(block_size):
+        """Set number of marker ids to reserve at a time.
+
+        Note:
+            The latest packet of a station is found using its highest marker id, so marker ids must increase for
+            every new marker. If several processes creates markers (several collectors) the block size must be 1,
+            otherwise a process may use an id from an older block after another process has used a newer id.
+
+        Args:
+            block_size (int): Number of marker ids to reserve at a time
+        """
+        with MarkerRepository.reserved_ids_lock:
+            MarkerRepository.reserve_block_size = max(1, int(block_size))
+            MarkerRepository.reserved_ids.clear()
+
+    def get_new_marker_id(self) -> int:
+        """Return a new unique marker id.
+
+        Note:
+            Ids are reserved from marker_seq in blocks and handed out from memory. Reserved ids that is never used
+            (for example when the process is stopped) just leaves gaps in the sequence. Blocks are only used when this
+            is the only process that creates markers (see set_reserve_block_size).
+
+        Returns:
+            int: A new marker id
+        """
+        with MarkerRepository.reserved_ids_lock:
+            if not MarkerRepository.reserved_ids:
+                cursor = self.db.cursor()
+                cursor.execute("SELECT nextval('marker_seq') FROM generate_series(1, %s)",
+                               (MarkerRepository.reserve_block_size,))
+                MarkerRepository.reserved_ids.extend(sorted(record[0] for record in cursor.fetchall()))
+                cursor.close()
+            return MarkerRepository.reserved_ids.popleft()
@@ -1,9 +1,27 @@
+import logging
+import threading
+import time
 from server.trackdirect.common.Repository import Repository
 from server.trackdirect.objects.OgnDevice import OgnDevice
 
 
 class OgnDeviceRepository(Repository):
-    """A Repository class for the OgnDevice class."""
+    """A Repository class for the OgnDevice class.
+
+    Note:
+        Lookups by device id use a registry with all devices that is shared by all instances in the process.
+        The registry is loaded using one query and replaced when the generation of the ogn_device table changes
+        (ogn_devices_install.sh increases the ogn_device_generation_seq sequence every time it reloads the table).
+    """
+
+    # Device values (device_type, aircraft_model, registration, cn, tracked, identified, ddb_aircraft_type) by device id
+    registry = None
+    registry_generation = None
+    registry_check_timestamp = 0
+    registry_lock = threading.Lock()
+
+    # Seconds between each check of the ogn_device table generation
+    registry_check_interval = 60
 
     def __init__(self, db):
         """
@@ -38,7 +56,7 @@ class OgnDeviceRepository(Repository):
 
     def get_object_by_device_id(self, device_id: str) -> OgnDevice:
         """
-        Retrieve an OgnDevice object based on the specified device_id in the database.
+        Retrieve an OgnDevice object based on the specified device_id (using the device registry).
 
         Args:
             device_id (str): Device Id (corresponds to ogn_sender_address).
@@ -46,16 +64,114 @@ class OgnDeviceRepository(Repository):
         Returns:
             OgnDevice: An instance of OgnDevice.
         """
+        values = self._get_registry().get(device_id)
+        if values is None:
+            return self._create_empty_object()
+        return self._get_object_from_registry_values(device_id, values)
+
+    def get_object_list_by_device_id_list(self, device_id_list: list) -> list:
+        """
+        Retrieve the OgnDevice objects for the specified device ids.
+
+        Args:
+            device_id_list (list): Device ids (corresponds to ogn_sender_address).
+
+        Returns:
+            list: The OgnDevice objects that was found.
+        """
+        if not device_id_list:
+            return []
+
+        registry = self._get_registry()
+        result = []
+        for device_id in set(device_id_list):
+            values = registry.get(device_id)
+            if values is not None:
+                result.append(self._get_object_from_registry_values(device_id, values))
+        return result
+
+    def refresh_registry(self):
+        """
+        Reload the device registry if the ogn_device table has changed (or if it is not loaded yet).
+
+        Returns:
+            bool: True if the registry was reloaded.
+        """
         cursor = self.db.cursor()
-        cursor.execute("SELECT * FROM ogn_device WHERE device_id LIKE %s", (device_id,))
+        cursor.execute("""
+            SELECT to_regclass('ogn_device') IS NOT NULL AS has_table,
+                (SELECT last_value FROM pg_sequences WHERE sequencename = 'ogn_device_generation_seq') AS generation""")
         record = cursor.fetchone()
+        generation = (record["has_table"], record["generation"])
+        OgnDeviceRepository.registry_check_timestamp = time.time()
+
+        if OgnDeviceRepository.registry is not None and generation == OgnDeviceRepository.registry_generation:
+            cursor.close()
+            return False
+
+        start_timestamp = time.time()
+        registry = {}
+        if record["has_table"]:
+            cursor.execute("""
+                SELECT device_id, device_type, aircraft_model, registration, cn, tracked, identified, ddb_aircraft_type
+                FROM ogn_device""")
+            for record in cursor:
+                try:
+                    ddb_aircraft_type = int(record["ddb_aircraft_type"])
+                except ValueError:
+                    ddb_aircraft_type = None
+                registry[record["device_id"]] = (record["device_type"], record["aircraft_model"], record["registration"],
+                                                 record["cn"], record["tracked"] != 'N', record["identified"] != 'N',
+                                                 ddb_aircraft_type)
+        cursor.close()
 
-        if record is not None:
-            db_object = self._get_object_from_record(record)
-        else:
-            db_object = self._create_empty_object()
+        # Replace the whole registry at once, threads using the old registry will finish their lookups in it
+        OgnDeviceRepository.registry = registry
+        OgnDeviceRepository.registry_generation = generation
+        logging.getLogger('trackdirect').info('Loaded %s OGN devices in %.3fs (generation %s)',
+                                              len(registry), time.time() - start_timestamp, generation[1])
+        return True
 
-        cursor.close()
+    def _get_registry(self) -> dict:
+        """
+        Returns the device registry, loads it if it is not loaded and reloads it if the ogn_device table has changed.
+
+        Returns:
+            dict: Device values by device id.
+        """
+        registry = OgnDeviceRepository.registry
+        if registry is None:
+            with OgnDeviceRepository.registry_lock:
+                if OgnDeviceRepository.registry is None:
+                    self.refresh_registry()
+            return OgnDeviceRepository.registry
+
+        if OgnDeviceRepository.registry_check_timestamp < time.time() - OgnDeviceRepository.registry_check_interval:
+            # Only one thread checks the generation, the others continues to use the current registry
+            if OgnDeviceRepository.registry_lock.acquire(False):
+                try:
+                    if OgnDeviceRepository.registry_check_timestamp < time.time() - OgnDeviceRepository.registry_check_interval:
+                        self.refresh_registry()
+                finally:
+                    OgnDeviceRepository.registry_lock.release()
+            registry = OgnDeviceRepository.registry
+        return registry
+
+    def _get_object_from_registry_values(self, device_id: str, values: tuple) -> OgnDevice:
+        """
+        Create an OgnDevice object based on the specified device registry values.
+
+        Args:
+            device_id (str): Device Id.
+            values (tuple): Device values from the registry.
+
+        Returns:
+            OgnDevice: An instance of OgnDevice.
+        """
+        db_object = self._create_empty_object()
+        db_object.device_id = device_id
+        (db_object.device_type, db_object.aircraft_model, db_object.registration, db_object.cn,
+         db_object.tracked, db_object.identified, db_object.ddb_aircraft_type) = values
         return db_object
 
     def _get_object_from_record(self, record: dict) -> OgnDevice:
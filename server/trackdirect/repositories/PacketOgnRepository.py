@@ -45,6 +45,27 @@ class PacketOgnRepository(Repository):
         cursor.close()
         return self.get_object_from_record(record)
 
+    def get_object_list_by_packet_id_and_timestamp_list(self, packet_id_timestamp_list: list) -> list:
+        """Return a list of objects based on the specified (packet id, timestamp) tuples.
+
+        Args:
+            packet_id_timestamp_list (list): List of (packet id, unix timestamp) tuples
+
+        Returns:
+            list: The PacketOgn objects that was found
+        """
+        if not packet_id_timestamp_list:
+            return []
+
+        cursor = self.db.cursor()
+        cursor.execute("""SELECT * FROM packet_ogn
+                          WHERE (packet_id, timestamp) IN (SELECT * FROM unnest(%s, %s))""",
+                       ([packet_id for packet_id, timestamp in packet_id_timestamp_list],
+                        [timestamp for packet_id, timestamp in packet_id_timestamp_list]))
+        result = [self.get_object_from_record(record) for record in cursor]
+        cursor.close()
+        return result
+
     def get_object_from_record(self, record: dict) -> PacketOgn:
         """Convert a database record to a PacketOgn object.
 
@@ -1,6 +1,9 @@
+import psycopg2.errors
+
 from server.trackdirect.common.Repository import Repository
 from server.trackdirect.objects.Packet import Packet
 from server.trackdirect.database.PacketTableCreator import PacketTableCreator
+from server.trackdirect.database.PacketTableUnionQuery import PacketTableUnionQuery
 from server.trackdirect.exceptions.TrackDirectMissingTableError import TrackDirectMissingTableError
 from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
 
@@ -27,7 +30,8 @@ class PacketRepository(Repository):
         try:
             packet_table = self.packet_table_creator.get_table(timestamp)
             with self.db.cursor() as cursor:
-                cursor.execute(f"SELECT * FROM {packet_table} WHERE id = %s", (id,))
+                if not self._execute_packet_table_query(cursor, f"SELECT * FROM {packet_table} WHERE id = %s", (id,)):
+                    return self.create()
                 record = cursor.fetchone()
             return self.get_object_from_record(record)
         except TrackDirectMissingTableError:
@@ -38,51 +42,145 @@ class PacketRepository(Repository):
         try:
             packet_table = self.packet_table_creator.get_table(timestamp)
             with self.db.cursor() as cursor:
-                cursor.execute(f"""
+                if not self._execute_packet_table_query(cursor, f"""
                     SELECT * FROM {packet_table}
                     WHERE station_id = %s AND timestamp = %s
                     ORDER BY id LIMIT 1
-                """, (station_id, timestamp))
+                """, (station_id, timestamp)):
+                    return self.create()
                 record = cursor.fetchone()
             return self.get_object_from_record(record)
         except TrackDirectMissingTableError:
             return self.create()
 
+    def get_object_list_by_id_and_timestamp_list(self, id_timestamp_list):
+        """Return a list of Packet objects specified by (id, timestamp) tuples, one query per packet table."""
+        result = []
+        with self.db.cursor() as cursor:
+            for packet_table, current_id_timestamp_list in self._group_by_packet_table(id_timestamp_list).items():
+                if not self._execute_packet_table_query(cursor, f"SELECT * FROM {packet_table} WHERE id = ANY(%s)",
+                                                        ([id for id, timestamp in current_id_timestamp_list],)):
+                    continue
+                for record in cursor:
+                    if record:
+                        result.append(self.get_object_from_record(record))
+        return result
+
+    def get_object_list_by_station_id_and_timestamp_list(self, station_id_timestamp_list):
+        """Return a list of Packet objects specified by (station_id, timestamp) tuples, one query per packet table.
+
+        Note:
+            Like get_object_by_station_id_and_timestamp only the packet with the lowest id is returned for each tuple.
+        """
+        result = []
+        with self.db.cursor() as cursor:
+            for packet_table, current_station_id_timestamp_list in self._group_by_packet_table(station_id_timestamp_list).items():
+                if not self._execute_packet_table_query(cursor, f"""
+                    SELECT DISTINCT ON (station_id, timestamp) * FROM {packet_table}
+                    WHERE (station_id, timestamp) IN (SELECT * FROM unnest(%s, %s))
+                    ORDER BY station_id, timestamp, id
+                """, ([station_id for station_id, timestamp in current_station_id_timestamp_list],
+                      [timestamp for station_id, timestamp in current_station_id_timestamp_list])):
+                    continue
+                for record in cursor:
+                    if record:
+                        result.append(self.get_object_from_record(record))
+        return result
+
+    def _execute_packet_table_query(self, cursor, sql, params):
+        """Execute a query that uses packet tables found in the packet table registry.
+
+        Note:
+            The registry may still contain a packet table that the remover (another process) has dropped, the
+            registry is then reloaded. Only done with autocommit, a failed transaction can not be continued.
+
+        Returns:
+            bool: False if a packet table in the query does not exist (the query failed)
+        """
+        try:
+            cursor.execute(sql, params)
+            return True
+        except psycopg2.errors.UndefinedTable:
+            if not self.db.autocommit:
+                raise
+            self.db_object_finder.refresh_packet_table_registry()
+            return False
+
+    def _execute_union_query(self, cursor, union_query, sql, params):
+        """Execute the sql created by the specified PacketTableUnionQuery.
+
+        Note:
+            If a packet table has been dropped the query is executed again without it (see _execute_packet_table_query).
+
+        Returns:
+            bool: False if no packet table remains (nothing has been executed)
+        """
+        if self._execute_packet_table_query(cursor, sql, params):
+            return True
+
+        union_query.remove_missing_tables(self.db_object_finder.check_table_exists)
+        if union_query.is_empty():
+            return False
+        cursor.execute(*union_query.get_latest_sql())
+        return True
+
+    def _create_union_query(self, min_timestamp, max_timestamp=None):
+        """Returns a PacketTableUnionQuery for the packet tables in the specified time interval.
+
+        Note:
+            If the packet tables are partitions of a partitioned packet table the query uses the parent table.
+        """
+        partitioned_table = 'packet' if self.db_object_finder.check_table_partitioned('packet') else None
+        return PacketTableUnionQuery(self.packet_table_creator.get_tables(min_timestamp, max_timestamp), partitioned_table)
+
+    def _group_by_packet_table(self, key_timestamp_list):
+        """Group (key, timestamp) tuples by packet table, tuples for missing packet tables are ignored."""
+        tuples_by_date = {}
+        for key, timestamp in key_timestamp_list:
+            tuples_by_date.setdefault(int(timestamp) // (24 * 60 * 60), []).append((key, timestamp))
+
+        result = {}
+        for current_tuples in tuples_by_date.values():
+            try:
+                result[self.packet_table_creator.get_table(int(current_tuples[0][1]))] = current_tuples
+            except TrackDirectMissingTableError:
+                pass
+        return result
+
     def get_latest_object_list_by_station_id_list_and_time_interval(self, station_id_list, min_packet_timestamp, max_packet_timestamp, only_confirmed=True):
         """Return an array of the latest Packet objects specified by station ids."""
         if not station_id_list:
             return []
 
         result = []
-        found_station_id_list = []
-        packet_tables = self.packet_table_creator.get_tables(min_packet_timestamp, max_packet_timestamp)
+        union_query = self._create_union_query(min_packet_timestamp, max_packet_timestamp)
+        if union_query.is_empty():
+            return result
         map_id_list = [1, 2, 12] if only_confirmed else [1, 2, 5, 7, 9, 12]
 
-        with self.db.cursor() as cursor:
-            for packet_table in reversed(packet_tables):
-                station_id_list_to_find = tuple(set(station_id_list) - set(found_station_id_list))
-                if station_id_list_to_find:
-                    cursor.execute(f"""
-                        SELECT * FROM {packet_table} packet
-                        WHERE id IN (
-                            SELECT MAX(id)
-                            FROM {packet_table} packet
-                            WHERE map_id IN %s
-                                AND station_id IN %s
-                                AND timestamp > %s
-                                AND timestamp <= %s
-                            GROUP BY station_id
-                        )
-                        ORDER BY packet.marker_id DESC, packet.id DESC
-                    """, (tuple(map_id_list), station_id_list_to_find, min_packet_timestamp, max_packet_timestamp))
-
-                    for record in cursor:
-                        if record and record['station_id'] not in found_station_id_list:
-                            result.append(self.get_object_from_record(record))
-                            found_station_id_list.append(record['station_id'])
+        # The packet from the newest packet table is used for each station (a packet table contains one day)
+        sql, params = union_query.get_sql("""
+            SELECT * FROM {packet_table} packet
+            WHERE id IN (
+                SELECT MAX(id)
+                FROM {packet_table} packet
+                WHERE map_id IN %s
+                    AND station_id IN %s
+                    AND timestamp > %s
+                    AND timestamp <= %s
+                GROUP BY station_id, timestamp / 86400
+            )
+                AND timestamp > %s
+                AND timestamp <= %s
+        """, (tuple(map_id_list), tuple(station_id_list), min_packet_timestamp, max_packet_timestamp,
+              min_packet_timestamp, max_packet_timestamp),
+            order_by='marker_id DESC, id DESC', newest_first=True, distinct_on='station_id')
 
-                if len(found_station_id_list) >= len(station_id_list):
-                    break
+        with self.db.cursor() as cursor:
+            if self._execute_union_query(cursor, union_query, sql, params):
+                for record in cursor:
+                    if record:
+                        result.append(self.get_object_from_record(record))
 
         return result
 
@@ -92,32 +190,28 @@ class PacketRepository(Repository):
             return []
 
         result = []
-        packet_tables = self.packet_table_creator.get_tables(min_packet_timestamp, max_packet_timestamp)
+        union_query = self._create_union_query(min_packet_timestamp, max_packet_timestamp)
+        if union_query.is_empty():
+            return result
+
+        sql, params = union_query.get_sql("""
+            SELECT 1 AS packet_query_rank, * FROM {packet_table} packet
+            WHERE map_id IN (1, 2, 5, 7, 9, 12)
+                AND station_id IN %s
+                AND timestamp > %s
+                AND timestamp <= %s
+            UNION ALL
+            SELECT 2 AS packet_query_rank, * FROM {packet_table} packet
+            WHERE map_id = 12
+                AND station_id IN %s
+                AND position_timestamp <= %s
+                AND timestamp > %s
+        """, (tuple(station_id_list), min_packet_timestamp, max_packet_timestamp,
+              tuple(station_id_list), max_packet_timestamp, min_packet_timestamp),
+            order_by='packet_query_rank, marker_id, id')
 
         with self.db.cursor() as cursor:
-            for packet_table in packet_tables:
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table} packet
-                    WHERE map_id IN (1, 2, 5, 7, 9, 12)
-                        AND station_id IN %s
-                        AND timestamp > %s
-                        AND timestamp <= %s
-                    ORDER BY packet.marker_id, packet.id
-                """, (tuple(station_id_list), min_packet_timestamp, max_packet_timestamp))
-
-                for record in cursor:
-                    if record:
-                        result.append(self.get_object_from_record(record))
-
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table} packet
-                    WHERE map_id = 12
-                        AND station_id IN %s
-                        AND position_timestamp <= %s
-                        AND timestamp > %s
-                    ORDER BY packet.marker_id, packet.id
-                """, (tuple(station_id_list), max_packet_timestamp, min_packet_timestamp))
-
+            if self._execute_union_query(cursor, union_query, sql, params):
                 for record in cursor:
                     if record:
                         result.append(self.get_object_from_record(record))
@@ -130,18 +224,19 @@ class PacketRepository(Repository):
             return []
 
         result = []
-        packet_tables = self.packet_table_creator.get_tables(min_packet_timestamp)
+        union_query = self._create_union_query(min_packet_timestamp)
+        if union_query.is_empty():
+            return result
 
-        with self.db.cursor() as cursor:
-            for packet_table in packet_tables:
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table} packet
-                    WHERE map_id IN (1, 5, 7, 9)
-                        AND station_id IN %s
-                        AND timestamp > %s
-                    ORDER BY packet.marker_id, packet.id
-                """, (tuple(station_id_list), min_packet_timestamp))
+        sql, params = union_query.get_sql("""
+            SELECT * FROM {packet_table} packet
+            WHERE map_id IN (1, 5, 7, 9)
+                AND station_id IN %s
+                AND timestamp > %s
+        """, (tuple(station_id_list), min_packet_timestamp), order_by='marker_id, id')
 
+        with self.db.cursor() as cursor:
+            if self._execute_union_query(cursor, union_query, sql, params):
                 for record in cursor:
                     if record:
                         result.append(self.get_object_from_record(record))
@@ -150,63 +245,68 @@ class PacketRepository(Repository):
 
     def get_latest_object_by_station_id_and_position(self, station_id, latitude, longitude, map_id_list, symbol=None, symbol_table=None, min_timestamp=0):
         """Return a Packet object specified by station id and position."""
-        packet_tables = self.packet_table_creator.get_tables(min_timestamp)
-
-        with self.db.cursor() as cursor:
-            for packet_table in reversed(packet_tables):
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table}
-                    WHERE station_id = %s
-                        AND latitude = %s
-                        AND longitude = %s
-                        AND map_id IN %s
-                        AND timestamp > %s
-                        {f"AND symbol = %s" if symbol else ""}
-                        {f"AND symbol_table = %s" if symbol_table else ""}
-                    ORDER BY marker_id DESC, id DESC LIMIT 1
-                """, (station_id, latitude, longitude, tuple(map_id_list), min_timestamp, symbol, symbol_table))
-
-                record = cursor.fetchone()
-                if record:
-                    return self.get_object_from_record(record)
-
-        return self.create()
+        params = [station_id, latitude, longitude, tuple(map_id_list), min_timestamp]
+        if symbol:
+            params.append(symbol)
+        if symbol_table:
+            params.append(symbol_table)
+
+        return self._get_latest_object(f"""
+            SELECT * FROM {{packet_table}}
+            WHERE station_id = %s
+                AND latitude = %s
+                AND longitude = %s
+                AND map_id IN %s
+                AND timestamp > %s
+                {"AND symbol = %s" if symbol else ""}
+                {"AND symbol_table = %s" if symbol_table else ""}
+            ORDER BY marker_id DESC, id DESC LIMIT 1
+        """, tuple(params), min_timestamp)
 
     def get_latest_confirmed_moving_object_by_station_id(self, station_id, min_timestamp=0):
         """Return the latest confirmed moving Packet specified by station id."""
-        packet_tables = self.packet_table_creator.get_tables(min_timestamp)
-
-        with self.db.cursor() as cursor:
-            for packet_table in reversed(packet_tables):
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table}
-                    WHERE station_id = %s
-                        AND is_moving = 1
-                        AND map_id = 1
-                        AND timestamp > %s
-                    ORDER BY marker_id DESC, id DESC LIMIT 1
-                """, (station_id, min_timestamp))
-
-                record = cursor.fetchone()
-                if record:
-                    return self.get_object_from_record(record)
-
-        return self.create()
+        return self._get_latest_object("""
+            SELECT * FROM {packet_table}
+            WHERE station_id = %s
+                AND is_moving = 1
+                AND map_id = 1
+                AND timestamp > %s
+            ORDER BY marker_id DESC, id DESC LIMIT 1
+        """, (station_id, min_timestamp), min_timestamp)
 
     def get_latest_moving_object_by_station_id(self, station_id, min_timestamp=0):
         """Return the latest moving Packet specified by station id."""
+        return self._get_latest_object("""
+            SELECT * FROM {packet_table} packet
+            WHERE station_id = %s
+                AND is_moving = 1
+                AND map_id IN (1, 7)
+                AND timestamp > %s
+            ORDER BY marker_id DESC, id DESC LIMIT 1
+        """, (station_id, min_timestamp), min_timestamp)
+
+    def _get_latest_object(self, table_sql, params, min_timestamp):
+        """Return the Packet found by the specified single row query in the newest packet table that has a match.
+
+        Note:
+            Used by the collector for every received packet, the station has usually sent a packet today so the
+            packet tables are queried one at a time (newest first) instead of using a PacketTableUnionQuery, that
+            would probe the indexes of every packet table in the time interval.
+
+        Args:
+            table_sql (str): Query with a {packet_table} placeholder for the packet table name
+            params (tuple): Parameters for the query
+            min_timestamp (int): Packets older than this is not included
+
+        Returns:
+            Packet
+        """
         packet_tables = self.packet_table_creator.get_tables(min_timestamp)
 
         with self.db.cursor() as cursor:
             for packet_table in reversed(packet_tables):
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table} packet
-                    WHERE station_id = %s
-                        AND is_moving = 1
-                        AND map_id IN (1, 7)
-                        AND timestamp > %s
-                    ORDER BY marker_id DESC, id DESC LIMIT 1
-                """, (station_id, min_timestamp))
+                if not self._execute_packet_table_query(cursor, table_sql.format(packet_table=packet_table), params):
+                    continue
 
                 record = cursor.fetchone()
                 if record:
@@ -246,21 +346,21 @@ class PacketRepository(Repository):
             return []
 
         result = []
-        packet_tables = self.packet_table_creator.get_tables(min_timestamp)
+        union_query = self._create_union_query(min_timestamp)
 
         with self.db.cursor() as cursor:
-            for packet_table in packet_tables:
-                cursor.execute(f"""
-                    SELECT * FROM {packet_table}
+            if not union_query.is_empty():
+                sql, params = union_query.get_sql("""
+                    SELECT * FROM {packet_table} packet
                     WHERE station_id IN %s
                         AND timestamp > %s
                         AND is_moving = 0
                         AND map_id = 1
                 """, (tuple(station_id_list), min_timestamp))
-
-                for record in cursor:
-                    if record:
-                        result.append(self.get_object_from_record(record))
+                if self._execute_union_query(cursor, union_query, sql, params):
+                    for record in cursor:
+                        if record:
+                            result.append(self.get_object_from_record(record))
 
             for station_id in station_id_list:
                 packet = self.get_latest_confirmed_moving_object_by_station_id(station_id, min_timestamp)
@@ -281,7 +381,7 @@ class PacketRepository(Repository):
 
         with self.db.cursor() as cursor:
             for packet_table in reversed(packet_tables):
-                cursor.execute(f"""
+                if not self._execute_packet_table_query(cursor, f"""
                     SELECT * FROM {packet_table} packet
                     WHERE id IN (
                         SELECT MAX(id)
@@ -293,7 +393,8 @@ class PacketRepository(Repository):
                             AND map_id IN (1, 2, 12)
                         GROUP BY station_id, latitude, longitude, symbol, symbol_table
                     )
-                """, (tuple(station_id_list), min_timestamp, max_timestamp))
+                """, (tuple(station_id_list), min_timestamp, max_timestamp)):
+                    continue
 
                 for record in cursor:
                     if record:
@@ -302,7 +403,7 @@ class PacketRepository(Repository):
                             found_stationary_marker_hash_list.append(marker_hash)
                             result.append(self.get_object_from_record(record))
 
-                cursor.execute(f"""
+                if not self._execute_packet_table_query(cursor, f"""
                     SELECT packet.* FROM {packet_table} packet
                     WHERE id IN (
                         SELECT MAX(id)
@@ -314,7 +415,8 @@ class PacketRepository(Repository):
                             AND is_moving = 1
                         GROUP BY station_id
                     )
-                """, (tuple(station_id_list), min_timestamp, max_timestamp))
+                """, (tuple(station_id_list), min_timestamp, max_timestamp)):
+                    continue
 
                 for record in cursor:
                     if record and record['station_id'] not in found_moving_marker_station_id_list:
@@ -339,14 +441,15 @@ class PacketRepository(Repository):
 
             with self.db.cursor() as cursor:
                 for packet_table in reversed(packet_tables):
-                    cursor.execute(f"""
+                    if not self._execute_packet_table_query(cursor, f"""
                         SELECT packet.* FROM {packet_table} packet, station
                         WHERE station.id IN %s
                             AND station.latest_confirmed_packet_id = packet.id
                             AND station.latest_confirmed_packet_timestamp = packet.timestamp
                             AND station.latest_confirmed_packet_timestamp > %s
                         ORDER BY packet.marker_id, packet.id
-                    """, (tuple(station_id_list), min_timestamp))
+                    """, (tuple(station_id_list), min_timestamp)):
+                        continue
 
                     for record in cursor:
                         if record:
@@ -373,13 +476,14 @@ class PacketRepository(Repository):
 
             with self.db.cursor() as cursor:
                 for packet_table in reversed(packet_tables):
-                    cursor.execute(f"""
+                    if not self._execute_packet_table_query(cursor, f"""
                         SELECT packet.* FROM {packet_table} packet, station
                         WHERE station.id IN %s
                             AND station.latest_location_packet_id = packet.id
                             AND station.latest_confirmed_packet_timestamp = packet.timestamp
                             AND station.latest_location_packet_timestamp > %s
-                    """, (tuple(station_id_list), min_timestamp))
+                    """, (tuple(station_id_list), min_timestamp)):
+                        continue
 
                     for record in cursor:
                         if record:
@@ -51,6 +51,31 @@ class PacketWeatherRepository(Repository):
         except TrackDirectMissingTableError:
             return self.create()
 
+    def get_object_list_by_packet_id_and_timestamp_list(self, packet_id_timestamp_list):
+        """Retrieve PacketWeather objects by (packet ID, timestamp) tuples, one query per weather table.
+
+        Args:
+            packet_id_timestamp_list (list): List of (packet ID, unix timestamp) tuples
+
+        Returns:
+            list of PacketWeather
+        """
+        packet_ids_by_date = {}
+        for packet_id, timestamp in packet_id_timestamp_list:
+            packet_ids_by_date.setdefault(int(timestamp) // (24 * 60 * 60), (timestamp, []))[1].append(packet_id)
+
+        result = []
+        with self.db.cursor() as cursor:
+            for timestamp, packet_ids in packet_ids_by_date.values():
+                try:
+                    table = self.packet_weather_table_creator.get_packet_weather_table(timestamp)
+                except TrackDirectMissingTableError:
+                    continue
+                cursor.execute(f"SELECT * FROM {table} WHERE packet_id = ANY(%s)", (packet_ids,))
+                for record in cursor:
+                    result.append(self._get_object_from_record(record))
+        return result
+
     def _get_object_from_record(self, record):
         """Convert a database record to a PacketWeather object.
 
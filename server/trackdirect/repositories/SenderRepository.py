@@ -3,15 +3,16 @@ from server.trackdirect.objects.Sender import Sender
 from server.trackdirect.objects.Station import Station
 from server.trackdirect.exceptions.TrackDirectMissingSenderError import TrackDirectMissingSenderError
 from server.trackdirect.common.Repository import Repository
+from server.trackdirect.common.LruCache import LruCache
 
 
 class SenderRepository(Repository):
     """A Repository class for the Sender class."""
 
-    # Static class variables for caching
-    senderIdCache = {}
-    senderNameCache = {}
-    maxNumberOfSenders = 100
+    # Static class variables for caching (id cache contains the sender name, name cache contains the sender id)
+    # Senders may be removed by the remover script, so entries are only trusted for a day.
+    senderIdCache = LruCache(100000, 24 * 60 * 60)
+    senderNameCache = LruCache(100000, 24 * 60 * 60)
 
     def __init__(self, db):
         """Initialize the SenderRepository with a database connection.
@@ -105,13 +106,14 @@ class SenderRepository(Repository):
         Returns:
             Sender: An instance of Sender
         """
-        if senderId not in SenderRepository.senderIdCache:
-            sender = self.get_object_by_id(senderId)
-            if sender.is_existing_object():
-                self._cache_sender_by_id(senderId, sender)
-                return sender
-        else:
-            return SenderRepository.senderIdCache[senderId]
+        senderName = SenderRepository.senderIdCache.get(senderId)
+        if senderName is not None:
+            return self._create_cached_object(senderId, senderName)
+
+        sender = self.get_object_by_id(senderId)
+        if sender.is_existing_object():
+            SenderRepository.senderIdCache.set(sender.id, sender.name)
+            return sender
 
         raise TrackDirectMissingSenderError('No sender with specified id found')
 
@@ -124,16 +126,116 @@ class SenderRepository(Repository):
         Returns:
             Sender: An instance of Sender
         """
-        if senderName not in SenderRepository.senderNameCache:
-            sender = self.get_object_by_name(senderName, False)
-            if sender.is_existing_object():
-                self._cache_sender_by_name(senderName, sender)
-                return sender
-        else:
-            return SenderRepository.senderNameCache[senderName]
+        senderId = SenderRepository.senderNameCache.get(senderName)
+        if senderId is not None:
+            return self._create_cached_object(senderId, senderName)
+
+        sender = self.get_object_by_name(senderName, False)
+        if sender.is_existing_object():
+            SenderRepository.senderNameCache.set(senderName, sender.id)
+            return sender
 
         raise TrackDirectMissingSenderError('No sender with specified sender name found')
 
+    def get_uncached_names(self, senderNames):
+        """Return the sender names that is not found in the sender name cache.
+
+        Args:
+            senderNames (list): Sender names
+
+        Returns:
+            list: Sender names that is not cached
+        """
+        return [name for name in senderNames if not SenderRepository.senderNameCache.contains(name)]
+
+    def cache_object_list_by_names(self, senderNames):
+        """Look up the specified sender names using one query and add the found senders to the sender caches.
+
+        Args:
+            senderNames (list): Sender names
+
+        Returns:
+            list: Sender names that was not found
+        """
+        if not senderNames:
+            return []
+
+        with self.db.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT ON (name) id, name FROM sender WHERE name = ANY(%s) ORDER BY name, id",
+                           (list(senderNames),))
+            records = cursor.fetchall()
+
+        foundNames = set()
+        for record in records:
+            foundNames.add(record["name"])
+            SenderRepository.senderIdCache.set(record["id"], record["name"])
+            SenderRepository.senderNameCache.set(record["name"], record["id"])
+        return [name for name in senderNames if name not in foundNames]
+
+    def create_object_list(self, senderNames):
+        """Create the specified senders using one query and add them to the sender caches.
+
+        Args:
+            senderNames (list): Sender names
+        """
+        if not senderNames:
+            return
+
+        with self.db.cursor() as cursor:
+            cursor.execute("INSERT INTO sender(name) SELECT unnest(%s::text[]) RETURNING id, name",
+                           ([name.strip() for name in senderNames],))
+            records = cursor.fetchall()
+
+        for record in records:
+            SenderRepository.senderIdCache.set(record["id"], record["name"])
+            SenderRepository.senderNameCache.set(record["name"], record["id"])
+
+    def preload_cache(self, sourceId, minTimestamp):
+        """Add the latest senders of the most recently heard stations to the sender caches.
+
+        Args:
+            sourceId (int): Only load senders of stations from this source
+            minTimestamp (int): Only load senders of stations heard after this time
+        """
+        if sourceId == 3:
+            sourceId = 1
+
+        with self.db.cursor() as cursor:
+            cursor.execute(
+                """SELECT sender.id, sender.name FROM sender
+                   JOIN station ON station.latest_sender_id = sender.id
+                   WHERE station.source_id = %s AND station.latest_packet_timestamp > %s
+                   ORDER BY station.latest_packet_timestamp DESC LIMIT %s""",
+                (sourceId, minTimestamp, SenderRepository.senderIdCache.max_size)
+            )
+            records = cursor.fetchall()
+
+        # Add least recently heard first, they will be the first to be removed from cache
+        for record in reversed(records):
+            SenderRepository.senderIdCache.set(record["id"], record["name"])
+            SenderRepository.senderNameCache.set(record["name"], record["id"])
+        self.logger.info('Sender cache preloaded with %s senders', len(records))
+
+    @staticmethod
+    def set_cache_size(maxSize):
+        """Set max number of senders in the sender caches.
+
+        Args:
+            maxSize (int): Max number of senders
+        """
+        SenderRepository.senderIdCache.resize(maxSize)
+        SenderRepository.senderNameCache.resize(maxSize)
+
+    @staticmethod
+    def get_cache_stats():
+        """Return statistics for the sender caches.
+
+        Returns:
+            dict: The statistics of the id cache and name cache
+        """
+        return {'id': SenderRepository.senderIdCache.get_stats(),
+                'name': SenderRepository.senderNameCache.get_stats()}
+
     def create(self):
         """Create an empty Sender object.
 
@@ -142,14 +244,9 @@ class SenderRepository(Repository):
         """
         return Sender(self.db)
 
-    def _cache_sender_by_id(self, senderId, sender):
-        """Cache a Sender object by its ID."""
-        if len(SenderRepository.senderIdCache) > SenderRepository.maxNumberOfSenders:
-            SenderRepository.senderIdCache.clear()
-        SenderRepository.senderIdCache[senderId] = sender
-
-    def _cache_sender_by_name(self, senderName, sender):
-        """Cache a Sender object by its name."""
-        if len(SenderRepository.senderNameCache) > SenderRepository.maxNumberOfSenders:
-            SenderRepository.senderNameCache.clear()
-        SenderRepository.senderNameCache[senderName] = sender
+    def _create_cached_object(self, senderId, senderName):
+        """Create a Sender object from cached values."""
+        dbObject = self.create()
+        dbObject.id = senderId
+        dbObject.name = senderName
+        return dbObject
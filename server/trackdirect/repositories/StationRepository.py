@@ -1,5 +1,6 @@
 import logging
 
+from server.trackdirect.common.LruCache import LruCache
 from server.trackdirect.common.Repository import Repository
 from server.trackdirect.objects.Station import Station
 from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
@@ -11,8 +12,10 @@ class StationRepository(Repository):
     """A Repository class for the Station class."""
 
     # Static class variables
-    station_id_cache = {}
-    station_name_cache = {}
+    # Id cache contains (id, name, station_type_id, source_id) for each station, name cache contains the station id.
+    # Rows may be modified by other processes, so entries are only trusted for a day.
+    station_id_cache = LruCache(100000, 24 * 60 * 60)
+    station_name_cache = LruCache(100000, 24 * 60 * 60)
 
     def __init__(self, db):
         """Initialize the StationRepository with a database connection."""
@@ -143,33 +146,166 @@ class StationRepository(Repository):
         return result
 
     def get_cached_object_by_id(self, station_id):
-        """Get Station based on station id."""
-        if station_id not in StationRepository.station_id_cache:
-            station = self.get_object_by_id(station_id)
-            if station.is_existing_object():
-                self._update_cache(StationRepository.station_id_cache, station_id, station)
-                return station
-        else:
-            return StationRepository.station_id_cache.get(station_id)
+        """Get Station based on station id.
+
+        Note:
+            A station found in cache only contains id, name, station_type_id and source_id.
+        """
+        entry = StationRepository.station_id_cache.get(station_id)
+        if entry is not None:
+            return self._get_object_from_cache_entry(entry)
+
+        station = self.get_object_by_id(station_id)
+        if station.is_existing_object():
+            StationRepository.station_id_cache.set(station.id, self._get_cache_entry(station))
+            return station
 
         raise TrackDirectMissingStationError('No station with specified id found')
 
     def get_cached_object_by_name(self, station_name, source_id):
-        """Get Station based on station name."""
+        """Get Station based on station name.
+
+        Note:
+            A station found in cache only contains id, name, station_type_id and source_id.
+        """
         if source_id == 3:
             source_id = 1
 
-        key = hash(f"{station_name};{source_id}" if source_id is not None else station_name)
-        if key not in StationRepository.station_name_cache:
-            station = self.get_object_by_name(station_name, source_id, None, False)
-            if station.is_existing_object():
-                self._update_cache(StationRepository.station_name_cache, key, station)
-                return station
-        else:
-            return StationRepository.station_name_cache.get(key)
+        key = (station_name, source_id)
+        station_id = StationRepository.station_name_cache.get(key)
+        if station_id is not None:
+            try:
+                return self.get_cached_object_by_id(station_id)
+            except TrackDirectMissingStationError:
+                StationRepository.station_name_cache.delete(key)
+
+        station = self.get_object_by_name(station_name, source_id, None, False)
+        if station.is_existing_object():
+            StationRepository.station_id_cache.set(station.id, self._get_cache_entry(station))
+            StationRepository.station_name_cache.set(key, station.id)
+            return station
 
         raise TrackDirectMissingStationError('No station with specified station name found')
 
+    def get_uncached_names(self, station_names, source_id):
+        """Return the station names that is not found in the station name cache."""
+        if source_id == 3:
+            source_id = 1
+        return [name for name in station_names if not StationRepository.station_name_cache.contains((name, source_id))]
+
+    def cache_object_list_by_names(self, station_names, source_id):
+        """Look up the specified station names using one query and add the found stations to the station caches.
+
+        Note:
+            Like get_object_by_name the latest station with each name is used. Stations that does not belong to the
+            specified source yet is not cached, get_object_by_name will update them when they are used.
+
+        Args:
+            station_names (list): Station names
+            source_id (int): Source id of the stations
+
+        Returns:
+            list of the station names that was not found
+        """
+        if source_id == 3:
+            source_id = 1
+        if not station_names:
+            return []
+
+        with self.db.cursor() as cursor:
+            cursor.execute("""SELECT DISTINCT ON (name) * FROM station
+                              WHERE name = ANY(%s) AND (source_id IS NULL OR source_id = %s)
+                              ORDER BY name, id DESC""", (list(station_names), source_id))
+            stations = [self.get_object_from_record(record) for record in cursor]
+
+        found_names = set()
+        for station in stations:
+            found_names.add(station.name)
+            if station.source_id == source_id:
+                self._add_to_cache(station, source_id)
+        return [name for name in station_names if name not in found_names]
+
+    def create_object_list(self, station_type_id_by_name, source_id):
+        """Create the specified stations using one query and add them to the station caches.
+
+        Args:
+            station_type_id_by_name (dict): Station type id for each station name to create
+            source_id (int): Source id of the stations
+        """
+        if source_id == 3:
+            source_id = 1
+        if not station_type_id_by_name:
+            return
+
+        names = list(station_type_id_by_name.keys())
+        with self.db.cursor() as cursor:
+            cursor.execute("""INSERT INTO station(name, station_type_id, source_id)
+                              SELECT name, station_type_id, %s FROM unnest(%s::text[], %s::smallint[]) AS new(name, station_type_id)
+                              RETURNING id, name, station_type_id, source_id""",
+                           (source_id, [name.strip() for name in names], [station_type_id_by_name[name] for name in names]))
+            records = cursor.fetchall()
+
+        for record in records:
+            station = self.create()
+            station.id = int(record["id"])
+            station.name = record["name"]
+            station.station_type_id = int(record["station_type_id"])
+            station.source_id = int(record["source_id"])
+            self._add_to_cache(station, source_id)
+
+    def preload_cache(self, source_id, min_timestamp):
+        """Add the most recently heard stations to the station caches.
+
+        Args:
+            source_id (int): Only load stations from this source
+            min_timestamp (int): Only load stations heard after this time
+        """
+        if source_id == 3:
+            source_id = 1
+
+        with self.db.cursor() as cursor:
+            cursor.execute("""SELECT id, name, station_type_id, source_id FROM station
+                              WHERE source_id = %s AND latest_packet_timestamp > %s
+                              ORDER BY latest_packet_timestamp DESC LIMIT %s""",
+                           (source_id, min_timestamp, StationRepository.station_id_cache.max_size))
+            records = cursor.fetchall()
+
+        # Add least recently heard first, they will be the first to be removed from cache
+        for record in reversed(records):
+            station_id = int(record["id"])
+            StationRepository.station_id_cache.set(station_id, (station_id, record["name"], int(record["station_type_id"]), source_id))
+            StationRepository.station_name_cache.set((record["name"], source_id), station_id)
+        self.logger.info('Station cache preloaded with %s stations', len(records))
+
+    @staticmethod
+    def set_cache_size(max_size):
+        """Set max number of stations in the station caches.
+
+        Args:
+            max_size (int): Max number of stations
+        """
+        StationRepository.station_id_cache.resize(max_size)
+        StationRepository.station_name_cache.resize(max_size)
+
+    @staticmethod
+    def get_cache_stats():
+        """Return statistics for the station caches.
+
+        Returns:
+            dict with the statistics of the id cache and name cache
+        """
+        return {'id': StationRepository.station_id_cache.get_stats(),
+                'name': StationRepository.station_name_cache.get_stats()}
+
+    @staticmethod
+    def invalidate_cached_object(station):
+        """Remove station from cache (called when a station has been updated).
+
+        Args:
+            station (Station): The updated station
+        """
+        StationRepository.station_id_cache.delete(station.id)
+
     def get_object_from_record(self, record):
         """Return a Station object based on the specified database record dict."""
         db_object = self.create()
@@ -213,9 +349,20 @@ class StationRepository(Repository):
         db_object.latest_packet_timestamp = record["latest_packet_timestamp"]
         return db_object
 
-    def _update_cache(self, cache, key, station):
-        """Update the cache with a new station object."""
-        max_number_of_stations = 100
-        if len(cache) > max_number_of_stations:
-            cache.clear()
-        cache[key] = station
\ No newline at end of file
+    def _add_to_cache(self, station, source_id):
+        """Add station to the station caches."""
+        StationRepository.station_id_cache.set(station.id, self._get_cache_entry(station))
+        StationRepository.station_name_cache.set((station.name, source_id), station.id)
+
+    def _get_cache_entry(self, station):
+        """Return the compact cache entry for a station."""
+        return (station.id, station.name, station.station_type_id, station.source_id)
+
+    def _get_object_from_cache_entry(self, entry):
+        """Create a Station object from a compact cache entry."""
+        db_object = self.create()
+        db_object.id, db_object.name, db_object.station_type_id, db_object.source_id = entry
+        return db_object
+
+
+Station.update_listeners.append(StationRepository.invalidate_cached_object)
@@ -0,0 +1,213 @@
+import threading
+import time
+
+from server.trackdirect.common.Singleton import Singleton
+
+
+class MapSectorHistoryCache(Singleton):
+    """The MapSectorHistoryCache keeps recently fetched map sector history in memory, it is shared by all websocket connections in the current process.
+
+    Note:
+        An entry contains the station id's and packets found in one map sector for one requested time interval
+        (number of minutes, time travel timestamp and if only the latest packets are requested). The packets are
+        shared between connections and must be treated as immutable, each connection still filters them using its
+        own state before the responses are created.
+
+        An entry is only used for a short while and not at all if the AprsISHub has received a packet in the map
+        sector (or from one of its stations) shortly before or after the entry was fetched, since the collector may
+        not have saved that packet yet. Entries that does not cover time travel are only used while the AprsISHub
+        is reading all APRS-IS sources, a packet that the hub skips without parsing invalidates all entries.
+    """
+
+    # Seconds that an entry may be used
+    ttl = 15
+
+    # Seconds that the collector may need to save a received packet
+    invalidation_margin = 5
+
+    # Max number of entries, the oldest entries are removed when exceeded
+    max_entries = 5000
+
+    def __init__(self):
+        """The __init__ method (the cache is a singleton so it will only be initialized once)."""
+        if hasattr(self, 'entries'):
+            return
+
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.map_sector_invalidation_timestamps = {}
+        self.station_invalidation_timestamps = {}
+        self.invalidation_timestamp = 0
+        self.is_feed_active = False
+        self.latest_purge_timestamp = time.time()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, map_sector, minutes, time_travel_timestamp, only_latest_packet_requested):
+        """Returns the cached history for the specified map sector and time interval
+
+        Args:
+            map_sector (int): The map sector
+            minutes (int): Number of requested minutes
+            time_travel_timestamp (int): Time travel timestamp (None if not time travelling)
+            only_latest_packet_requested (boolean): True if only the latest packet of each station is requested
+
+        Returns:
+            dict (or None if no valid entry exists)
+        """
+        key = self._get_key(map_sector, minutes, time_travel_timestamp, only_latest_packet_requested)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and not self._is_valid(entry, time.time()):
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, map_sector, minutes, time_travel_timestamp, only_latest_packet_requested,
+            start_timestamp, fetch_timestamp, station_ids, packets_by_station_id):
+        """Add history for the specified map sector and time interval
+
+        Args:
+            map_sector (int): The map sector
+            minutes (int): Number of requested minutes
+            time_travel_timestamp (int): Time travel timestamp (None if not time travelling)
+            only_latest_packet_requested (boolean): True if only the latest packet of each station is requested
+            start_timestamp (int): Packets older than this is not included
+            fetch_timestamp (float): Time when the database queries was started
+            station_ids (list): The station id's found in the map sector
+            packets_by_station_id (dict): A list of packets for each station id
+
+        Returns:
+            dict (the new entry)
+        """
+        entry = {
+            'map_sector': map_sector,
+            'time_travel_timestamp': time_travel_timestamp,
+            'start_timestamp': start_timestamp,
+            'fetch_timestamp': fetch_timestamp,
+            'station_ids': station_ids,
+            'packets_by_station_id': packets_by_station_id
+        }
+        key = self._get_key(map_sector, minutes, time_travel_timestamp, only_latest_packet_requested)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            self._purge(time.time())
+        return entry
+
+    def invalidate_map_sector(self, map_sector):
+        """Stop using entries for the specified map sector (a new packet has been received in it)
+
+        Args:
+            map_sector (int): The map sector
+        """
+        now = time.time()
+        with self.lock:
+            self.map_sector_invalidation_timestamps[map_sector] = now
+            self._purge(now)
+
+    def invalidate_station(self, station_id):
+        """Stop using entries that contains the specified station (a new packet has been received from it)
+
+        Args:
+            station_id (int): The station id
+        """
+        now = time.time()
+        with self.lock:
+            self.station_invalidation_timestamps[station_id] = now
+            self._purge(now)
+
+    def invalidate_all(self):
+        """Stop using all entries (a packet has been received that may affect any map sector)"""
+        now = time.time()
+        with self.lock:
+            self.invalidation_timestamp = now
+
+    def set_feed_active(self, is_feed_active):
+        """Set if all received packets are used to invalidate entries (entries are not used otherwise)
+
+        Args:
+            is_feed_active (boolean): True if the AprsISHub is reading all APRS-IS sources
+        """
+        now = time.time()
+        with self.lock:
+            self.is_feed_active = is_feed_active
+            # Packets received before this may not have been used to invalidate entries
+            self.invalidation_timestamp = now
+
+    def get_stats(self):
+        """Returns number of entries, hits and misses
+
+        Returns:
+            dict
+        """
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _get_key(self, map_sector, minutes, time_travel_timestamp, only_latest_packet_requested):
+        """Returns the key of the specified map sector and time interval
+
+        Returns:
+            tuple
+        """
+        return (map_sector, int(minutes), time_travel_timestamp, bool(only_latest_packet_requested))
+
+    def _is_valid(self, entry, now):
+        """Returns True if the specified entry still can be used
+
+        Args:
+            entry (dict): Cache entry
+            now (float): Current time
+
+        Returns:
+            boolean
+        """
+        if entry['fetch_timestamp'] < now - MapSectorHistoryCache.ttl:
+            return False
+
+        if entry['time_travel_timestamp'] is not None:
+            # New packets will not change history
+            return True
+
+        if not self.is_feed_active:
+            return False
+
+        min_valid_timestamp = entry['fetch_timestamp'] - MapSectorHistoryCache.invalidation_margin
+        if self.invalidation_timestamp > min_valid_timestamp:
+            return False
+        if self.map_sector_invalidation_timestamps.get(entry['map_sector'], 0) > min_valid_timestamp:
+            return False
+        for station_id in entry['station_ids']:
+            if self.station_invalidation_timestamps.get(station_id, 0) > min_valid_timestamp:
+                return False
+        return True
+
+    def _purge(self, now):
+        """Remove expired entries and invalidation timestamps that no longer affects any entry (lock must be held)
+
+        Args:
+            now (float): Current time
+        """
+        if len(self.entries) <= MapSectorHistoryCache.max_entries and \
+                self.latest_purge_timestamp > now - MapSectorHistoryCache.ttl:
+            return
+        self.latest_purge_timestamp = now
+
+        min_fetch_timestamp = now - MapSectorHistoryCache.ttl
+        self.entries = {key: entry for key, entry in self.entries.items()
+                        if entry['fetch_timestamp'] >= min_fetch_timestamp}
+        while len(self.entries) > MapSectorHistoryCache.max_entries:
+            del self.entries[next(iter(self.entries))]
+
+        min_invalidation_timestamp = min_fetch_timestamp - MapSectorHistoryCache.invalidation_margin
+        self.map_sector_invalidation_timestamps = {
+            key: timestamp for key, timestamp in self.map_sector_invalidation_timestamps.items()
+            if timestamp >= min_invalidation_timestamp}
+        self.station_invalidation_timestamps = {
+            key: timestamp for key, timestamp in self.station_invalidation_timestamps.items()
+            if timestamp >= min_invalidation_timestamp}
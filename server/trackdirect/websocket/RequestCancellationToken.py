@@ -0,0 +1,36 @@
+from server.trackdirect.exceptions.TrackDirectRequestCancelledError import TrackDirectRequestCancelledError
+
+
+class RequestCancellationToken:
+    """A RequestCancellationToken is created for every websocket request and cancelled when the request is superseded.
+
+    Note:
+        The token is cancelled in the reactor thread and checked in the thread that processes the request, between
+        the database queries. A cancelled request stops as soon as it reaches the next check.
+    """
+
+    def __init__(self, request_id):
+        """Initialize the RequestCancellationToken.
+
+        Args:
+            request_id (int): Id of the request
+        """
+        self.request_id = request_id
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the request."""
+        self.cancelled = True
+
+    def is_cancelled(self):
+        """Returns True if the request has been cancelled.
+
+        Returns:
+            bool
+        """
+        return self.cancelled
+
+    def raise_if_cancelled(self):
+        """Raise TrackDirectRequestCancelledError if the request has been cancelled."""
+        if self.cancelled:
+            raise TrackDirectRequestCancelledError(f"Request {self.request_id} has been cancelled", self.request_id)
@@ -1,5 +1,4 @@
 import time
-from math import ceil
 
 from server.trackdirect.TrackDirectConfig import TrackDirectConfig
 from server.trackdirect.parser.policies.MapSectorPolicy import MapSectorPolicy
@@ -88,6 +87,11 @@ class WebsocketConnectionState:
         """Returns True if we have added any stations with complete history to this map sector."""
         return map_sector in self.max_map_sector_packet_timestamp_dict
 
+    def has_map_sector_timestamp(self, map_sector):
+        """Returns True if the map sector timestamp is based on sent packets (and not only on the requested time interval)."""
+        return (map_sector in self.max_map_sector_packet_timestamp_dict or
+                (self.only_latest_packet_requested and map_sector in self.max_map_sector_overwrite_packet_timestamp_dict))
+
     def get_map_sector_timestamp(self, map_sector):
         """Returns the latest handled timestamp in specified map sector."""
         if map_sector in self.max_map_sector_packet_timestamp_dict:
@@ -115,31 +119,7 @@ class WebsocketConnectionState:
 
     def get_map_sectors_by_interval(self, min_lat, max_lat, min_lng, max_lng):
         """Get the map sectors for specified interval."""
-        result = []
-        map_sector_policy = MapSectorPolicy()
-        min_area_code = map_sector_policy.get_map_sector(min_lat, min_lng)
-        max_area_code = map_sector_policy.get_map_sector(max_lat, max_lng)
-        if min_area_code is not None and max_area_code is not None:
-            lng_diff = int(ceil(max_lng)) - int(ceil(min_lng))
-            area_code = min_area_code
-            while area_code <= max_area_code:
-                if area_code % 10 == 5:
-                    result.append(area_code)
-                else:
-                    result.append(area_code)
-                    result.append(area_code + 5)
-
-                for i in range(1, lng_diff + 1):
-                    if area_code % 10 == 5:
-                        result.append(area_code + (10 * i) - 5)
-                        result.append(area_code + (10 * i))
-                    else:
-                        result.append(area_code + (10 * i))
-                        result.append(area_code + (10 * i) + 5)
-
-                area_code += 20000
-
-        return result
+        return MapSectorPolicy().get_map_sectors_by_interval(min_lat, max_lat, min_lng, max_lng)
 
     def set_latest_minutes(self, minutes, reference_time):
         """Set the latest requested number of minutes, returns True if something has changed."""
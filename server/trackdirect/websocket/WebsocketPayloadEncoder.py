@@ -0,0 +1,81 @@
+import json
+import logging
+
+
+class WebsocketPayloadEncoder:
+    """The WebsocketPayloadEncoder class encodes payload dicts before they are sent to the client
+
+    Note:
+        The client selects encoding by adding "payload_encoding" to its requests. Supported encodings:
+        - "json": The payload dict is sent as is (default)
+        - "columnar": Packet lists in history responses (payload_response_type 2) are sent as one list of keys and
+          one list of values per packet, instead of repeating every key name for every packet.
+
+        A columnar payload looks like this:
+        {"payload_response_type": 2, "payload_encoding": "columnar", "columns": [[key1, key2, ...], ...], "rows": [[0, value1, value2, ...], ...]}
+        The first value of each row is the index of the key list to use (packets does not always contain the same keys).
+    """
+
+    encodings = ['json', 'columnar']
+
+    def __init__(self):
+        """The __init__ method."""
+        self.logger = logging.getLogger('trackdirect')
+        self.encoding = 'json'
+
+    def set_encoding(self, encoding):
+        """Set the encoding requested by client
+
+        Args:
+            encoding (str): Requested encoding (unsupported encodings are ignored)
+        """
+        if encoding in WebsocketPayloadEncoder.encodings:
+            self.encoding = encoding
+        else:
+            self.logger.warning('Requested payload encoding is not supported: %s', encoding)
+
+    def encode(self, payload):
+        """Returns the encoded payload
+
+        Args:
+            payload (dict): Payload to send
+
+        Returns:
+            bytes
+        """
+        if self.encoding == 'columnar':
+            if payload.get('payload_response_type') == 2 and payload.get('data'):
+                payload = self._get_columnar_payload(payload)
+            return json.dumps(payload, ensure_ascii=True, separators=(',', ':')).encode('utf8')
+
+        return json.dumps(payload, ensure_ascii=True).encode('utf8')
+
+    def _get_columnar_payload(self, payload):
+        """Returns the columnar version of a payload with a list of packet dicts
+
+        Args:
+            payload (dict): Payload with a list of packet dicts
+
+        Returns:
+            dict
+        """
+        columns = []
+        column_index_by_keys = {}
+        rows = []
+        for packet_dict in payload['data']:
+            keys = tuple(packet_dict.keys())
+            column_index = column_index_by_keys.get(keys)
+            if column_index is None:
+                column_index = len(columns)
+                column_index_by_keys[keys] = column_index
+                columns.append(keys)
+
+            row = [column_index]
+            row.extend(packet_dict.values())
+            rows.append(row)
+
+        columnar_payload = {key: value for key, value in payload.items() if key != 'data'}
+        columnar_payload['payload_encoding'] = 'columnar'
+        columnar_payload['columns'] = columns
+        columnar_payload['rows'] = rows
+        return columnar_payload
@@ -3,6 +3,7 @@ import psycopg2
 from server.trackdirect.websocket.responses.FilterResponseCreator import FilterResponseCreator
 from server.trackdirect.websocket.responses.HistoryResponseCreator import HistoryResponseCreator
 from server.trackdirect.websocket.responses.FilterHistoryResponseCreator import FilterHistoryResponseCreator
+from server.trackdirect.exceptions.TrackDirectRequestCancelledError import TrackDirectRequestCancelledError
 
 class WebsocketResponseCreator:
     """The WebsocketResponseCreator ensures that a response is created for every valid received request."""
@@ -21,13 +22,14 @@ class WebsocketResponseCreator:
         self.history_response_creator = HistoryResponseCreator(state, db)
         self.filter_history_response_creator = FilterHistoryResponseCreator(state, db)
 
-    def get_responses(self, request, request_id):
+    def get_responses(self, request, request_id, cancellation_token=None):
         """
         Process a received request.
 
         Args:
             request (dict): The request to process.
             request_id (int): Request id of processed request.
+            cancellation_token (RequestCancellationToken): Cancelled when the request is superseded (optional).
 
         Returns:
             generator
@@ -44,11 +46,11 @@ class WebsocketResponseCreator:
                     if response is not None:
                         yield response
                 else:
-                    yield from self.history_response_creator.get_responses(request, request_id)
+                    yield from self.history_response_creator.get_responses(request, request_id, cancellation_token)
 
             elif payload_type == 7:
                 # Update request for single station
-                yield from self.history_response_creator.get_responses(request, request_id)
+                yield from self.history_response_creator.get_responses(request, request_id, cancellation_token)
 
             elif payload_type in {4, 6, 8}:
                 yield self._get_loading_response()
@@ -57,6 +59,8 @@ class WebsocketResponseCreator:
             else:
                 self.logger.error('Unsupported request type: %s', request)
 
+        except TrackDirectRequestCancelledError:
+            self.logger.debug('Request %s cancelled', request_id)
         except psycopg2.InterfaceError as e:
             # Connection to database is lost, better just exit
             raise e
@@ -0,0 +1,66 @@
+import logging
+import time
+from twisted.internet import task
+
+from server.trackdirect.common.Singleton import Singleton
+
+
+class WebsocketTicker(Singleton):
+    """The WebsocketTicker calls all subscribed websocket connections in the current process once every interval.
+
+    Note:
+        One timer is shared by all connections (instead of one timer per connection), it is only running while
+        there is at least one subscriber.
+    """
+
+    # Seconds between each tick
+    interval = 1.0
+
+    def __init__(self):
+        """The __init__ method (the ticker is a singleton so it will only be initialized once)."""
+        if hasattr(self, 'subscribers'):
+            return
+
+        self.logger = logging.getLogger('trackdirect')
+        self.subscribers = {}
+        self.ticker_call = None
+
+    def subscribe(self, subscriber):
+        """Call on_tick(timestamp) of the specified subscriber on every tick.
+
+        Args:
+            subscriber (object): Object with a on_tick(timestamp) method
+        """
+        self.subscribers[subscriber] = True
+        if self.ticker_call is None:
+            self.ticker_call = task.LoopingCall(self._tick)
+            self.ticker_call.start(WebsocketTicker.interval, False)
+
+    def unsubscribe(self, subscriber):
+        """Stop calling the specified subscriber.
+
+        Args:
+            subscriber (object): Object previously used in a subscribe call
+        """
+        self.subscribers.pop(subscriber, None)
+        if not self.subscribers and self.ticker_call is not None:
+            if self.ticker_call.running:
+                self.ticker_call.stop()
+            self.ticker_call = None
+
+    def get_number_of_subscribers(self):
+        """Returns the number of current subscribers.
+
+        Returns:
+            int
+        """
+        return len(self.subscribers)
+
+    def _tick(self):
+        """Call all subscribers."""
+        timestamp = int(time.time())
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.on_tick(timestamp)
+            except Exception as e:
+                self.logger.error(e, exc_info=1)
@@ -0,0 +1,446 @@
+import logging
+import datetime
+import hashlib
+import time
+import aprslib
+import psycopg2
+from twisted.internet import threads, reactor
+
+from server.trackdirect.TrackDirectConfig import TrackDirectConfig
+from server.trackdirect.common.Singleton import Singleton
+from server.trackdirect.database.DatabaseConnection import DatabaseConnection
+from server.trackdirect.parser.AprsISConnection import AprsISConnection
+from server.trackdirect.parser.AprsPacketParser import AprsPacketParser
+from server.trackdirect.parser.policies.MapSectorPolicy import MapSectorPolicy
+from server.trackdirect.parser.policies.StationNameFormatPolicy import StationNameFormatPolicy
+from server.trackdirect.repositories.OgnHiddenStationRepository import OgnHiddenStationRepository
+from server.trackdirect.repositories.StationRepository import StationRepository
+from server.trackdirect.websocket.MapSectorHistoryCache import MapSectorHistoryCache
+from server.trackdirect.websocket.aprsis.AprsISReadDescriptor import AprsISReadDescriptor
+from server.trackdirect.exceptions.TrackDirectParseError import TrackDirectParseError
+from server.trackdirect.exceptions.TrackDirectMissingStationError import TrackDirectMissingStationError
+
+
+class AprsISHub(Singleton):
+    """The AprsISHub shares the APRS-IS feed between all websocket connections in the current process.
+
+    Note:
+        The hub keeps one connection per configured APRS-IS source using a filter that covers the whole world.
+        Every received packet is parsed once and the resulting Packet is pushed to all subscribers that has
+        the packet station or the packet map sector in their subscription. Subscribers must treat the Packet
+        as immutable since the same instance is shared between all of them. Received packets also invalidates
+        the MapSectorHistoryCache of their map sector and station (also when the packet is not parsed).
+    """
+
+    # Filter used by the shared connections, aprsc will send everything within this area
+    world_filter = 'a/90/-180/-90/180'
+
+    # Subscribers with more visible map sectors than this are matched against their map bounds instead
+    max_map_sectors_per_subscriber = 20000
+
+    # Max number of packets waiting to be parsed, when exceeded incoming packets are dropped
+    max_queued_packets = 500
+
+    # Seconds to wait before trying to reconnect to a lost APRS-IS server
+    reconnect_delay = 10
+
+    def __init__(self):
+        """The __init__ method (the hub is a singleton so it will only be initialized once)."""
+        if hasattr(self, 'subscriptions'):
+            return
+
+        self.logger = logging.getLogger('trackdirect')
+        self.config = TrackDirectConfig()
+        self.db = None
+        self.history_cache = MapSectorHistoryCache()
+
+        self.sources = []
+        self.is_started = False
+        self.number_of_queued_packets = 0
+
+        self.subscriptions = {}
+        self.map_sector_subscribers = {}
+        self.station_subscribers = {}
+        self.area_subscribers = {}
+
+    def subscribe(self, subscriber, state):
+        """Subscribe to real time packets based on the specified connection state.
+
+        Note:
+            An existing subscription for the subscriber is replaced.
+
+        Args:
+            subscriber (object): Object with a on_real_time_packet(packet) method
+            state (WebsocketConnectionState): State that decides what packets the subscriber is interested in
+        """
+        self._start()
+        self.unsubscribe(subscriber)
+
+        subscription = {'map_sectors': [], 'station_ids': [], 'area': None}
+        if state.filter_station_id_dict:
+            subscription['station_ids'] = list(state.filter_station_id_dict.keys())
+        else:
+            map_sectors = state.get_visible_map_sectors()
+            if len(map_sectors) > AprsISHub.max_map_sectors_per_subscriber:
+                subscription['area'] = (state.latest_ne_lat + 0.1, state.latest_ne_lng + 0.1,
+                                        state.latest_sw_lat - 0.1, state.latest_sw_lng - 0.1)
+            else:
+                subscription['map_sectors'] = map_sectors
+
+        for station_id in subscription['station_ids']:
+            self.station_subscribers.setdefault(station_id, set()).add(subscriber)
+        for map_sector in subscription['map_sectors']:
+            self.map_sector_subscribers.setdefault(map_sector, set()).add(subscriber)
+        if subscription['area'] is not None:
+            self.area_subscribers[subscriber] = subscription['area']
+
+        self.subscriptions[subscriber] = subscription
+
+    def unsubscribe(self, subscriber):
+        """Remove any subscription for the specified subscriber.
+
+        Args:
+            subscriber (object): Object previously used in a subscribe call
+        """
+        subscription = self.subscriptions.pop(subscriber, None)
+        if subscription is None:
+            return
+
+        self._remove_from_index(self.station_subscribers, subscription['station_ids'], subscriber)
+        self._remove_from_index(self.map_sector_subscribers, subscription['map_sectors'], subscriber)
+        self.area_subscribers.pop(subscriber, None)
+
+    def get_number_of_subscribers(self):
+        """Returns the number of current subscribers.
+
+        Returns:
+            int
+        """
+        return len(self.subscriptions)
+
+    def _remove_from_index(self, index, keys, subscriber):
+        """Remove subscriber from the specified subscription index.
+
+        Args:
+            index (dict): Subscription index
+            keys (list): Keys that the subscriber was added to
+            subscriber (object): Subscriber to remove
+        """
+        for key in keys:
+            subscribers = index.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del index[key]
+
+    def _start(self):
+        """Start reading from the APRS-IS servers (if not already started)."""
+        if self.is_started:
+            return
+        self.is_started = True
+
+        if self.config.websocket_aprs_host1 is not None:
+            self.sources.append(self._create_source(self.config.websocket_aprs_host1,
+                                                    self.config.websocket_aprs_port1,
+                                                    self.config.websocket_aprs_source_id1))
+        if self.config.websocket_aprs_host2 is not None:
+            self.sources.append(self._create_source(self.config.websocket_aprs_host2,
+                                                    self.config.websocket_aprs_port2,
+                                                    self.config.websocket_aprs_source_id2))
+
+        self.db = DatabaseConnection().get_connection(True)
+        for source in self.sources:
+            self._connect(source)
+
+    def _create_source(self, host, port, source_id):
+        """Returns the settings (and connection state) of an APRS-IS source.
+
+        Args:
+            host (str): APRS-IS server host
+            port (int): APRS-IS server port
+            source_id (int): Source id of the packets received from the server
+
+        Returns:
+            dict
+        """
+        return {'host': host,
+                'port': port,
+                'source_id': source_id,
+                'connection': None,
+                'reader': None}
+
+    def _connect(self, source):
+        """Connect to the APRS-IS server of the specified source (in a thread) and start reading when it has data.
+
+        Args:
+            source (dict): Source settings
+        """
+        deferred = threads.deferToThread(self._create_connection, source)
+        deferred.addCallback(self._on_connected, source)
+        deferred.addErrback(self._on_connect_failed, source)
+
+    def _create_connection(self, source):
+        """Create a connection to the APRS-IS server of the specified source (executed in a thread).
+
+        Args:
+            source (dict): Source settings
+
+        Returns:
+            AprsISConnection
+        """
+        # Avoid using a verified user since server will not accept two verified users with same name
+        connection = AprsISConnection("NOCALL", "-1", source['host'], source['port'])
+        if self.config.websocket_frequency_limit != 0:
+            connection.set_frequency_limit(self.config.websocket_frequency_limit)
+        connection.set_source_id(source['source_id'])
+        connection.set_filter(AprsISHub.world_filter)
+        connection.connect()
+        return connection
+
+    def _on_connected(self, connection, source):
+        """Start reading from a new connection (executed in the reactor thread).
+
+        Args:
+            connection (AprsISConnection): The connected connection
+            source (dict): Source settings
+        """
+        source['connection'] = connection
+        source['reader'] = AprsISReadDescriptor(self, source)
+        reactor.addReader(source['reader'])
+        self._update_history_cache_feed()
+
+    def _on_connect_failed(self, error, source):
+        """Executed when a connection could not be created, tries again later.
+
+        Args:
+            error (Failure): The reason
+            source (dict): Source settings
+        """
+        self.logger.error('Failed to connect to %s: %s', source['host'], error.getErrorMessage())
+        reactor.callLater(AprsISHub.reconnect_delay, self._connect, source)
+
+    def _disconnect(self, source):
+        """Stop reading from the specified source and reconnect later.
+
+        Args:
+            source (dict): Source settings
+        """
+        if source['reader'] is not None:
+            reactor.removeReader(source['reader'])
+            source['reader'] = None
+        self._update_history_cache_feed()
+        if source['connection'] is not None:
+            source['connection'].close()
+            source['connection'] = None
+        reactor.callLater(AprsISHub.reconnect_delay, self._connect, source)
+
+    def _update_history_cache_feed(self):
+        """Let the MapSectorHistoryCache know if received packets are used to invalidate its entries."""
+        self.history_cache.set_feed_active(
+            bool(self.sources) and all(source['reader'] is not None for source in self.sources))
+
+    def on_readable(self, source):
+        """Read all waiting lines from the specified source (executed by the reactor when the socket is readable).
+
+        Args:
+            source (dict): Source settings
+        """
+        def on_line(line, source_id=source['source_id']):
+            self._on_line(line, source_id)
+
+        try:
+            source['connection'].filtered_consumer(on_line, False, True)
+        except (IOError, aprslib.ConnectionDrop, aprslib.ConnectionError) as e:
+            self.logger.warning('Lost connection to %s: %s', source['host'], e)
+            self._disconnect(source)
+        except Exception as e:
+            self.logger.error(e, exc_info=1)
+
+    def on_connection_lost(self, source, reason):
+        """Executed when the reactor has removed the reader of the specified source because of an error.
+
+        Args:
+            source (dict): Source settings
+            reason (Failure): The reason
+        """
+        self.logger.warning('Lost connection to %s: %s', source['host'], reason)
+        source['reader'] = None
+        self._disconnect(source)
+
+    def _on_line(self, line, source_id):
+        """Handle a raw line received from APRS-IS.
+
+        Args:
+            line (str): The raw packet
+            source_id (int): Source id of the connection that received the line
+        """
+        if not self.subscriptions or self.number_of_queued_packets > AprsISHub.max_queued_packets:
+            # The packet is not parsed, so any cached map sector history may be missing it
+            self.history_cache.invalidate_all()
+            return
+
+        self.number_of_queued_packets += 1
+        deferred = threads.deferToThread(self._parse, line, source_id)
+        deferred.addCallback(self._dispatch)
+        deferred.addErrback(self._on_error)
+        deferred.addBoth(self._on_parse_done)
+
+    def _parse(self, line, source_id):
+        """Parse packet raw (executed in a thread).
+
+        Args:
+            line (str): The raw packet
+            source_id (int): Source id of the connection that received the line
+
+        Returns:
+            Packet
+        """
+        try:
+            basic_packet_dict = aprslib.parse(line)
+            map_sector = MapSectorPolicy().get_map_sector(basic_packet_dict.get('latitude'),
+                                                          basic_packet_dict.get('longitude'))
+            if map_sector is not None:
+                # Cached history of the map sector may be missing this packet
+                self.history_cache.invalidate_map_sector(map_sector)
+
+            if not self._may_have_subscribers(basic_packet_dict, map_sector):
+                # The station may have moved here from a map sector that has cached history
+                self._invalidate_station(basic_packet_dict, source_id)
+                return None
+
+            parser = AprsPacketParser(self.db, self.config.save_ogn_stations_with_missing_identity)
+            parser.set_database_write_access(False)
+            parser.set_source_id(source_id)
+            packet = parser.get_packet(basic_packet_dict)
+
+            if packet and packet.map_id == 4:
+                # Station is probably not created by the collector yet
+                time.sleep(1)
+                packet = parser.get_packet(basic_packet_dict)
+
+            return packet if packet and packet.map_id != 15 else None
+        except (aprslib.ParseError, aprslib.UnknownFormat, TrackDirectParseError, UnicodeDecodeError):
+            return None
+        except psycopg2.InterfaceError as e:
+            self.logger.error(e, exc_info=True)
+            self.db = DatabaseConnection().get_connection(True, True)
+        return None
+
+    def _invalidate_station(self, basic_packet_dict, source_id):
+        """Invalidate the MapSectorHistoryCache entries of the station of a packet that is not parsed (executed in a thread).
+
+        Note:
+            The station id is resolved from the station name using the station name cache (like the parser does),
+            a station that does not exist yet can not be included in any cache entry.
+
+        Args:
+            basic_packet_dict (dict): The aprslib parse result
+            source_id (int): Source id of the connection that received the packet
+        """
+        sender_name = StationNameFormatPolicy.get_correct_format(basic_packet_dict.get('from', ''))
+        station_name = None
+        if basic_packet_dict.get('object_name'):
+            station_name = StationNameFormatPolicy.get_correct_format(basic_packet_dict['object_name'])
+        if not station_name:
+            station_name = sender_name
+        if not station_name:
+            return
+
+        station_repository = StationRepository(self.db)
+        try:
+            station = station_repository.get_cached_object_by_name(station_name, source_id)
+        except TrackDirectMissingStationError:
+            station_name = self._get_hidden_station_name(basic_packet_dict.get('from', ''), source_id)
+            if station_name is None:
+                return
+            try:
+                station = station_repository.get_cached_object_by_name(station_name, source_id)
+            except TrackDirectMissingStationError:
+                return
+        self.history_cache.invalidate_station(station.id)
+
+    def _get_hidden_station_name(self, sender_name, source_id):
+        """Returns the unidentifiable station name that the collector may have used for an OGN sender.
+
+        Args:
+            sender_name (str): The sender name (as received)
+            source_id (int): Source id of the connection that received the packet
+
+        Returns:
+            str (None if the sender has no hidden station)
+        """
+        if source_id != 5 or not self.config.save_ogn_stations_with_missing_identity:
+            return None
+        date = datetime.datetime.utcfromtimestamp(int(time.time())).strftime('%Y%m%d')
+        daily_station_name_hash = hashlib.sha256((sender_name + date).encode()).hexdigest()
+        ogn_hidden_station = OgnHiddenStationRepository(self.db).get_object_by_hashed_name(daily_station_name_hash, False)
+        return ogn_hidden_station.get_station_name()
+
+    def _may_have_subscribers(self, basic_packet_dict, map_sector):
+        """Returns true if anyone may be interested in the specified packet (used to avoid expensive parsing).
+
+        Args:
+            basic_packet_dict (dict): The aprslib parse result
+            map_sector (int): Map sector of the packet position
+
+        Returns:
+            bool
+        """
+        latitude = basic_packet_dict.get('latitude')
+        longitude = basic_packet_dict.get('longitude')
+        if latitude is None or longitude is None:
+            return False
+
+        if self.station_subscribers or self.area_subscribers:
+            return True
+
+        return map_sector in self.map_sector_subscribers
+
+    def _dispatch(self, packet):
+        """Push packet to all interested subscribers.
+
+        Args:
+            packet (Packet): The parsed packet
+        """
+        if packet is None or packet.latitude is None or packet.longitude is None:
+            return
+
+        self.history_cache.invalidate_station(packet.station_id)
+        subscribers = set(self.station_subscribers.get(packet.station_id, ()))
+        if packet.map_sector is not None:
+            subscribers.update(self.map_sector_subscribers.get(packet.map_sector, ()))
+        for subscriber, area in self.area_subscribers.items():
+            if self._is_packet_in_area(packet, area):
+                subscribers.add(subscriber)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.on_real_time_packet(packet)
+            except Exception as e:
+                self.logger.error(e, exc_info=1)
+
+    def _is_packet_in_area(self, packet, area):
+        """Returns true if packet position is within the specified area.
+
+        Args:
+            packet (Packet): The parsed packet
+            area (tuple): Area as (ne_lat, ne_lng, sw_lat, sw_lng)
+
+        Returns:
+            bool
+        """
+        ne_lat, ne_lng, sw_lat, sw_lng = area
+        if not sw_lat <= packet.latitude <= ne_lat:
+            return False
+        if sw_lng <= ne_lng:
+            return sw_lng <= packet.longitude <= ne_lng
+        # Area crosses the date line
+        return packet.longitude >= sw_lng or packet.longitude <= ne_lng
+
+    def _on_parse_done(self, result):
+        """Executed when a parse job is completed (successful or not)."""
+        self.number_of_queued_packets -= 1
+
+    def _on_error(self, error):
+        """Executed when a deferToThread failed."""
+        self.logger.error(error, exc_info=True)
@@ -1,15 +1,10 @@
 import logging
-import time
-import aprslib
-from server.trackdirect.TrackDirectConfig import TrackDirectConfig
-from server.trackdirect.parser.AprsPacketParser import AprsPacketParser
-from server.trackdirect.exceptions.TrackDirectParseError import TrackDirectParseError
 from server.trackdirect.websocket.responses.ResponseDataConverter import ResponseDataConverter
 from server.trackdirect.websocket.responses.HistoryResponseCreator import HistoryResponseCreator
 
 
 class AprsISPayloadCreator:
-    """The AprsISPayloadCreator creates a payload to send to client based on data received from the APRS-IS server."""
+    """The AprsISPayloadCreator creates a payload to send to client based on packets received from the AprsISHub."""
 
     def __init__(self, state, db):
         """Initialize the AprsISPayloadCreator.
@@ -23,58 +18,28 @@ class AprsISPayloadCreator:
         self.db = db
         self.response_data_converter = ResponseDataConverter(state, db)
         self.history_response_creator = HistoryResponseCreator(state, db)
-        self.config = TrackDirectConfig()
-        self.station_hash_timestamps = {}
-        self.save_ogn_stations_with_missing_identity = self.config.save_ogn_stations_with_missing_identity
 
-    def get_payloads(self, line, source_id):
-        """Takes a raw packet and returns a generator with the parsed result.
+    def get_payloads(self, packet):
+        """Takes a packet parsed by the AprsISHub and returns a generator with the payloads to send.
+
+        Note:
+            The packet is shared with other connections and must not be modified.
 
         Args:
-            line (str): The raw packet as a string.
-            source_id (int): The id of the source.
+            packet (Packet): The real time packet.
 
         Returns:
             generator
         """
-        try:
-            packet = self._parse(line, source_id)
-            if not self._is_packet_valid(packet):
-                return
-
-            self._update_station_on_map(packet)
+        if not self._is_packet_valid(packet):
+            return
 
-            if self._is_station_filtered(packet):
-                yield from self._get_previous_packets_payload(packet)
+        self._update_station_on_map(packet)
 
-            yield self._get_real_time_packet_payload(packet)
-        except (aprslib.ParseError, aprslib.UnknownFormat, TrackDirectParseError, UnicodeDecodeError) as exp:
-            self.logger.error(f"Error processing packet: {exp}")
+        if self._is_station_filtered(packet):
+            yield from self._get_previous_packets_payload(packet)
 
-    def _parse(self, line, source_id):
-        """Parse packet raw.
-
-        Args:
-            line (str): The raw packet as a string.
-            source_id (int): The id of the source.
-
-        Returns:
-            Packet
-        """
-        try:
-            basic_packet_dict = aprslib.parse(line)
-            parser = AprsPacketParser(self.db, self.save_ogn_stations_with_missing_identity)
-            parser.set_database_write_access(False)
-            parser.set_source_id(source_id)
-            packet = parser.get_packet(basic_packet_dict)
-
-            if packet and packet.map_id == 4:
-                time.sleep(1)
-                packet = parser.get_packet(basic_packet_dict)
-
-            return packet if packet and packet.map_id != 15 else None
-        except (aprslib.ParseError, aprslib.UnknownFormat, TrackDirectParseError):
-            return None
+        yield self._get_real_time_packet_payload(packet)
 
     def _is_packet_valid(self, packet):
         """Check if the packet is valid to send to client.
@@ -0,0 +1,38 @@
+from zope.interface import implementer
+from twisted.internet.interfaces import IReadDescriptor
+
+
+@implementer(IReadDescriptor)
+class AprsISReadDescriptor:
+    """The AprsISReadDescriptor lets the reactor tell the AprsISHub when an APRS-IS connection has data to read.
+
+    Note:
+        Added to the reactor using reactor.addReader, so no timer is needed to poll the connection.
+    """
+
+    def __init__(self, hub, source):
+        """Initialize the AprsISReadDescriptor.
+
+        Args:
+            hub (AprsISHub): The hub that reads the connection
+            source (dict): Source settings (including the connected AprsISConnection)
+        """
+        self.hub = hub
+        self.source = source
+        self.file_descriptor = source['connection'].sock.fileno()
+
+    def fileno(self):
+        """Returns the file descriptor of the connection socket."""
+        return self.file_descriptor
+
+    def doRead(self):
+        """Executed by the reactor when the connection socket is readable."""
+        self.hub.on_readable(self.source)
+
+    def connectionLost(self, reason):
+        """Executed by the reactor when the reader is removed because of an error."""
+        self.hub.on_connection_lost(self.source, reason)
+
+    def logPrefix(self):
+        """Returns the prefix used by the reactor when logging."""
+        return 'AprsISReadDescriptor'
@@ -1,5 +1,6 @@
 import datetime, time, calendar
 from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+from server.trackdirect.database.MapSectorStationIndex import MapSectorStationIndex
 
 
 class StationIdByMapSectorQuery:
@@ -13,6 +14,51 @@ class StationIdByMapSectorQuery:
         """
         self.db = db
         self.db_object_finder = DatabaseObjectFinder(db)
+        self.map_sector_station_index = MapSectorStationIndex(db)
+
+    def is_map_sector_index_available(self):
+        """Returns true if get_station_id_lists_by_map_sectors can be used.
+
+        Returns:
+            bool
+        """
+        return self.map_sector_station_index.is_available()
+
+    def get_station_id_lists_by_map_sectors(self, map_sectors, start_packet_timestamp, end_packet_timestamp):
+        """Returns the station ids of several map sectors (using one query on the map sector station index).
+
+        Note:
+            The index has a resolution of MapSectorStationIndex.time_bucket_seconds, so a few stations that
+            only has packets just outside the specified time interval may be included.
+
+        Args:
+            map_sectors (list): Map sector integers
+            start_packet_timestamp (int): Min unix timestamp
+            end_packet_timestamp (int): Max unix timestamp
+
+        Returns:
+            dict: List of station ids for each map sector (map sectors without stations are not included)
+        """
+        if end_packet_timestamp is None:
+            end_packet_timestamp = int(time.time())
+
+        result = {}
+        if not map_sectors:
+            return result
+
+        with self.db.cursor() as select_cursor:
+            select_cursor.execute("""
+                SELECT DISTINCT map_sector, station_id
+                FROM map_sector_station
+                WHERE map_sector = ANY(%s)
+                    AND time_bucket >= %s
+                    AND time_bucket <= %s
+            """, (list(map_sectors),
+                  self.map_sector_station_index.get_time_bucket(start_packet_timestamp),
+                  self.map_sector_station_index.get_time_bucket(end_packet_timestamp)))
+            for record in select_cursor:
+                result.setdefault(int(record["map_sector"]), []).append(int(record["station_id"]))
+        return result
 
     def get_station_id_list_by_map_sector(self, map_sector, start_packet_timestamp, end_packet_timestamp):
         """Returns a list of station ids based on the specified map sector and time interval.
@@ -1,8 +1,12 @@
 import logging
+import time
 import psycopg2, psycopg2.extras
 from server.trackdirect.repositories.PacketRepository import PacketRepository
+from server.trackdirect.websocket.MapSectorHistoryCache import MapSectorHistoryCache
 from server.trackdirect.websocket.queries.StationIdByMapSectorQuery import StationIdByMapSectorQuery
 from server.trackdirect.websocket.responses.ResponseDataConverter import ResponseDataConverter
+from server.trackdirect.websocket.responses.ResponseEnrichmentContext import ResponseEnrichmentContext
+from server.trackdirect.exceptions.TrackDirectRequestCancelledError import TrackDirectRequestCancelledError
 
 
 class HistoryResponseCreator:
@@ -20,10 +24,41 @@ class HistoryResponseCreator:
         self.db = db
         self.packet_repository = PacketRepository(db)
         self.response_data_converter = ResponseDataConverter(state, db)
+        self.history_cache = MapSectorHistoryCache()
+        self.cancellation_token = None
+        self.number_of_cached_map_sectors = 0
 
-    def get_responses(self, request, request_id):
+    def get_responses(self, request, request_id, cancellation_token=None):
         """Create all history responses for the current request.
 
+        Note:
+            If the cancellation token is cancelled TrackDirectRequestCancelledError is raised before the next query.
+
+        Args:
+            request (dict): The request to process
+            request_id (int): Request id of processed request
+            cancellation_token (RequestCancellationToken): Cancelled when the request is superseded (optional)
+
+        Returns:
+            generator
+        """
+        self.cancellation_token = cancellation_token
+        self.number_of_cached_map_sectors = 0
+        enrichment_context = ResponseEnrichmentContext(self.db, cancellation_token)
+        self.response_data_converter.set_enrichment_context(enrichment_context)
+        try:
+            yield from self._get_request_responses(request, request_id)
+        finally:
+            self.cancellation_token = None
+            self.response_data_converter.set_enrichment_context(None)
+            stats = enrichment_context.get_stats()
+            self.logger.debug('History request %s: %s map sectors from cache, %s related data lookups using %s queries (%s queries saved)',
+                              request_id, self.number_of_cached_map_sectors,
+                              stats['lookups'], stats['queries'], stats['queries_saved'])
+
+    def _get_request_responses(self, request, request_id):
+        """Create all history responses for the specified request.
+
         Args:
             request (dict): The request to process
             request_id (int): Request id of processed request
@@ -52,6 +87,10 @@ class HistoryResponseCreator:
     def _get_map_sector_history_responses(self, request_id):
         """Creates all needed history responses for the currently visible map sectors.
 
+        Note:
+            Map sectors found in the MapSectorHistoryCache are not queried, map sectors that this connection has not
+            received anything from yet are added to the cache.
+
         Args:
             request_id (int): Request id of processed request
 
@@ -63,111 +102,312 @@ class HistoryResponseCreator:
             self.logger.error("Too many map sectors requested!")
             return
 
+        # Entries fetched after this may be missing packets that has not been saved yet
+        fetch_timestamp = time.time()
+        cached_entries = {}
+        for map_sector in map_sector_array:
+            entry = self._get_cached_entry(map_sector)
+            if entry is not None:
+                cached_entries[map_sector] = entry
+        self.number_of_cached_map_sectors += len(cached_entries)
+
+        try:
+            station_ids_by_map_sector = self._get_station_ids_by_map_sectors(
+                [map_sector for map_sector in map_sector_array if map_sector not in cached_entries])
+        except TrackDirectRequestCancelledError:
+            raise
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            # Fall back to one query per map sector
+            self.logger.error('Error using map sector station index: %s', e, exc_info=True)
+            station_ids_by_map_sector = None
+
         handled_station_ids = set()
         for map_sector in map_sector_array:
             try:
-                if request_id is not None and self.state.latest_requestId > request_id:
+                if self.cancellation_token is not None:
+                    self.cancellation_token.raise_if_cancelled()
+                elif request_id is not None and self.state.latest_requestId > request_id:
                     return
 
-                found_station_ids = self._get_station_ids_by_map_sector(map_sector)
+                if map_sector in cached_entries:
+                    yield from self._get_cached_station_history_responses(
+                        cached_entries[map_sector], handled_station_ids)
+                    continue
+
+                if station_ids_by_map_sector is not None:
+                    found_station_ids = station_ids_by_map_sector.get(map_sector, [])
+                else:
+                    found_station_ids = self._get_station_ids_by_map_sector(map_sector)
+
+                if not self.state.has_map_sector_timestamp(map_sector):
+                    entry = self._add_cached_entry(map_sector, found_station_ids, fetch_timestamp)
+                    yield from self._get_cached_station_history_responses(entry, handled_station_ids)
+                    continue
+
                 station_ids = [station_id for station_id in found_station_ids if station_id not in handled_station_ids]
                 handled_station_ids.update(station_ids)
 
                 if station_ids:
                     yield from self._get_station_history_responses(station_ids, map_sector, False)
+            except TrackDirectRequestCancelledError:
+                raise
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
                 self.logger.error('Error processing map sector %s: %s', map_sector, e, exc_info=True)
 
-    def _get_station_history_responses(self, station_ids, map_sector, include_complete_history=False):
+    def _get_cached_entry(self, map_sector):
+        """Returns the MapSectorHistoryCache entry to use for the specified map sector.
+
+        Args:
+            map_sector (int): The map sector that we want history data for
+
+        Returns:
+            dict (None if no usable entry exists)
+        """
+        if self.state.latest_time_travel_request is not None and self.state.is_map_sector_known(map_sector):
+            # Nothing more to send for this map sector
+            return None
+
+        entry = self.history_cache.get(map_sector, self.state.latest_minutes_request,
+                                       self.state.latest_time_travel_request, self.state.only_latest_packet_requested)
+        if entry is not None and entry['start_timestamp'] <= self.state.get_map_sector_timestamp(map_sector):
+            return entry
+        return None
+
+    def _add_cached_entry(self, map_sector, station_ids, fetch_timestamp):
+        """Fetch the packets of the specified stations and add them to the MapSectorHistoryCache.
+
+        Note:
+            Packets are fetched for all the stations (even if this connection already has some of them on the map)
+            since the entry will be used by other connections.
+
+        Args:
+            map_sector (int): The map sector that we want history data for
+            station_ids (array): All stations found in the map sector
+            fetch_timestamp (float): Time when the database queries for the map sector was started
+
+        Returns:
+            dict (the new entry)
+        """
+        min_timestamp = self.state.get_map_sector_timestamp(map_sector)
+        only_latest_packet_fetched = bool(self.state.only_latest_packet_requested)
+        packets_by_station_id = {}
+        if station_ids:
+            self._check_cancelled()
+            for packet in self._get_packet_list(station_ids, min_timestamp, only_latest_packet_fetched):
+                packets_by_station_id.setdefault(packet.station_id, []).append(packet)
+
+        if only_latest_packet_fetched:
+            for station_id, packets in packets_by_station_id.items():
+                packets_by_station_id[station_id] = [packets[-1]]
+
+        return self.history_cache.put(map_sector, self.state.latest_minutes_request,
+                                      self.state.latest_time_travel_request, only_latest_packet_fetched,
+                                      min_timestamp, fetch_timestamp, list(station_ids), packets_by_station_id)
+
+    def _get_cached_station_history_responses(self, entry, handled_station_ids):
+        """Creates one history response per station using a MapSectorHistoryCache entry.
+
+        Args:
+            entry (dict): The cache entry of the map sector
+            handled_station_ids (set): Stations handled in previous map sectors (updated)
+
+        Returns:
+            generator
+        """
+        map_sector = entry['map_sector']
+        min_timestamp = self.state.get_map_sector_timestamp(map_sector)
+        packets_by_station_id = entry['packets_by_station_id']
+
+        # The entry may cover a longer time interval than this connection needs
+        station_ids = []
+        for station_id in entry['station_ids']:
+            packets = packets_by_station_id.get(station_id)
+            if station_id not in handled_station_ids and packets and packets[-1].timestamp > min_timestamp:
+                station_ids.append(station_id)
+        handled_station_ids.update(station_ids)
+
+        if station_ids:
+            yield from self._get_station_history_responses(station_ids, map_sector, False, packets_by_station_id)
+
+    def _get_station_history_responses(self, station_ids, map_sector, include_complete_history=False,
+                                       packets_by_station_id=None):
         """Creates one history response per station.
 
+        Note:
+            Packets for all stations are fetched using one query per packet table, related station rows and path rows
+            are bulk loaded before the responses are created.
+
         Args:
             station_ids (array): An array of the stations that we want history data for
             map_sector (int): The map sector that we want history data for
             include_complete_history (boolean): Include all previous packets (even if we currently only request the latest packets)
+            packets_by_station_id (dict): Already fetched packets for each station id (optional)
 
         Returns:
             generator
         """
         min_timestamp = self.state.get_map_sector_timestamp(map_sector)
+        only_latest_packet_fetched = self.state.only_latest_packet_requested and not include_complete_history
+        try:
+            if packets_by_station_id is None:
+                packets_by_station_id = self._get_packets_by_station_id(
+                    station_ids, min_timestamp, only_latest_packet_fetched)
+            self._check_cancelled()
+            self.response_data_converter.prefetch_related_data(
+                [packet for station_id in station_ids for packet in packets_by_station_id.get(station_id, [])
+                 if packet.timestamp > min_timestamp])
+        except TrackDirectRequestCancelledError:
+            raise
+        except psycopg2.InterfaceError as e:
+            raise e
+        except Exception as e:
+            self.logger.error('Error fetching packets for map sector %s: %s', map_sector, e, exc_info=True)
+            return
+
         for station_id in station_ids:
             try:
-                if self.state.latest_time_travel_request is not None:
-                    response = self._get_past_history_response(station_id, map_sector, min_timestamp, include_complete_history)
-                else:
-                    response = self._get_recent_history_response(station_id, map_sector, min_timestamp, include_complete_history)
-                if response is not None:
-                    yield response
+                packets = self._get_unsent_packets(
+                    station_id, packets_by_station_id.get(station_id, []), min_timestamp, only_latest_packet_fetched)
+                if packets:
+                    flags = ["latest"] if only_latest_packet_fetched else []
+                    data = self.response_data_converter.get_response_data(packets, [map_sector], flags)
+                    yield {'payload_response_type': 2, 'data': data}
+            except TrackDirectRequestCancelledError:
+                raise
             except psycopg2.InterfaceError as e:
                 raise e
             except Exception as e:
                 self.logger.error('Error processing station %s: %s', station_id, e, exc_info=True)
 
-    def _get_recent_history_response(self, station_id, map_sector, min_timestamp, include_complete_history=False):
-        """Creates a history response for the specified station, includes all packets from minTimestamp until now.
+    def _get_packets_by_station_id(self, station_ids, min_timestamp, only_latest_packet_fetched):
+        """Returns the packets to send for the specified stations, stations with the same min timestamp is fetched together.
 
         Args:
-            station_id (int): The station id that we want history data for
-            map_sector (int): The map sector that we want history data for
+            station_ids (array): An array of the stations that we want history data for
             min_timestamp (int): The map sector min timestamp to use in query
-            include_complete_history (boolean): Include all previous packets (even if we currently only request the latest packets)
+            only_latest_packet_fetched (boolean): Only fetch the latest packet of each station
 
         Returns:
-            Dict
+            dict with a list of packets for each station id (ordered as returned by the repository)
         """
-        packets = []
-        only_latest_packet_fetched = False
-        current_station_ids = [station_id]
+        station_ids_by_min_timestamp = {}
+        for station_id in station_ids:
+            if not self._is_history_needed(station_id, only_latest_packet_fetched):
+                continue
+            current_min_timestamp = self.state.get_station_latest_timestamp_on_map(station_id) or min_timestamp
+            station_ids_by_min_timestamp.setdefault(current_min_timestamp, []).append(station_id)
 
-        current_min_timestamp = self.state.get_station_latest_timestamp_on_map(station_id) or min_timestamp
+        packets_by_station_id = {}
+        for current_min_timestamp, current_station_ids in station_ids_by_min_timestamp.items():
+            self._check_cancelled()
+            for packet in self._get_packet_list(current_station_ids, current_min_timestamp, only_latest_packet_fetched):
+                packets_by_station_id.setdefault(packet.station_id, []).append(packet)
 
-        if not self.state.only_latest_packet_requested or include_complete_history:
-            packets = self.packet_repository.get_object_list_by_station_id_list(current_station_ids, current_min_timestamp)
-        else:
-            packets = self.packet_repository.get_latest_confirmed_object_list_by_station_id_list(current_station_ids, current_min_timestamp)
-            if packets:
-                packets = [packets[-1]]
-            only_latest_packet_fetched = True
+        if only_latest_packet_fetched:
+            for station_id, packets in packets_by_station_id.items():
+                packets_by_station_id[station_id] = [packets[-1]]
+        return packets_by_station_id
 
-        if packets:
-            flags = ["latest"] if only_latest_packet_fetched else []
-            data = self.response_data_converter.get_response_data(packets, [map_sector], flags)
-            return {'payload_response_type': 2, 'data': data}
+    def _get_packet_list(self, station_ids, min_timestamp, only_latest_packet_fetched):
+        """Returns the packets of the specified stations within the requested time interval.
 
-    def _get_past_history_response(self, station_id, map_sector, min_timestamp, include_complete_history=False):
-        """Creates a history response for the specified station, includes all packets between minTimestamp and the current latestTimeTravelRequest timestamp.
+        Args:
+            station_ids (array): An array of the stations that we want history data for
+            min_timestamp (int): Packets older than this is not included
+            only_latest_packet_fetched (boolean): Only fetch the latest packet of each station
+
+        Returns:
+            list of packets
+        """
+        if self.state.latest_time_travel_request is not None:
+            if only_latest_packet_fetched:
+                return self.packet_repository.get_latest_object_list_by_station_id_list_and_time_interval(
+                    station_ids, min_timestamp, self.state.latest_time_travel_request)
+            return self.packet_repository.get_object_list_by_station_id_list_and_time_interval(
+                station_ids, min_timestamp, self.state.latest_time_travel_request)
+
+        if only_latest_packet_fetched:
+            return self.packet_repository.get_latest_confirmed_object_list_by_station_id_list(
+                station_ids, min_timestamp)
+        return self.packet_repository.get_object_list_by_station_id_list(station_ids, min_timestamp)
+
+    def _get_unsent_packets(self, station_id, packets, min_timestamp, only_latest_packet_fetched):
+        """Returns the fetched packets that still needs to be sent for the specified station.
+
+        Note:
+            Responses for previous stations may have added this station to the map (as a related station),
+            so the state is checked again before the response is created.
 
         Args:
             station_id (int): The station id that we want history data for
-            map_sector (int): The map sector that we want history data for
-            min_timestamp (int): The map sector min timestamp to use in query
-            include_complete_history (boolean): Include all previous packets (even if we currently only request the latest packets)
+            packets (list): The fetched packets for the station
+            min_timestamp (int): The map sector min timestamp
+            only_latest_packet_fetched (boolean): Only the latest packet of the station was fetched
 
         Returns:
-            Dict
+            list of packets
         """
-        packets = []
-        only_latest_packet_fetched = False
-        current_station_ids = [station_id]
+        if not packets or not self._is_history_needed(station_id, only_latest_packet_fetched):
+            return []
 
         current_min_timestamp = self.state.get_station_latest_timestamp_on_map(station_id) or min_timestamp
+        return [packet for packet in packets if packet.timestamp > current_min_timestamp]
 
-        if self.state.only_latest_packet_requested and not include_complete_history:
-            if station_id not in self.state.stations_on_map_dict:
-                only_latest_packet_fetched = True
-                packets = self.packet_repository.get_latest_object_list_by_station_id_list_and_time_interval(
-                    current_station_ids, current_min_timestamp, self.state.latest_time_travel_request)
-        else:
-            if not self.state.is_station_history_on_map(station_id):
-                packets = self.packet_repository.get_object_list_by_station_id_list_and_time_interval(
-                    current_station_ids, current_min_timestamp, self.state.latest_time_travel_request)
-
-        if packets:
-            flags = ["latest"] if only_latest_packet_fetched else []
-            data = self.response_data_converter.get_response_data(packets, [map_sector], flags)
-            return {'payload_response_type': 2, 'data': data}
+    def _is_history_needed(self, station_id, only_latest_packet_fetched):
+        """Returns True if packets for the specified station should be fetched.
+
+        Args:
+            station_id (int): The station id that we want history data for
+            only_latest_packet_fetched (boolean): Only the latest packet of the station is requested
+
+        Returns:
+            boolean
+        """
+        if self.state.latest_time_travel_request is None:
+            return True
+        if only_latest_packet_fetched:
+            return station_id not in self.state.stations_on_map_dict
+        return not self.state.is_station_history_on_map(station_id)
+
+    def _get_station_ids_by_map_sectors(self, map_sectors):
+        """Returns the station id's in the specified map sectors using the map sector station index.
+
+        Args:
+            map_sectors (list): The map sectors that we are interested in
+
+        Returns:
+            dict with a list of station id's for each map sector (None if the index is not available)
+        """
+        query = StationIdByMapSectorQuery(self.db)
+        if not query.is_map_sector_index_available():
+            return None
+
+        if self.state.latest_time_travel_request is not None:
+            start_timestamp = self.state.latest_time_travel_request - (int(self.state.latest_minutes_request) * 60)
+            end_timestamp = self.state.latest_time_travel_request
+            unknown_map_sectors = [map_sector for map_sector in map_sectors if not self.state.is_map_sector_known(map_sector)]
+            return query.get_station_id_lists_by_map_sectors(unknown_map_sectors, start_timestamp, end_timestamp)
+
+        # Map sectors that has been visible earlier only needs newer packets, group map sectors with the same start time
+        map_sectors_by_timestamp = {}
+        for map_sector in map_sectors:
+            timestamp = self.state.get_map_sector_timestamp(map_sector)
+            map_sectors_by_timestamp.setdefault(timestamp, []).append(map_sector)
+
+        result = {}
+        for timestamp, current_map_sectors in map_sectors_by_timestamp.items():
+            self._check_cancelled()
+            result.update(query.get_station_id_lists_by_map_sectors(current_map_sectors, timestamp, None))
+        return result
+
+    def _check_cancelled(self):
+        """Raise TrackDirectRequestCancelledError if the current request has been cancelled."""
+        if self.cancellation_token is not None:
+            self.cancellation_token.raise_if_cancelled()
 
     def _get_station_ids_by_map_sector(self, map_sector):
         """Returns the station id's in specified map sector.
@@ -1,12 +1,6 @@
 import logging
-import datetime
-from server.trackdirect.repositories.PacketRepository import PacketRepository
-from server.trackdirect.repositories.StationRepository import StationRepository
-from server.trackdirect.repositories.PacketWeatherRepository import PacketWeatherRepository
-from server.trackdirect.repositories.PacketOgnRepository import PacketOgnRepository
-from server.trackdirect.repositories.OgnDeviceRepository import OgnDeviceRepository
-from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
 from server.trackdirect.websocket.queries.MostRecentPacketsQuery import MostRecentPacketsQuery
+from server.trackdirect.websocket.responses.ResponseEnrichmentContext import ResponseEnrichmentContext
 
 
 class ResponseDataConverter:
@@ -22,12 +16,28 @@ class ResponseDataConverter:
         self.state = state
         self.logger = logging.getLogger('trackdirect')
         self.db = db
-        self.packet_repository = PacketRepository(db)
-        self.station_repository = StationRepository(db)
-        self.packet_weather_repository = PacketWeatherRepository(db)
-        self.db_object_finder = DatabaseObjectFinder(db)
-        self.packet_ogn_repository = PacketOgnRepository(db)
-        self.ogn_device_repository = OgnDeviceRepository(db)
+        self.enrichment_context = None
+
+    def set_enrichment_context(self, enrichment_context):
+        """Set the enrichment context to use when adding related data to packets.
+
+        Note:
+            The context should be replaced (or removed) when a new request is handled. If no context is set,
+            a new context is used for each get_response_data call.
+
+        Args:
+            enrichment_context (ResponseEnrichmentContext): The context to use, or None.
+        """
+        self.enrichment_context = enrichment_context
+
+    def prefetch_related_data(self, packets):
+        """Bulk load the related data needed when converting the specified packets (using the current enrichment context).
+
+        Args:
+            packets (list): The Packet's that will be converted to packet dict responses.
+        """
+        if self.enrichment_context is not None:
+            self.enrichment_context.prefetch(packets)
 
     def get_response_data(self, packets, map_sector_list=None, flags=None, iteration_counter=0):
         """Create response data based on specified packets.
@@ -44,6 +54,16 @@ class ResponseDataConverter:
         if flags is None:
             flags = []
 
+        if self.enrichment_context is None:
+            self.enrichment_context = ResponseEnrichmentContext(self.db)
+            try:
+                return self.get_response_data(packets, map_sector_list, flags, iteration_counter)
+            finally:
+                self.enrichment_context = None
+
+        if "realtime" not in flags:
+            self.enrichment_context.prefetch(packets)
+
         response_data = []
         for index, packet in enumerate(packets):
             packet_dict = packet.get_dict(True)
@@ -145,12 +165,12 @@ class ResponseDataConverter:
         """
         if 'phg' in packet_dict and 'rng' in packet_dict:
             if packet_dict['phg'] is None and packet_dict['latest_phg_timestamp'] is not None and packet_dict['latest_phg_timestamp'] < packet_dict['timestamp']:
-                related_packet = self.packet_repository.get_object_by_station_id_and_timestamp(packet_dict['station_id'], packet_dict['latest_phg_timestamp'])
+                related_packet = self.enrichment_context.get_packet_by_station_id_and_timestamp(packet_dict['station_id'], packet_dict['latest_phg_timestamp'])
                 if related_packet.phg is not None and related_packet.marker_id == packet_dict['marker_id']:
                     packet_dict['phg'] = related_packet.phg
 
             if packet_dict['rng'] is None and packet_dict['latest_rng_timestamp'] is not None and packet_dict['latest_rng_timestamp'] < packet_dict['timestamp']:
-                related_packet = self.packet_repository.get_object_by_station_id_and_timestamp(packet_dict['station_id'], packet_dict['latest_rng_timestamp'])
+                related_packet = self.enrichment_context.get_packet_by_station_id_and_timestamp(packet_dict['station_id'], packet_dict['latest_rng_timestamp'])
                 if related_packet.rng is not None and related_packet.marker_id == packet_dict['marker_id']:
                     packet_dict['rng'] = related_packet.rng
 
@@ -161,7 +181,7 @@ class ResponseDataConverter:
             packet_dict (dict): The packet to which we should add the related data.
         """
         if 'ogn' not in packet_dict or packet_dict['ogn'] is None:
-            station = self.station_repository.get_object_by_id(packet_dict['station_id'])
+            station = self.enrichment_context.get_station(packet_dict['station_id'])
             ts = int(packet_dict['timestamp']) - (24 * 60 * 60)
             if station.latest_ogn_packet_timestamp is not None and station.latest_ogn_packet_timestamp > ts:
                 packet_dict['latest_ogn_packet_timestamp'] = station.latest_ogn_packet_timestamp
@@ -170,13 +190,13 @@ class ResponseDataConverter:
                 if station.latest_ogn_packet_id == packet_dict['id']:
                     related_packet_dict = packet_dict
                 else:
-                    related_packet = self.packet_repository.get_object_by_id_and_timestamp(station.latest_ogn_packet_id, station.latest_ogn_packet_timestamp)
+                    related_packet = self.enrichment_context.get_packet_by_id_and_timestamp(station.latest_ogn_packet_id, station.latest_ogn_packet_timestamp)
                     if related_packet.is_existing_object():
                         related_packet_dict = related_packet.get_dict()
 
                 if related_packet_dict is not None:
                     if related_packet_dict['marker_id'] is not None and related_packet_dict['marker_id'] == packet_dict['marker_id']:
-                        packet_ogn = self.packet_ogn_repository.get_object_by_packet_id_and_timestamp(station.latest_ogn_packet_id, station.latest_ogn_packet_timestamp)
+                        packet_ogn = self.enrichment_context.get_packet_ogn(station.latest_ogn_packet_id, station.latest_ogn_packet_timestamp)
                         if packet_ogn.is_existing_object():
                             packet_dict['ogn'] = packet_ogn.get_dict()
 
@@ -186,9 +206,9 @@ class ResponseDataConverter:
         Args:
             packet_dict (dict): The packet to which we should add the related data.
         """
-        station = self.station_repository.get_object_by_id(packet_dict['station_id'])
+        station = self.enrichment_context.get_station(packet_dict['station_id'])
         if station.latest_ogn_sender_address is not None:
-            ogn_device = self.ogn_device_repository.get_object_by_device_id(station.latest_ogn_sender_address)
+            ogn_device = self.enrichment_context.get_ogn_device(station.latest_ogn_sender_address)
             if ogn_device.is_existing_object():
                 packet_dict['ogn_device'] = ogn_device.get_dict()
 
@@ -199,7 +219,7 @@ class ResponseDataConverter:
             packet_dict (dict): The packet to which we should add the related data.
         """
         if 'weather' not in packet_dict or packet_dict['weather'] is None:
-            station = self.station_repository.get_object_by_id(packet_dict['station_id'])
+            station = self.enrichment_context.get_station(packet_dict['station_id'])
             ts = int(packet_dict['timestamp']) - (24 * 60 * 60)
             if station.latest_weather_packet_timestamp is not None and station.latest_weather_packet_timestamp > ts:
                 packet_dict['latest_weather_packet_timestamp'] = station.latest_weather_packet_timestamp
@@ -208,13 +228,13 @@ class ResponseDataConverter:
                 if station.latest_weather_packet_id == packet_dict['id']:
                     related_packet_dict = packet_dict
                 else:
-                    related_packet = self.packet_repository.get_object_by_id_and_timestamp(station.latest_weather_packet_id, station.latest_weather_packet_timestamp)
+                    related_packet = self.enrichment_context.get_packet_by_id_and_timestamp(station.latest_weather_packet_id, station.latest_weather_packet_timestamp)
                     if related_packet.is_existing_object():
                         related_packet_dict = related_packet.get_dict()
 
                 if related_packet_dict is not None:
                     if related_packet_dict['marker_id'] is not None and related_packet_dict['marker_id'] == packet_dict['marker_id']:
-                        packet_weather = self.packet_weather_repository.get_object_by_packet_id_and_timestamp(station.latest_weather_packet_id, station.latest_weather_packet_timestamp)
+                        packet_weather = self.enrichment_context.get_packet_weather(station.latest_weather_packet_id, station.latest_weather_packet_timestamp)
                         if packet_weather.is_existing_object():
                             packet_dict['weather'] = packet_weather.get_dict()
 
@@ -225,7 +245,7 @@ class ResponseDataConverter:
             packet_dict (dict): The packet to which we should add the related data.
         """
         if 'telemetry' not in packet_dict or packet_dict['telemetry'] is None:
-            station = self.station_repository.get_object_by_id(packet_dict['station_id'])
+            station = self.enrichment_context.get_station(packet_dict['station_id'])
             ts = int(packet_dict['timestamp']) - (24 * 60 * 60)
             if station.latest_telemetry_packet_timestamp is not None and station.latest_telemetry_packet_timestamp > ts:
                 packet_dict['latest_telemetry_packet_timestamp'] = station.latest_telemetry_packet_timestamp
@@ -240,24 +260,11 @@ class ResponseDataConverter:
         station_name_path = []
         station_location_path = []
 
-        if packet_dict['raw_path'] is not None and "TCPIP*" not in packet_dict['raw_path'] and "TCPXX*" not in packet_dict['raw_path']:
-            packet_date = datetime.datetime.utcfromtimestamp(int(packet_dict['timestamp'])).strftime('%Y%m%d')
-            date_packet_table = 'packet' + packet_date
-            date_packet_path_table = date_packet_table + '_path'
-
-            if self.db_object_finder.check_table_exists(date_packet_path_table):
-                with self.db.cursor() as select_cursor:
-                    sql = """SELECT station_id, station.name station_name, latitude, longitude 
-                             FROM {} 
-                             JOIN station ON station.id = station_id 
-                             WHERE packet_id = %s 
-                             ORDER BY number""".format(date_packet_path_table)
-                    select_cursor.execute(sql, (packet_dict['id'],))
-
-                    for record in select_cursor:
-                        station_id_path.append(record[0])
-                        station_name_path.append(record[1])
-                        station_location_path.append([record[2], record[3]])
+        for station_id, station_name, latitude, longitude in self.enrichment_context.get_station_id_path(
+                packet_dict['id'], packet_dict['timestamp'], packet_dict['raw_path']):
+            station_id_path.append(station_id)
+            station_name_path.append(station_name)
+            station_location_path.append([latitude, longitude])
 
         packet_dict['station_id_path'] = station_id_path
         packet_dict['station_name_path'] = station_name_path
@@ -0,0 +1,384 @@
+import datetime
+import logging
+
+from server.trackdirect.database.DatabaseObjectFinder import DatabaseObjectFinder
+from server.trackdirect.objects.OgnDevice import OgnDevice
+from server.trackdirect.repositories.OgnDeviceRepository import OgnDeviceRepository
+from server.trackdirect.repositories.PacketOgnRepository import PacketOgnRepository
+from server.trackdirect.repositories.PacketRepository import PacketRepository
+from server.trackdirect.repositories.PacketWeatherRepository import PacketWeatherRepository
+from server.trackdirect.repositories.StationRepository import StationRepository
+
+
+class ResponseEnrichmentContext:
+    """The ResponseEnrichmentContext remembers the related data that is added to packet dict responses during one request
+
+    Note:
+        ResponseDataConverter needs station rows, the latest weather and OGN packets, OGN devices, previous PHG/RNG
+        packets and path rows for the packets that it converts. The prefetch method loads this data for a whole
+        packet list using one query per table, everything that is loaded is remembered until the context is dropped.
+        Lookups of data that has not been prefetched fall back to one query per lookup (and is remembered as well).
+
+        A context should only live as long as the request it was created for, the remembered rows are not updated.
+    """
+
+    def __init__(self, db, cancellation_token=None):
+        """The __init__ method.
+
+        Args:
+            db (psycopg2.Connection): Database connection (with autocommit)
+            cancellation_token (RequestCancellationToken): Checked between the prefetch queries (optional)
+        """
+        self.db = db
+        self.cancellation_token = cancellation_token
+        self.logger = logging.getLogger('trackdirect')
+        self.packet_repository = PacketRepository(db)
+        self.station_repository = StationRepository(db)
+        self.packet_weather_repository = PacketWeatherRepository(db)
+        self.packet_ogn_repository = PacketOgnRepository(db)
+        self.ogn_device_repository = OgnDeviceRepository(db)
+        self.db_object_finder = DatabaseObjectFinder(db)
+
+        self.stations = {}
+        self.packets = {}
+        self.packets_by_station_id_and_timestamp = {}
+        self.packet_weathers = {}
+        self.packet_ogns = {}
+        self.ogn_devices = {}
+        self.station_id_paths = {}
+
+        self.lookups = 0
+        self.queries = 0
+
+    def prefetch(self, packets):
+        """Bulk load the related data needed when converting the specified packets
+
+        Args:
+            packets (list): The Packet's that will be converted to packet dict responses
+        """
+        if not packets:
+            return
+
+        self._prefetch_stations({packet.station_id for packet in packets})
+
+        min_timestamp_by_station_id = {}
+        ogn_station_ids = set()
+        for packet in packets:
+            if packet.station_id not in min_timestamp_by_station_id or min_timestamp_by_station_id[packet.station_id] > packet.timestamp:
+                min_timestamp_by_station_id[packet.station_id] = packet.timestamp
+            if packet.source_id == 5:
+                ogn_station_ids.add(packet.station_id)
+
+        latest_packet_keys = []
+        weather_keys = []
+        ogn_keys = []
+        device_ids = []
+        for station_id, min_timestamp in min_timestamp_by_station_id.items():
+            station = self.stations[station_id]
+            ts = int(min_timestamp) - (24 * 60 * 60)
+            if station.latest_weather_packet_timestamp is not None and station.latest_weather_packet_timestamp > ts:
+                key = (station.latest_weather_packet_id, station.latest_weather_packet_timestamp)
+                latest_packet_keys.append(key)
+                weather_keys.append(key)
+
+            if station_id in ogn_station_ids:
+                if station.latest_ogn_packet_timestamp is not None and station.latest_ogn_packet_timestamp > ts:
+                    key = (station.latest_ogn_packet_id, station.latest_ogn_packet_timestamp)
+                    latest_packet_keys.append(key)
+                    ogn_keys.append(key)
+                if station.latest_ogn_sender_address is not None:
+                    device_ids.append(station.latest_ogn_sender_address)
+
+        prefetch_calls = [(self._prefetch_packets, latest_packet_keys),
+                          (self._prefetch_packet_weathers, weather_keys),
+                          (self._prefetch_packet_ogns, ogn_keys),
+                          (self._prefetch_ogn_devices, device_ids),
+                          (self._prefetch_phg_rng_packets, packets),
+                          (self._prefetch_station_id_paths, packets)]
+        for prefetch_function, values in prefetch_calls:
+            if self.cancellation_token is not None:
+                self.cancellation_token.raise_if_cancelled()
+            prefetch_function(values)
+
+    def get_station(self, station_id):
+        """Returns the specified station
+
+        Args:
+            station_id (int): Station id
+
+        Returns:
+            Station
+        """
+        self.lookups += 1
+        if station_id not in self.stations:
+            self.queries += 1
+            self.stations[station_id] = self.station_repository.get_object_by_id(station_id)
+        return self.stations[station_id]
+
+    def get_packet_by_id_and_timestamp(self, packet_id, timestamp):
+        """Returns the specified packet
+
+        Args:
+            packet_id (int): Packet id
+            timestamp (int): Packet timestamp
+
+        Returns:
+            Packet
+        """
+        self.lookups += 1
+        key = (packet_id, timestamp)
+        if key not in self.packets:
+            self.queries += 1
+            self.packets[key] = self.packet_repository.get_object_by_id_and_timestamp(packet_id, timestamp)
+        return self.packets[key]
+
+    def get_packet_by_station_id_and_timestamp(self, station_id, timestamp):
+        """Returns the first packet that the specified station sent at the specified time
+
+        Args:
+            station_id (int): Station id
+            timestamp (int): Packet timestamp
+
+        Returns:
+            Packet
+        """
+        self.lookups += 1
+        key = (station_id, timestamp)
+        if key not in self.packets_by_station_id_and_timestamp:
+            self.queries += 1
+            self.packets_by_station_id_and_timestamp[key] = self.packet_repository.get_object_by_station_id_and_timestamp(station_id, timestamp)
+        return self.packets_by_station_id_and_timestamp[key]
+
+    def get_packet_weather(self, packet_id, timestamp):
+        """Returns the weather of the specified packet
+
+        Args:
+            packet_id (int): Packet id
+            timestamp (int): Packet timestamp
+
+        Returns:
+            PacketWeather
+        """
+        self.lookups += 1
+        key = (packet_id, timestamp)
+        if key not in self.packet_weathers:
+            self.queries += 1
+            self.packet_weathers[key] = self.packet_weather_repository.get_object_by_packet_id_and_timestamp(packet_id, timestamp)
+        return self.packet_weathers[key]
+
+    def get_packet_ogn(self, packet_id, timestamp):
+        """Returns the OGN data of the specified packet
+
+        Args:
+            packet_id (int): Packet id
+            timestamp (int): Packet timestamp
+
+        Returns:
+            PacketOgn
+        """
+        self.lookups += 1
+        key = (packet_id, timestamp)
+        if key not in self.packet_ogns:
+            self.queries += 1
+            self.packet_ogns[key] = self.packet_ogn_repository.get_object_by_packet_id_and_timestamp(packet_id, timestamp)
+        return self.packet_ogns[key]
+
+    def get_ogn_device(self, device_id):
+        """Returns the specified OGN device
+
+        Args:
+            device_id (str): Device id (ogn sender address)
+
+        Returns:
+            OgnDevice
+        """
+        self.lookups += 1
+        if device_id not in self.ogn_devices:
+            # Found in the process wide OGN device registry, no query needed
+            self.ogn_devices[device_id] = self.ogn_device_repository.get_object_by_device_id(device_id)
+        return self.ogn_devices[device_id]
+
+    def get_station_id_path(self, packet_id, timestamp, raw_path):
+        """Returns the stations in the path of the specified packet
+
+        Args:
+            packet_id (int): Packet id
+            timestamp (int): Packet timestamp
+            raw_path (str): Raw path of packet
+
+        Returns:
+            list of (station id, station name, latitude, longitude) tuples
+        """
+        if not self._has_station_id_path(raw_path):
+            return []
+
+        self.lookups += 1
+        if packet_id not in self.station_id_paths:
+            self._load_station_id_paths(self._get_packet_path_table(timestamp), [packet_id])
+        return self.station_id_paths[packet_id]
+
+    def get_stats(self):
+        """Returns lookup statistics
+
+        Returns:
+            dict
+        """
+        return {'lookups': self.lookups,
+                'queries': self.queries,
+                'queries_saved': self.lookups - self.queries}
+
+    def _prefetch_stations(self, station_ids):
+        """Load the specified stations that is not loaded yet
+
+        Args:
+            station_ids (set): Station ids
+        """
+        missing_station_ids = [station_id for station_id in station_ids if station_id not in self.stations]
+        if missing_station_ids:
+            self.queries += 1
+            for station in self.station_repository.get_object_list_by_station_id_list(missing_station_ids):
+                self.stations[station.id] = station
+            for station_id in missing_station_ids:
+                if station_id not in self.stations:
+                    self.stations[station_id] = self.station_repository.create()
+
+    def _prefetch_packets(self, keys):
+        """Load the specified packets that is not loaded yet
+
+        Args:
+            keys (list): (packet id, timestamp) tuples
+        """
+        missing_keys = list({key for key in keys if key not in self.packets})
+        if missing_keys:
+            self.queries += len({int(timestamp) // (24 * 60 * 60) for packet_id, timestamp in missing_keys})
+            for packet in self.packet_repository.get_object_list_by_id_and_timestamp_list(missing_keys):
+                self.packets[(packet.id, packet.timestamp)] = packet
+            for key in missing_keys:
+                if key not in self.packets:
+                    self.packets[key] = self.packet_repository.create()
+
+    def _prefetch_packet_weathers(self, keys):
+        """Load weather for the specified packets that is not loaded yet
+
+        Args:
+            keys (list): (packet id, timestamp) tuples
+        """
+        missing_keys = list({key for key in keys if key not in self.packet_weathers})
+        if missing_keys:
+            self.queries += len({int(timestamp) // (24 * 60 * 60) for packet_id, timestamp in missing_keys})
+            for packet_weather in self.packet_weather_repository.get_object_list_by_packet_id_and_timestamp_list(missing_keys):
+                self.packet_weathers[(packet_weather.packet_id, packet_weather.timestamp)] = packet_weather
+            for key in missing_keys:
+                if key not in self.packet_weathers:
+                    self.packet_weathers[key] = self.packet_weather_repository.create()
+
+    def _prefetch_packet_ogns(self, keys):
+        """Load OGN data for the specified packets that is not loaded yet
+
+        Args:
+            keys (list): (packet id, timestamp) tuples
+        """
+        missing_keys = list({key for key in keys if key not in self.packet_ogns})
+        if missing_keys:
+            self.queries += 1
+            for packet_ogn in self.packet_ogn_repository.get_object_list_by_packet_id_and_timestamp_list(missing_keys):
+                self.packet_ogns[(packet_ogn.packet_id, packet_ogn.timestamp)] = packet_ogn
+            for key in missing_keys:
+                if key not in self.packet_ogns:
+                    self.packet_ogns[key] = self.packet_ogn_repository.create()
+
+    def _prefetch_ogn_devices(self, device_ids):
+        """Load the specified OGN devices that is not loaded yet
+
+        Args:
+            device_ids (list): Device ids
+        """
+        missing_device_ids = list({device_id for device_id in device_ids if device_id not in self.ogn_devices})
+        if missing_device_ids:
+            for ogn_device in self.ogn_device_repository.get_object_list_by_device_id_list(missing_device_ids):
+                self.ogn_devices[ogn_device.device_id] = ogn_device
+            for device_id in missing_device_ids:
+                if device_id not in self.ogn_devices:
+                    self.ogn_devices[device_id] = OgnDevice(self.db)
+
+    def _prefetch_phg_rng_packets(self, packets):
+        """Load the previous packets that contains the PHG and RNG values of the specified packets
+
+        Args:
+            packets (list): Packets
+        """
+        keys = set()
+        for packet in packets:
+            if packet.phg is None and packet.latest_phg_timestamp is not None and packet.latest_phg_timestamp < packet.timestamp:
+                keys.add((packet.station_id, packet.latest_phg_timestamp))
+            if packet.rng is None and packet.latest_rng_timestamp is not None and packet.latest_rng_timestamp < packet.timestamp:
+                keys.add((packet.station_id, packet.latest_rng_timestamp))
+
+        missing_keys = [key for key in keys if key not in self.packets_by_station_id_and_timestamp]
+        if missing_keys:
+            self.queries += len({int(timestamp) // (24 * 60 * 60) for station_id, timestamp in missing_keys})
+            for packet in self.packet_repository.get_object_list_by_station_id_and_timestamp_list(missing_keys):
+                self.packets_by_station_id_and_timestamp[(packet.station_id, packet.timestamp)] = packet
+            for key in missing_keys:
+                if key not in self.packets_by_station_id_and_timestamp:
+                    self.packets_by_station_id_and_timestamp[key] = self.packet_repository.create()
+
+    def _prefetch_station_id_paths(self, packets):
+        """Load the path rows of the specified packets
+
+        Args:
+            packets (list): Packets
+        """
+        packet_ids_by_table = {}
+        for packet in packets:
+            if self._has_station_id_path(packet.raw_path) and packet.id not in self.station_id_paths:
+                packet_ids_by_table.setdefault(self._get_packet_path_table(packet.timestamp), []).append(packet.id)
+
+        for date_packet_path_table, packet_ids in packet_ids_by_table.items():
+            self._load_station_id_paths(date_packet_path_table, packet_ids)
+
+    def _load_station_id_paths(self, date_packet_path_table, packet_ids):
+        """Load the path rows of the specified packets from the specified path table
+
+        Args:
+            date_packet_path_table (str): Packet path table
+            packet_ids (list): Packet ids
+        """
+        for packet_id in packet_ids:
+            self.station_id_paths[packet_id] = []
+
+        if self.db_object_finder.check_table_exists(date_packet_path_table):
+            self.queries += 1
+            with self.db.cursor() as select_cursor:
+                sql = """SELECT packet_id, station_id, station.name station_name, latitude, longitude
+                         FROM {}
+                         JOIN station ON station.id = station_id
+                         WHERE packet_id = ANY(%s)
+                         ORDER BY packet_id, number""".format(date_packet_path_table)
+                select_cursor.execute(sql, (packet_ids,))
+
+                for record in select_cursor:
+                    self.station_id_paths[record[0]].append((record[1], record[2], record[3], record[4]))
+
+    def _has_station_id_path(self, raw_path):
+        """Returns True if a packet with the specified raw path may have a station id path
+
+        Args:
+            raw_path (str): The raw path of the packet
+
+        Returns:
+            bool
+        """
+        return raw_path is not None and "TCPIP*" not in raw_path and "TCPXX*" not in raw_path
+
+    def _get_packet_path_table(self, timestamp):
+        """Returns the name of the packet path table used for packets received at the specified time
+
+        Args:
+            timestamp (int): Packet timestamp
+
+        Returns:
+            str
+        """
+        packet_date = datetime.datetime.utcfromtimestamp(int(timestamp)).strftime('%Y%m%d')
+        return 'packet' + packet_date + '_path'